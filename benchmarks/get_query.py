@@ -0,0 +1,46 @@
+"""
+Micro-benchmark of SuperModel.get_query.
+
+Run from the repository root:
+    PYTHONPATH=package python benchmarks/get_query.py
+"""
+import timeit
+
+from wsgi import app
+
+from plugins.db import db
+
+from models.products import ProductModel
+from models.cart import CartModel
+
+NUMBER = 5000
+
+
+def bench(name, statement):
+    seconds = min(timeit.repeat(statement, number=NUMBER, repeat=3))
+    print(f"{name:<45} {seconds / NUMBER * 1e6:8.1f} us/call")
+
+
+def main():
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///"
+    with app.app_context():
+        db.create_all()
+        ProductModel(name="product", slug="product", price=10).save_to_db()
+
+        bench("build query (slug)", lambda: ProductModel.get_query(slug="product"))
+        bench(
+            "build query (user_id, session_id)",
+            lambda: CartModel.get_query(user_id=None, session_id=1),
+        )
+        bench(
+            "build query (relationship)",
+            lambda: CartModel.get_query(user_id=None, session=None),
+        )
+        bench(
+            "get_query(slug).first()",
+            lambda: ProductModel.get_query(slug="product").first(),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark of the vectorized price engine (models.helper.pricing).
+
+Run from the repository root:
+    PYTHONPATH=package python benchmarks/pricing.py
+"""
+import timeit
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from wsgi import app
+
+from models.coupons import CouponModel
+from models.helper import pricing
+from models.helper.enums import CouponTypeEnum
+
+LINES = 100_000
+NUMBER = 5
+
+
+def bench(name, statement):
+    seconds = min(timeit.repeat(statement, number=NUMBER, repeat=3)) / NUMBER
+    print(f"{name:<45} {seconds * 1e3:8.2f} ms/call")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    prices = rng.uniform(1, 1000, LINES).round(2)
+    price_changes = rng.integers(0, 50, LINES).astype(float)
+    applies = rng.random(LINES) < 0.5
+    coupon = CouponModel(
+        code="BENCH",
+        type=CouponTypeEnum.percentage,
+        value=20,
+        max_value=50,
+        start=datetime.utcnow() - timedelta(days=1),
+        expire=datetime.utcnow() + timedelta(days=1),
+    )
+
+    with app.app_context():
+        bench(
+            f"price_lines ({LINES} lines)",
+            lambda: pricing.price_lines(prices, price_changes, coupon, applies),
+        )
+        bench(
+            f"python loop ({LINES} lines)",
+            lambda: [
+                price + change - (coupon.get_discount_price(price + change) if apply else 0)
+                for price, change, apply in zip(
+                    prices.tolist(), price_changes.tolist(), applies.tolist()
+                )
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from commands.categories import categories_cli
+from commands.images import images_cli
+from commands.indexes import indexes_cli
+from commands.listing import listing_cli
+from commands.pricing import pricing_cli
+from commands.products import products_cli
+from commands.ratings import ratings_cli
+from commands.search import search_cli
+
+
+def add_commands(app):
+    # categories
+    app.cli.add_command(categories_cli)
+
+    # images
+    app.cli.add_command(images_cli)
+
+    # indexes
+    app.cli.add_command(indexes_cli)
+
+    # listing
+    app.cli.add_command(listing_cli)
+
+    # pricing
+    app.cli.add_command(pricing_cli)
+
+    # products
+    app.cli.add_command(products_cli)
+
+    # ratings
+    app.cli.add_command(ratings_cli)
+
+    # search
+    app.cli.add_command(search_cli)
@@ -1,6 +1,7 @@
 from resources.address import Address
+from resources.cache import ModelCacheStats
 from resources.cart import Cart, CartItem, ApplyCoupon, MergeTwoCart
-from resources.coupons import Coupon, Coupons, ProductCouponMapping
+from resources.coupons import Coupon, Coupons, CouponPreview, ProductCouponMapping
 from resources.order import (
     Order,
     OrderCreate,
@@ -8,10 +9,19 @@ from resources.order import (
     OrderReceiver,
     OrderReceiverCreate,
 )
-from resources.product_category import ProductCategory, ProductCategoryCreate
+from resources.product_category import (
+    ProductCategory,
+    ProductCategoryCreate,
+    ProductCategoryTree,
+    ProductCategorySubtree,
+    ProductCategoryProducts,
+)
 from resources.products import (
     Product,
     Products,
+    ProductSearch,
+    ProductImport,
+    ProductExport,
     ProductCreate,
     ProductAttribute,
     ProductAttributeCreate,
@@ -21,6 +31,7 @@ from resources.products import (
     ProductAttributeOptionCreate,
     ProductImages,
     ProductImage,
+    ImageFile,
 )
 from resources.review import ProductReview, ProductReviews
 from resources.users import (
@@ -40,6 +51,9 @@ def add_resources(api):
     # address
     api.add_resource(Address, "/address")
 
+    # cache
+    api.add_resource(ModelCacheStats, "/cache-stats")
+
     # cart
     api.add_resource(Cart, "/cart")
     api.add_resource(CartItem, "/cart-item")
@@ -50,6 +64,7 @@ def add_resources(api):
     api.add_resource(Coupon, "/coupon/<string:code>")
     api.add_resource(Coupons, "/coupons")
     api.add_resource(ProductCouponMapping, "/coupon-product-mapping/<string:code>")
+    api.add_resource(CouponPreview, "/coupon-preview/<string:code>")
 
     # order
     api.add_resource(OrderCreate, "/order")
@@ -61,11 +76,17 @@ def add_resources(api):
     # product category
     api.add_resource(ProductCategory, "/product-category/<int:id>")
     api.add_resource(ProductCategoryCreate, "/product-categories/<int:parent_id>")
+    api.add_resource(ProductCategoryTree, "/product-categories/tree")
+    api.add_resource(ProductCategorySubtree, "/product-category/<int:id>/subtree")
+    api.add_resource(ProductCategoryProducts, "/product-category/<int:id>/products")
 
     # product
     api.add_resource(Product, "/product/<string:slug>")
     api.add_resource(ProductCreate, "/product")
     api.add_resource(Products, "/products")
+    api.add_resource(ProductSearch, "/products/search")
+    api.add_resource(ProductImport, "/products/import")
+    api.add_resource(ProductExport, "/products/export")
     # product attributes
     api.add_resource(ProductAttribute, "/product-attribute/<int:attr_id>")
     api.add_resource(ProductAttributeCreate, "/product-attribute")
@@ -79,6 +100,7 @@ def add_resources(api):
     # product image
     api.add_resource(ProductImage, "/product-image/<string:slug>/<string:filename>")
     api.add_resource(ProductImages, "/product-image/<string:slug>")
+    api.add_resource(ImageFile, "/images/<string:name>")
 
     # product review
     api.add_resource(ProductReview, "/product-review/<int:product_id>")
@@ -0,0 +1,23 @@
+"""
+flask categories rebuild
+
+Rebuild the closure table of the category tree (models.product_category) from the
+parent_id of the categories, e.g. after categories were written with raw SQL or on a
+database created before the closure table.
+"""
+import click
+
+from flask.cli import AppGroup
+
+from models.product_category import ProductCategoryModel
+from plugins.db import db
+
+categories_cli = AppGroup("categories", help="Manage the category tree.")
+
+
+@categories_cli.command("rebuild")
+def rebuild():
+    """Rebuild the closure table of the category tree."""
+    paths = ProductCategoryModel.rebuild_tree()
+    db.session.commit()
+    click.echo(f"{paths} path(s) rebuilt")
@@ -0,0 +1,248 @@
+"""
+flask images variants / store
+
+variants: render the variants (PRODUCT_IMAGE_VARIANTS) of the product images uploaded
+before the variants pipeline, or of all of them with --all (e.g. after a change of the
+sizes). The images are rendered by a pool of --workers processes (utils.image_variants)
+and recorded one commit per image as they complete.
+store: move the files of the images uploaded before the content addressed store
+(product_<slug>/<image_name>) into it, the same contents end up stored once.
+sweep: reconcile the product images with the storage, out of the request path. Nothing
+is deleted, the findings are quarantined and reported:
+    the images whose file is missing are deactivated (hidden from the products) and
+    marked quarantined, and active again once their file is back
+    the blob files no image uses (e.g. left by an interrupted upload) are moved to
+    quarantine/, with their path in the store
+"""
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import click
+
+from flask import current_app
+from flask.cli import AppGroup
+
+from models.products import ProductImageModel, ProductImageVariantModel
+from plugins.db import db
+from plugins.image_index import image_index
+
+from utils import image_helper, image_variants
+
+QUARANTINE_FOLDER = "quarantine"
+
+images_cli = AppGroup("images", help="Manage the product images.")
+
+
+def render_all(jobs, workers):
+    """
+    Yield the (image id, variants or exception) of the jobs [(image id, job)].
+    """
+    if not workers:
+        for image_id, job in jobs:
+            try:
+                yield image_id, image_variants.render_variants(*job)
+            except Exception as e:
+                yield image_id, e
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (image_id, executor.submit(image_variants.render_variants, *job))
+            for image_id, job in jobs
+        ]
+        for image_id, future in futures:
+            yield image_id, future.exception() or future.result()
+
+
+@images_cli.command("variants")
+@click.option("--all", "render_all_images", is_flag=True, help="Render them again.")
+@click.option(
+    "--workers",
+    type=int,
+    default=lambda: current_app.config.get("PRODUCT_IMAGE_WORKERS", 0),
+    help="Processes rendering the variants, 0 renders them in this process.",
+)
+def variants(render_all_images, workers):
+    """Render the variants of the product images."""
+    query = ProductImageModel.query.filter(ProductImageModel.active)
+    if not render_all_images:
+        query = query.filter(
+            ~ProductImageModel.id.in_(db.select(ProductImageVariantModel.image_id))
+        )
+    jobs = [
+        (image.id, image_variants.get_job(image))
+        for image in query.order_by(ProductImageModel.id)
+    ]
+    rendered, failed = 0, 0
+    for image_id, result in render_all(jobs, workers):
+        if isinstance(result, Exception):
+            failed += 1
+            click.echo(f"image {image_id}: {result}", err=True)
+            continue
+        ProductImageVariantModel.record(image_id, result)
+        rendered += 1
+    click.echo(f"{rendered} image(s) rendered, {failed} failed")
+
+
+@images_cli.command("store")
+def store():
+    """Move the images uploaded before the content addressed store into it."""
+    images = (
+        ProductImageModel.query.filter(ProductImageModel.digest.is_(None))
+        .order_by(ProductImageModel.id)
+        .all()
+    )
+    stored, missing = 0, 0
+    for image in images:
+        path = image_helper.get_image_path(image)
+        if not os.path.isfile(path):
+            missing += 1
+            continue
+        paths = [path] + [
+            image_variants.get_variant_path(image, variant)
+            for variant in image.variants
+        ]
+        with open(path, "rb") as image_file:
+            image.digest = image_helper.store_blob(
+                image_file, image_helper.get_extension(image.image_name)
+            )
+        # rendered again next to the blob by `flask images variants`
+        image.variants.clear()
+        db.session.commit()
+        for path in paths:
+            image_helper.remove_file(path)
+        stored += 1
+    click.echo(f"{stored} image(s) stored, {missing} missing")
+
+
+def get_batches(query, batch_size):
+    """
+    Yield the rows of the query by batches of the id (keyset), one batch in memory.
+    """
+    last_id = 0
+    while True:
+        batch = (
+            query.filter(ProductImageModel.id > last_id)
+            .order_by(ProductImageModel.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return
+        # before the caller commits (expires) the batch
+        last_id = batch[-1].id
+        yield batch
+
+
+def find_blob_files(min_age):
+    """
+    Return the {digest: [paths]} of the files of the store (blobs and variants) older
+    than min_age seconds, the younger ones may belong to an upload not committed yet.
+    """
+    root = image_helper.get_path(image_helper.BLOBS_FOLDER)
+    files = {}
+    for folder, _, file_names in os.walk(root):
+        for file_name in file_names:
+            match = image_helper.BLOB_NAME.match(file_name)
+            path = os.path.join(folder, file_name)
+            if match and is_older(path, min_age):
+                files.setdefault(match.group(1), []).append(path)
+    return files
+
+
+def is_older(path, min_age) -> bool:
+    """
+    Return whether the file was last written more than min_age seconds ago, False if it
+    is gone.
+    """
+    try:
+        return os.path.getmtime(path) < time.time() - min_age
+    except FileNotFoundError:
+        return False
+
+
+def quarantine(path):
+    """
+    Move the file into the quarantine folder, at its path relative to the images.
+    """
+    relative = os.path.relpath(path, image_helper.IMAGE_SET.config.destination)
+    target = image_helper.get_path(relative, folder=QUARANTINE_FOLDER)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    image_index.discard(path)
+
+
+@images_cli.command("sweep")
+@click.option("--batch-size", type=int, default=500, help="Images checked per commit.")
+@click.option(
+    "--min-age",
+    type=int,
+    default=60 * 60,
+    help="Seconds, the younger blob files are left alone (uploads in progress).",
+)
+@click.option("--dry-run", is_flag=True, help="Report only, change nothing.")
+def sweep(batch_size, min_age, dry_run):
+    """Reconcile the product images with the storage, quarantine the findings."""
+    checked, missing, restored = 0, 0, 0
+    # the active images and the ones quarantined by the sweep, the images deactivated
+    # otherwise (e.g. by an admin) are left alone
+    query = ProductImageModel.query.filter(
+        ProductImageModel.active | ProductImageModel.quarantined.isnot(None)
+    )
+    for images in get_batches(query, batch_size):
+        for image in images:
+            checked += 1
+            stored = os.path.isfile(image_helper.get_image_path(image))
+            if stored != (image.quarantined is not None):
+                continue
+            if stored and ProductImageModel.get_item(
+                product_slug=image.product_slug, image_name=image.image_name
+            ):
+                # its name was taken again meanwhile, left to the admin
+                click.echo(f"image {image.id}: stored, name already in use")
+                continue
+            click.echo(
+                f"image {image.id}: {'restored' if stored else 'missing, quarantined'}"
+                f" ({image.product_slug}/{image.image_name})"
+            )
+            if stored:
+                restored += 1
+            else:
+                missing += 1
+            if not dry_run:
+                image.active = stored
+                image.quarantined = None if stored else datetime.utcnow()
+                image.post_save()
+        if not dry_run:
+            db.session.commit()
+        db.session.expunge_all()
+
+    orphans = 0
+    files = find_blob_files(min_age)
+    digests = list(files)
+    for start in range(0, len(digests), batch_size):
+        batch = digests[start : start + batch_size]
+        used = {
+            digest
+            for digest, in db.session.query(ProductImageModel.digest)
+            .filter(ProductImageModel.digest.in_(batch))
+            .distinct()
+        }
+        for digest in batch:
+            if digest in used:
+                continue
+            for path in files[digest]:
+                # stored again (renamed into place) by an upload since it was listed,
+                # its row may not be committed yet
+                if not is_older(path, min_age):
+                    continue
+                orphans += 1
+                click.echo(f"orphan file: {os.path.basename(path)}")
+                if not dry_run:
+                    quarantine(path)
+    click.echo(
+        f"{checked} image(s) checked: {missing} missing, {restored} restored, "
+        f"{orphans} orphan file(s) quarantined{' (dry run)' if dry_run else ''}"
+    )
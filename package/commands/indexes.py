@@ -0,0 +1,177 @@
+"""
+flask indexes report / create
+
+The report runs EXPLAIN on every query shape of SuperModel.get_query: the shapes recorded
+by the running process plus the ones found by scanning the get_item / get_items /
+get_or_create calls of the resources. It lists
+    MISSING:     shapes whose plan scans the whole table
+    UNUSED:      declared indexes used by none of the plans
+    NOT CREATED: declared indexes absent from the database (create them with `create`)
+The planner of an almost empty table always prefers a scan, so run it on real data.
+"""
+import ast
+import os
+import re
+
+from enum import Enum
+
+import click
+
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+
+from models.helper.super_model import _query_shapes
+from plugins.db import db
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+LOOKUP_METHODS = ("get_item", "get_items", "get_or_create", "get_query")
+
+indexes_cli = AppGroup("indexes", help="Report and create the indexes of the models.")
+
+
+def get_models():
+    return {mapper.class_.__name__: mapper.class_ for mapper in db.Model.registry.mappers}
+
+
+def scan_shapes(path=RESOURCES_DIR):
+    """
+    Return the shapes (model, ((key, is_none), ...)) of the model lookups of the resources,
+    relationship keys are replaced by their local columns.
+    """
+    models = get_models()
+    shapes = set()
+    for file_name in sorted(os.listdir(path)):
+        if not file_name.endswith(".py"):
+            continue
+        with open(os.path.join(path, file_name)) as source:
+            tree = ast.parse(source.read())
+        for node in ast.walk(tree):
+            if not (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in LOOKUP_METHODS
+                and isinstance(node.func.value, ast.Name)
+                and node.func.value.id in models
+            ):
+                continue
+            model = models[node.func.value.id]
+            keys = {"active"}
+            for keyword in node.keywords:
+                if keyword.arg is None or keyword.arg == "load_profile":
+                    continue
+                if keyword.arg in model.__mapper__.relationships:
+                    relationship = model.__mapper__.relationships[keyword.arg]
+                    keys.update(column.key for column in relationship.local_columns)
+                else:
+                    keys.add(keyword.arg)
+            shapes.add((model, tuple(sorted((key, False) for key in keys))))
+    return shapes
+
+
+def sample_value(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return 0
+    if issubclass(python_type, Enum):
+        return next(iter(python_type))
+    try:
+        return python_type()
+    except TypeError:
+        return None
+
+
+def explain(model, keys):
+    """
+    Return the plan lines of the query of the shape.
+    """
+    kwargs = {
+        key: None if is_none else sample_value(model.__table__.columns[key])
+        for key, is_none in keys
+        if key in model.__table__.columns
+    }
+    kwargs["active"] = True
+    query = model._build_query_shape(kwargs).params(
+        {f"get_query_{k}": v for k, v in kwargs.items() if v is not None}
+    )
+    statement = query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}"
+        )
+        return [row[-1] for row in rows]
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN {statement}")
+    return [row[0] for row in rows]
+
+
+def is_full_scan(line) -> bool:
+    line = line.strip()
+    return (line.startswith("SCAN") and "USING" not in line) or "Seq Scan" in line
+
+
+def used_indexes(lines) -> set:
+    """
+    Return the names the plan lines use, whole words: an index is not used because its
+    name is the prefix of a used one (ix_cart_active_user_id, ..._session_id).
+    """
+    return {word for line in lines for word in re.findall(r"\w+", line)}
+
+
+def declared_indexes():
+    return {
+        index.name: index
+        for table in db.metadata.sorted_tables
+        for index in table.indexes
+        if index.name
+    }
+
+
+def build_report():
+    shapes = scan_shapes() | set(_query_shapes)
+    plans = {
+        (model, keys): explain(model, keys)
+        for model, keys in sorted(shapes, key=lambda shape: repr(shape))
+    }
+    # listings (active only) scan the table whatever the indexes
+    missing = {
+        (model, keys): plan
+        for (model, keys), plan in plans.items()
+        if len(keys) > 1 and any(map(is_full_scan, plan))
+    }
+    used = used_indexes(line for plan in plans.values() for line in plan)
+    indexes = declared_indexes()
+    existing = {
+        index["name"]
+        for table in inspect(db.engine).get_table_names()
+        for index in inspect(db.engine).get_indexes(table)
+    }
+    return {
+        "missing": missing,
+        "unused": sorted(name for name in indexes if name not in used),
+        "not_created": sorted(name for name in indexes if name not in existing),
+    }
+
+
+@indexes_cli.command("report")
+def report():
+    """Report the missing, unused and not created indexes."""
+    result = build_report()
+    for (model, keys), plan in result["missing"].items():
+        columns = ", ".join(key for key, _ in keys)
+        click.echo(f"MISSING {model.__tablename__} ({columns}): {'; '.join(plan)}")
+    for name in result["unused"]:
+        click.echo(f"UNUSED {name}")
+    for name in result["not_created"]:
+        click.echo(f"NOT CREATED {name}")
+    if not any(result.values()):
+        click.echo("All the query shapes use an index.")
+
+
+@indexes_cli.command("create")
+def create():
+    """Create the declared indexes absent from the database."""
+    for name, index in declared_indexes().items():
+        index.create(bind=db.engine, checkfirst=True)
+        click.echo(f"{name} ok")
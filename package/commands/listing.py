@@ -0,0 +1,40 @@
+"""
+flask listing rebuild
+
+Refresh the product listing read model (models.product_listing) of every product, one
+commit per batch, and delete the rows of the products which don't exist anymore.
+"""
+import click
+
+from flask.cli import AppGroup
+
+from models.product_listing import ProductListingModel
+from models.products import ProductModel
+from plugins.db import db
+
+listing_cli = AppGroup("listing", help="Manage the product listing read model.")
+
+
+@listing_cli.command("rebuild")
+@click.option("--batch-size", default=500, show_default=True)
+def rebuild(batch_size):
+    """Rebuild the product listing read model."""
+    deleted = ProductListingModel.query.filter(
+        ~ProductListingModel.id.in_(db.select(ProductModel.id))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    last_id, refreshed = 0, 0
+    while True:
+        product_ids = [
+            product_id
+            for product_id, in db.session.query(ProductModel.id)
+            .filter(ProductModel.id > last_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+        ]
+        if not product_ids:
+            break
+        ProductListingModel.refresh(product_ids)
+        db.session.commit()
+        last_id, refreshed = product_ids[-1], refreshed + len(product_ids)
+    click.echo(f"{refreshed} product(s) refreshed, {deleted} row(s) deleted")
@@ -0,0 +1,41 @@
+"""
+flask pricing reprice [--coupon CODE]
+
+Reprice every line (product, option) of the active catalog with the coupon in one
+vectorized pass (models.helper.pricing) and print the totals, e.g. to check the cost of
+a coupon on the whole catalog before assigning it.
+"""
+import time
+
+import click
+
+from flask.cli import AppGroup
+
+from models.coupons import CouponModel
+from models.helper import pricing
+
+pricing_cli = AppGroup("pricing", help="Reprice the catalog.")
+
+
+@pricing_cli.command("reprice")
+@click.option("--coupon", "code", default=None, help="Code of the coupon to apply.")
+def reprice(code):
+    """Reprice the whole catalog, with the coupon applied to every product."""
+    coupon = None
+    if code:
+        coupon = CouponModel.get_item(code=code)
+        if not coupon:
+            raise click.BadParameter(f"coupon {code} not found", param_hint="--coupon")
+    started = time.perf_counter()
+    lines = pricing.load_catalog(coupon)
+    loaded = time.perf_counter()
+    # what-if: the coupon applied to the whole catalog
+    base, discount = pricing.price_lines(lines["price"], lines["price_change"], coupon)
+    priced = time.perf_counter()
+    click.echo(
+        f"{len(base)} line(s): {base.sum():.2f} - {discount.sum():.2f} discount"
+        f" = {(base - discount).sum():.2f}"
+    )
+    click.echo(
+        f"loaded in {loaded - started:.3f}s, priced in {priced - loaded:.3f}s"
+    )
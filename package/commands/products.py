@@ -0,0 +1,42 @@
+"""
+flask products import FILE / export
+
+import: import the products of an NDJSON file (one product per line, in the format of
+POST /products/import), one commit per batch, the results are printed as NDJSON.
+export: stream the active products as NDJSON or CSV (utils.product_export).
+"""
+import json
+
+import click
+
+from flask.cli import AppGroup
+
+from utils.product_export import EXPORT_FORMATS, export_products
+from utils.product_import import import_products
+
+products_cli = AppGroup("products", help="Import and export the products.")
+
+
+@products_cli.command("import")
+@click.argument("file", type=click.File("rb"))
+@click.option("--batch-size", default=500, show_default=True)
+def import_file(file, batch_size):
+    """Import the products of the NDJSON FILE ("-" reads stdin)."""
+    for result in import_products(file, batch_size):
+        click.echo(json.dumps(result))
+
+
+@products_cli.command("export")
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(list(EXPORT_FORMATS)),
+    default="ndjson",
+    show_default=True,
+)
+@click.option("--output", type=click.File("w"), default="-", help="Default: stdout.")
+@click.option("--batch-size", default=1000, show_default=True)
+def export(export_format, output, batch_size):
+    """Export the active products with their attrs, options and images."""
+    for chunk in export_products(export_format, batch_size):
+        output.write(chunk)
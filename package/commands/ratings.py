@@ -0,0 +1,75 @@
+"""
+flask ratings reconcile
+
+Recompute the rating aggregates of the products (ProductModel.rating_*) from their active
+reviews, one grouped query and one commit per batch of products, and fix the products
+whose stored aggregates drifted (e.g. reviews written outside of the model hooks).
+"""
+import click
+
+from flask.cli import AppGroup
+from sqlalchemy import case, func
+
+from models.helper.listing import mark_stale
+from models.products import ProductModel
+from models.review import ReviewModel
+from plugins.db import db
+
+ratings_cli = AppGroup("ratings", help="Manage the rating aggregates of the products.")
+
+RATING_KEYS = ("rating_count", "rating_sum", *(f"rating_{r}" for r in range(1, 6)))
+
+
+def get_aggregates(product_ids):
+    """
+    Return {product id: {aggregate key: value}} computed from the active reviews.
+    """
+    rows = (
+        db.session.query(
+            ReviewModel.product_id,
+            func.count(ReviewModel.id),
+            func.sum(ReviewModel.ratings),
+            *(
+                func.sum(case((ReviewModel.ratings == rating, 1), else_=0))
+                for rating in range(1, 6)
+            ),
+        )
+        .filter(ReviewModel.product_id.in_(product_ids), ReviewModel.active)
+        .group_by(ReviewModel.product_id)
+    )
+    aggregates = {product_id: dict.fromkeys(RATING_KEYS, 0) for product_id in product_ids}
+    for product_id, *values in rows:
+        aggregates[product_id] = dict(zip(RATING_KEYS, values))
+    return aggregates
+
+
+@ratings_cli.command("reconcile")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Report the drift without fixing it.")
+def reconcile(batch_size, dry_run):
+    """Fix the rating aggregates which drifted from the reviews."""
+    last_id, checked, drifted = 0, 0, 0
+    while True:
+        products = (
+            ProductModel.query.filter(ProductModel.id > last_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not products:
+            break
+        aggregates = get_aggregates([product.id for product in products])
+        for product in products:
+            expected = aggregates[product.id]
+            if all(getattr(product, key) == expected[key] for key in RATING_KEYS):
+                continue
+            drifted += 1
+            click.echo(f"DRIFT {product.slug}")
+            if not dry_run:
+                for key, value in expected.items():
+                    setattr(product, key, value)
+                mark_stale(product.id)
+        if not dry_run:
+            db.session.commit()
+        last_id, checked = products[-1].id, checked + len(products)
+    click.echo(f"{checked} product(s) checked, {drifted} drifted")
@@ -0,0 +1,44 @@
+"""
+flask search rebuild
+
+Drop and recreate the product search index (models.product_search), then index every
+active product, one commit per batch.
+"""
+import click
+
+from flask.cli import AppGroup
+from sqlalchemy.orm import selectinload
+
+from models import product_search
+from models.products import ProductModel, ProductAttributeModel
+from plugins.db import db
+
+search_cli = AppGroup("search", help="Manage the product search index.")
+
+
+@search_cli.command("rebuild")
+@click.option("--batch-size", default=500, show_default=True)
+def rebuild(batch_size):
+    """Rebuild the product search index."""
+    product_search.drop_index(db.session.connection())
+    product_search.create_index(db.session.connection())
+    last_id, indexed = 0, 0
+    while True:
+        products = (
+            ProductModel.query.filter(ProductModel.active, ProductModel.id > last_id)
+            .options(
+                selectinload(ProductModel.attrs).selectinload(
+                    ProductAttributeModel.attrs_options
+                )
+            )
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not products:
+            break
+        product_search.index_products(products)
+        db.session.commit()
+        last_id, indexed = products[-1].id, indexed + len(products)
+    db.session.commit()
+    click.echo(f"{indexed} product(s) indexed")
@@ -9,3 +9,39 @@ PROPAGATE_EXCEPTIONS = True
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "asdasdasd")
 SECRET_KEY = os.environ.get("APP_SECRET_KEY", "asdasdasd")
 UPLOADED_IMAGES_DEST = os.path.join("static", "images")
+# Commit once per request, SuperModel only flush inside the resources
+UNIT_OF_WORK = os.environ.get("UNIT_OF_WORK", "false").lower() == "true"
+# Cache of SuperModel.get_item / get_items: None (disabled), "local" or "uwsgi"
+MODEL_CACHE_BACKEND = os.environ.get("MODEL_CACHE_BACKEND")
+MODEL_CACHE_TTL = 300
+MODEL_CACHE_MAX_SIZE = 10000
+# Seconds the category tree snapshot of a worker is served without a shared (uwsgi)
+# MODEL_CACHE_BACKEND, whose generations would show it the writes of the other workers
+CATEGORY_TREE_TTL = 30
+# Seconds a total of paginate(count="cached") is kept, writes of the model drop it earlier
+PAGINATION_COUNT_TTL = 60
+# Products saved per transaction by the NDJSON import (POST /products/import)
+PRODUCT_IMPORT_BATCH_SIZE = 500
+# Products read per batch of the server side cursor of the export (GET /products/export)
+PRODUCT_EXPORT_BATCH_SIZE = 1000
+# Variants rendered for every product image: name -> size (px) of the square they fit in
+PRODUCT_IMAGE_VARIANTS = {"thumb": 160, "card": 480, "zoom": 1600}
+# Processes rendering the variants off the request path, 0 renders them in the request
+PRODUCT_IMAGE_WORKERS = int(os.environ.get("PRODUCT_IMAGE_WORKERS", 2))
+# Sender of the image files: None (the app), "x-accel" (nginx X-Accel-Redirect to the
+# internal location IMAGE_ACCEL_PREFIX aliased on UPLOADED_IMAGES_DEST) or "x-sendfile"
+IMAGE_DELIVERY = os.environ.get("IMAGE_DELIVERY")
+IMAGE_ACCEL_PREFIX = "/protected-images/"
+# Seconds the images served by product and name are cached (content names: one year)
+IMAGE_MAX_AGE = 24 * 60 * 60
+# In-memory index of the image files (plugins.image_index), built by one walk at startup
+IMAGE_INDEX = True
+# Follow the changes of the other processes with inotify (Linux, inotify_simple package)
+IMAGE_INDEX_INOTIFY = os.environ.get("IMAGE_INDEX_INOTIFY", "false").lower() == "true"
+# Read replicas (comma separated database urls), the GET requests read from them
+SQLALCHEMY_BINDS = {
+    f"replica_{index}": url
+    for index, url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").split(","))
+    if url
+}
+SQLALCHEMY_REPLICA_BINDS = list(SQLALCHEMY_BINDS)
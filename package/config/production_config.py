@@ -4,3 +4,4 @@ DEBUG = False
 ENV = "production"
 TESTING = False
 SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///data.db")
+MODEL_CACHE_BACKEND = os.environ.get("MODEL_CACHE_BACKEND", "uwsgi")
@@ -8,4 +8,5 @@ from models.products import (
     ProductAttributeModel,
     ProductAttributeOptionsModel,
 )
+from models.product_listing import ProductListingModel
 from models.users import UserSessionModel, UserSessionTokenModel, UserModel
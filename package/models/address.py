@@ -6,6 +6,9 @@ from datetime import datetime
 
 class AddressModel(db.Model, SuperModel):
     __tablename__ = "address"
+    __table_args__ = (
+        db.Index("ix_address_active_user_id", "active", "user_id"),
+    )
 
     # user
     # orders
@@ -1,4 +1,8 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from models.helper import pricing
 from models.helper.super_model import SuperModel, db
+from models.products import ProductModel, ProductAttributeModel
 
 from utils.strings_helper import gettext
 
@@ -7,6 +11,14 @@ from datetime import datetime
 
 class CartModel(db.Model, SuperModel):
     __tablename__ = "cart"
+    __table_args__ = (
+        db.Index(
+            "ix_cart_active_user_id_session_id",
+            "active",
+            "user_id",
+            "session_id",
+        ),
+    )
 
     # there would be "cart_item" and "user" columns
     # user
@@ -25,17 +37,36 @@ class CartModel(db.Model, SuperModel):
     cart_items = db.relationship("CartItemsModel", backref="cart", lazy=True)
     orders = db.relationship("OrderModel", backref="cart", lazy=True, uselist=False)
 
+    load_profiles = {
+        # count_total: coupon, cart_items -> product -> coupons, cart_items -> product_option
+        # CartItemsModel.pre_save: cart_items -> product -> attrs -> attrs_options
+        "cart_pricing": lambda: (
+            joinedload(CartModel.coupon),
+            selectinload(CartModel.cart_items).options(
+                joinedload(CartItemsModel.product_option),
+                joinedload(CartItemsModel.product).options(
+                    selectinload(ProductModel.coupons),
+                    selectinload(ProductModel.attrs).selectinload(
+                        ProductAttributeModel.attrs_options
+                    ),
+                ),
+            ),
+        ),
+    }
+
     @property
     def count_total(self):
-        total_sum = 0
-        if self.cart_items and isinstance(self.cart_items, list):
-            for cart_item in self.cart_items:
-                disc_price = 0
-                cart_item_price = cart_item.get_price()
-                if self.coupon in cart_item.product.coupons:
-                    disc_price = self.coupon.get_discount_price(cart_item_price)
-                total_sum += cart_item_price - disc_price
-        return total_sum
+        if not self.cart_items or not isinstance(self.cart_items, list):
+            return 0
+        base, discount = pricing.price_lines(
+            [cart_item.get_price() for cart_item in self.cart_items],
+            coupon=self.coupon,
+            applies=[
+                self.coupon is not None and self.coupon in cart_item.product.coupons
+                for cart_item in self.cart_items
+            ],
+        )
+        return float((base - discount).sum())
 
     def pre_save(self):
         self.total = self.count_total
@@ -45,8 +76,12 @@ class CartModel(db.Model, SuperModel):
         return f"<{self.__class__.__name__} {self.id}>"
 
     @classmethod
-    def get_or_create(cls, **kwargs):
-        cart = cls.get_item(**kwargs)
+    def get_or_create(cls, load_profile=None, **kwargs):
+        cart = (
+            cls.get_item(load_profile=load_profile, **kwargs)
+            if load_profile
+            else cls.get_item(**kwargs)
+        )
         if cart:
             return cart
         new_cart = cls(**kwargs)
@@ -56,6 +91,15 @@ class CartModel(db.Model, SuperModel):
 
 class CartItemsModel(db.Model, SuperModel):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        db.Index(
+            "ix_cart_items_active_cart_id_product_id_attr_option_id",
+            "active",
+            "cart_id",
+            "product_id",
+            "attr_option_id",
+        ),
+    )
 
     # cart
     # product_option
@@ -1,3 +1,4 @@
+from models.helper import pricing
 from models.helper.super_model import SuperModel, db
 from models.helper.enums import CouponTypeEnum
 
@@ -6,6 +7,10 @@ from datetime import datetime
 
 class CouponModel(db.Model, SuperModel):
     __tablename__ = "coupon"
+    __table_args__ = (
+        db.Index("ix_coupon_active_code", "active", "code"),
+    )
+    cacheable = True
 
     # products
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -30,11 +35,5 @@ class CouponModel(db.Model, SuperModel):
         ), "Coupon's start date is greater than it's expiry date"
 
     def get_discount_price(self, cart_item_price):
-        current_time = datetime.utcnow()
-        if self.start < current_time < self.expire:
-            if self.type == CouponTypeEnum.percentage:
-                disc_price = (cart_item_price * self.value) / 100
-                return min(disc_price, self.max_value, cart_item_price)
-            else:
-                return min(cart_item_price, self.value)
-        return 0
+        _, discount = pricing.price_lines(cart_item_price, coupon=self)
+        return float(discount)
@@ -0,0 +1,19 @@
+"""
+Products whose row of the listing read model (models.product_listing) is stale.
+
+The save hooks of the product, attribute, option, image and review models mark their
+product here, the rows are refreshed in bulk before the commit of the session.
+"""
+from plugins.db import db
+
+STALE_KEY = "product_listing_stale"
+
+
+def mark_stale(*product_ids):
+    db.session.info.setdefault(STALE_KEY, set()).update(
+        product_id for product_id in product_ids if product_id
+    )
+
+
+def pop_stale(session) -> set:
+    return session.info.pop(STALE_KEY, set())
@@ -0,0 +1,139 @@
+"""
+Vectorized price engine.
+
+A line is a (product, option, coupon) tuple, its prices are
+    base     = product price + option price_change (0 without option)
+    discount = percentage coupon: min(base * value / 100, max_value, base)
+               price coupon:      min(value, base)
+               0 if the line has no coupon, if the coupon is not applied to the product
+               or if it is out of its start / expire window
+    final    = base - discount
+The prices of any number of lines are computed at once on NumPy arrays: cart totals
+(CartModel.count_total), coupon discounts (CouponModel.get_discount_price), coupon
+previews and catalog-wide repricing (price_catalog) all go through `discount`.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from sqlalchemy import and_, exists, func, literal
+
+from models.helper.enums import CouponTypeEnum
+from models.products import (
+    ProductModel,
+    ProductAttributeModel,
+    ProductAttributeOptionsModel,
+    coupons_table,
+)
+from plugins.db import db
+
+PERCENTAGE, PRICE = 0, 1
+
+
+def coupon_params(coupon, now=None):
+    """
+    Return the (kind, value, max_value, valid) of the coupon, no coupon is never valid.
+    """
+    if coupon is None:
+        return PERCENTAGE, 0.0, np.inf, False
+    now = now or datetime.utcnow()
+    return (
+        PRICE if coupon.type == CouponTypeEnum.price else PERCENTAGE,
+        float(coupon.value or 0),
+        np.inf if coupon.max_value is None else float(coupon.max_value),
+        bool(coupon.start < now < coupon.expire),
+    )
+
+
+def discount(base, kind, value, max_value, valid):
+    """
+    Return the discount of every line, the arguments are arrays of one value per line
+    (or scalars, shared by all the lines).
+    """
+    base = np.asarray(base, dtype=float)
+    percentage = np.minimum(np.minimum(base * value / 100, max_value), base)
+    price = np.minimum(value, base)
+    return np.where(valid, np.where(kind == PRICE, price, percentage), 0.0)
+
+
+def price_lines(prices, price_changes=0.0, coupon=None, applies=True, now=None):
+    """
+    Return the (base, discount) arrays of the lines with the same coupon.
+    applies: bool (array) whether the coupon is applied to the product of the line
+    """
+    base = np.asarray(prices, dtype=float) + np.asarray(price_changes, dtype=float)
+    kind, value, max_value, valid = coupon_params(coupon, now)
+    return base, discount(base, kind, value, max_value, np.logical_and(valid, applies))
+
+
+def load_catalog(coupon=None, product_ids=None):
+    """
+    Return the arrays of the lines of the active products: one line per active option
+    of their active attributes, one line without option for the products without any.
+    One query, the columns are read straight into the arrays.
+
+    @return: product_id, option_id (-1 without option), price, price_change, applies
+    (the coupon is applied to the product)
+    @rtype: dict of numpy arrays
+    """
+    applies = (
+        exists().where(
+            and_(
+                coupons_table.c.product_id == ProductModel.id,
+                coupons_table.c.coupon_id == coupon.id,
+            )
+        )
+        if coupon is not None
+        else literal(False)
+    )
+    query = (
+        db.session.query(
+            ProductModel.id,
+            func.coalesce(ProductAttributeOptionsModel.id, -1),
+            ProductModel.price,
+            func.coalesce(ProductAttributeOptionsModel.price_change, 0),
+            applies,
+        )
+        .outerjoin(
+            ProductAttributeModel,
+            and_(
+                ProductAttributeModel.product_id == ProductModel.id,
+                ProductAttributeModel.active,
+            ),
+        )
+        .outerjoin(
+            ProductAttributeOptionsModel,
+            and_(
+                ProductAttributeOptionsModel.attr_id == ProductAttributeModel.id,
+                ProductAttributeOptionsModel.active,
+            ),
+        )
+        .filter(ProductModel.active)
+        .order_by(ProductModel.id, ProductAttributeOptionsModel.id)
+    )
+    if product_ids is not None:
+        query = query.filter(ProductModel.id.in_(product_ids))
+    rows = query.all()
+    columns = list(zip(*rows)) or [(), (), (), (), ()]
+    return {
+        "product_id": np.array(columns[0], dtype=np.int64),
+        "option_id": np.array(columns[1], dtype=np.int64),
+        "price": np.array(columns[2], dtype=float),
+        "price_change": np.array(columns[3], dtype=float),
+        "applies": np.array(columns[4], dtype=bool),
+    }
+
+
+def price_catalog(coupon=None, product_ids=None, now=None):
+    """
+    Reprice the whole catalog (or the products) with the coupon in one vectorized pass.
+
+    @return: the arrays of load_catalog with base, discount and final
+    @rtype: dict of numpy arrays
+    """
+    lines = load_catalog(coupon, product_ids)
+    lines["base"], lines["discount"] = price_lines(
+        lines["price"], lines["price_change"], coupon, lines["applies"], now
+    )
+    lines["final"] = lines["base"] - lines["discount"]
+    return lines
@@ -0,0 +1,67 @@
+"""
+Column based serializer of the models.
+
+The column keys of every model are computed once from the mapper, relationships are only
+walked when asked (dotted paths, e.g. ("attrs", "attrs.attrs_options")), so serializing
+an instance never fires a lazy load by itself.
+serialize returns the values typed (the same as the schema dumps), stringify turns them
+into the strings of SuperModel.get_json_data.
+"""
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Iterable
+
+# same format as the datetimeformat of the schemas
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+@lru_cache(maxsize=None)
+def get_columns(model) -> tuple:
+    return tuple(column.key for column in model.__mapper__.column_attrs)
+
+
+def serialize_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def serialize(
+    instance, relationships: Iterable[str] = (), exclude: Iterable[str] = ()
+) -> Dict[str, Any]:
+    data = {
+        key: serialize_value(getattr(instance, key))
+        for key in get_columns(type(instance))
+        if key not in exclude
+    }
+    nested = {}
+    for path in relationships:
+        name, _, rest = path.partition(".")
+        nested.setdefault(name, [])
+        if rest:
+            nested[name].append(rest)
+    for name, paths in nested.items():
+        value = getattr(instance, name)
+        if value is None:
+            data[name] = None
+        elif hasattr(value, "__mapper__"):
+            data[name] = serialize(value, paths, exclude)
+        else:
+            data[name] = [serialize(item, paths, exclude) for item in value]
+    return data
+
+
+def stringify(data):
+    """
+    Return the serialized data with every value as a string (None as "None").
+    """
+    if isinstance(data, dict):
+        return {key: stringify(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [stringify(item) for item in data]
+    return str(data)
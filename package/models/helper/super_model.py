@@ -1,38 +1,141 @@
 from typing import Dict, Any
 
-import json
-
-from flask import jsonify
+from sqlalchemy import bindparam, inspect
+from sqlalchemy.orm import make_transient_to_detached
 
 from plugins.db import db
+from plugins.cache import model_cache, MISSING
+
+from models.helper.serializer import serialize, stringify
+from models.helper.unit_of_work import commit
 
 from enum import Enum
 
+# get_query shape -> query with bind parameters
+_query_shapes = {}
+
 
 class SuperModel:
+    # get_item / get_items of the cacheable models are served through the model_cache
+    cacheable = False
+    # columns never written to the cache (secrets), loaded from the db when accessed
+    cache_exclude = ()
+    # name of the load profile -> callable returning the loader options of that profile
+    load_profiles = {}
+
     @classmethod
     def get_active(cls, active=True):
         return cls.query.filter_by(active=active)
 
     @classmethod
-    def get_query(cls, *args, **kwargs):
-        query = cls.get_active(kwargs.get("active", True))
+    def get_query(cls, *args, load_profile=None, **kwargs):
+        """
+        Return the query of the items matching the kwargs (active items by default).
+        The query of each shape (model, filter keys, None values) is built once with
+        bind parameters for the column filters, then only the parameters change, so the
+        repeated shapes skip the query construction and hit the SQL compilation cache.
+        Relationship filters (e.g. cart=cart) are still added per call.
+
+        load_profile: name of the load profile (cls.load_profiles) applied on the query
+        """
+        kwargs.setdefault("active", True)
+        shape = (cls, tuple(sorted((k, v is None) for k, v in kwargs.items())))
+        query = _query_shapes.get(shape)
+        if query is None:
+            query = _query_shapes[shape] = cls._build_query_shape(kwargs)
+        query = query.with_session(db.session()).params(
+            {
+                f"get_query_{k}": v
+                for k, v in kwargs.items()
+                if v is not None and k in cls.__mapper__.column_attrs
+            }
+        )
         for k, v in kwargs.items():
-            query = query.filter(getattr(cls, k) == v)
+            if k not in cls.__mapper__.column_attrs:
+                query = query.filter(getattr(cls, k) == v)
+        if load_profile:
+            query = query.options(*cls.load_profiles[load_profile]())
         return query
 
     @classmethod
-    def get_item(cls, *args, **kwargs):
-        return cls.get_query(*args, **kwargs).first()
+    def _build_query_shape(cls, kwargs):
+        criteria = [
+            getattr(cls, k).is_(None)
+            if v is None
+            else getattr(cls, k) == bindparam(f"get_query_{k}")
+            for k, v in sorted(kwargs.items())
+            if k in cls.__mapper__.column_attrs
+        ]
+        return cls.query_class(cls).filter(*criteria)
+
+    @classmethod
+    def get_item(cls, *args, load_profile=None, **kwargs):
+        # cached instances have no eager loaded relationships, so profiled loads skip it
+        key = (
+            model_cache.key(cls, "item", kwargs)
+            if cls.cacheable and not load_profile
+            else None
+        )
+        if key:
+            state = model_cache.get(cls, key)
+            if state is not MISSING:
+                return cls.from_cache_state(state)
+        item = cls.get_query(*args, load_profile=load_profile, **kwargs).first()
+        # a lagging replica would store an old row under the generation of the primary
+        if key and not db.session().reads_replica:
+            model_cache.set(key, item.to_cache_state() if item else None)
+        return item
+
+    @classmethod
+    def get_items(cls, *args, load_profile=None, **kwargs):
+        key = (
+            model_cache.key(cls, "items", kwargs)
+            if cls.cacheable and not load_profile
+            else None
+        )
+        if key:
+            states = model_cache.get(cls, key)
+            if states is not MISSING:
+                return [cls.from_cache_state(state) for state in states]
+        items = cls.get_query(*args, load_profile=load_profile, **kwargs).all()
+        if key and not db.session().reads_replica:
+            model_cache.set(key, [item.to_cache_state() for item in items])
+        return items
+
+    def to_cache_state(self) -> Dict[str, Any]:
+        return {
+            column.key: getattr(self, column.key)
+            for column in self.__mapper__.column_attrs
+            if column.key not in self.cache_exclude
+        }
 
     @classmethod
-    def get_items(cls, *args, **kwargs):
-        return cls.get_query(*args, **kwargs).all()
+    def from_cache_state(cls, state):
+        """
+        Build the persistent instance of the cached column values without hitting the db.
+        The instance already present in the session is returned as it is.
+        """
+        if state is None:
+            return None
+        instance = cls(**state)
+        make_transient_to_detached(instance)
+        present = db.session.identity_map.get(inspect(instance).key)
+        if present is not None:
+            return present
+        db.session.add(instance)
+        return instance
 
     @classmethod
     def get_all(cls, active=True):
         return cls.get_active(active=active).all()
 
+    @classmethod
+    def get_query_in(cls, key, values, active=True):
+        """
+        Return the query of active items whose `key` column is one of `values`.
+        """
+        return cls.get_active(active).filter(getattr(cls, key).in_(values))
+
     def pre_save(self):
         pass
 
@@ -41,17 +144,86 @@ class SuperModel:
 
     def save_to_db(self, *args, **kwargs):
         self.pre_save()
-        db.session.add(self)
-        db.session.commit()
         try:
+            db.session.add(self)
+            commit()
             post_save_flag = self.post_save()
             if not post_save_flag:
                 db.session.add(self)
-            db.session.commit()
+            commit()
         except Exception as e:
             db.session.rollback()
             raise e
 
+    @classmethod
+    def save_many(cls, items, batch_size=1000):
+        """
+        Persist the items with one commit per batch.
+        1. run pre_save of every item of the batch and stage it
+        2. flush the batch, so the ids are available to post_save
+        3. run post_save of every item of the batch
+        4. commit the batch, rollback the whole batch if anything fails
+
+        @return: saved items
+        @rtype: list
+        """
+        items = list(items)
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            try:
+                for item in batch:
+                    item.pre_save()
+                    db.session.add(item)
+                db.session.flush()
+                for item in batch:
+                    if not item.post_save():
+                        db.session.add(item)
+                commit()
+            except Exception as e:
+                db.session.rollback()
+                raise e
+        return items
+
+    @classmethod
+    def bulk_upsert(cls, items, key, batch_size=1000):
+        """
+        Insert or update the items, matched on the unique `key` column
+        (e.g. slug, email, code), with one commit per batch.
+        The column values of an item matching an existing row are copied on that row,
+        the others are inserted as new rows.
+
+        @return: saved items (existing rows for the matched ones)
+        @rtype: list
+        """
+        columns = [
+            column.key
+            for column in cls.__mapper__.column_attrs
+            if not column.columns[0].primary_key
+        ]
+        saved = []
+        items = list(items)
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            keys = [getattr(item, key) for item in batch if getattr(item, key)]
+            existing = {
+                getattr(row, key): row
+                for row in cls.query.filter(getattr(cls, key).in_(keys))
+            }
+            for item in batch:
+                row = existing.get(getattr(item, key))
+                if row is None:
+                    saved.append(item)
+                    continue
+                for column in columns:
+                    value = getattr(item, column)
+                    if value is not None:
+                        setattr(row, column, value)
+                if item in db.session:
+                    db.session.expunge(item)
+                saved.append(row)
+            cls.save_many(saved[start:], batch_size=batch_size)
+        return saved
+
     def pre_delete(self):
         pass
 
@@ -61,28 +233,18 @@ class SuperModel:
     def delete_from_db(self, *args, **kwargs):
         self.pre_delete()
         db.session.delete(self)
-        db.session.commit()
+        commit()
         self.post_delete()
 
-    def get_json_data(self) -> Dict[str, Any]:
-        data_dict = {}
-        for attr in dir(self):
-            # print(getattr(self, attr))
-            if (
-                not callable(getattr(self, attr))
-                and not attr.startswith("__")
-                and not attr.startswith("_")
-            ):
-                if attr not in ["metadata", "query"]:
-                    value = getattr(self, attr)
-                    if isinstance(value, Enum):
-                        data_dict[attr] = value.value
-                    if isinstance(value, list):
-                        data_dict[attr] = [str(item) for item in value]
-                    else:
-                        data_dict[attr] = str(value)
-
-        return json.loads(jsonify(data_dict).response[0].decode())
+    def get_json_data(self, relationships=(), exclude=()) -> Dict[str, Any]:
+        """
+        Return the column values of the item as a plain dict of strings (enum values,
+        formatted datetimes), the types it always returned. serializer.serialize returns
+        the typed values.
+        relationships: dotted paths of the relationships to include, e.g. ("attrs.attrs_options",)
+        exclude: column keys to leave out
+        """
+        return stringify(serialize(self, relationships, exclude))
 
     def get(self, attr):
         if (
@@ -118,6 +280,7 @@ class SuperModel:
 
     def deactivate(self):
         setattr(self, "active", False)
+        model_cache.invalidate(type(self))
         return getattr(self, "active")
 
     def __repr__(self) -> str:
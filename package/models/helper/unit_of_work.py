@@ -0,0 +1,78 @@
+"""
+Request scoped unit-of-work.
+
+When the UNIT_OF_WORK config is enabled, the resources are dispatched inside a unit-of-work.
+Inside it, SuperModel only stages (flush) the changes and the request is committed once
+when the resource returns a successful (< 400) response, or rolled back if it raises or
+returns an error response.
+The number of commits made by every request is kept in `g.db_commit_count`.
+"""
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request
+
+from plugins.db import db
+
+
+def in_unit_of_work() -> bool:
+    return has_app_context() and g.get("unit_of_work_active", False)
+
+
+def commit():
+    """
+    Commit the session, or only flush it when a unit-of-work is active.
+    """
+    if in_unit_of_work():
+        db.session.flush()
+        g.unit_of_work_pending = True
+        return
+    db.session.commit()
+    if has_app_context():
+        g.db_commit_count = g.get("db_commit_count", 0) + 1
+
+
+def response_status(response) -> int:
+    """
+    Status code of a resource return value: a response object, (data, status[, headers])
+    or the plain data (200).
+    """
+    status_code = getattr(response, "status_code", None)
+    if status_code is not None:
+        return status_code
+    if isinstance(response, tuple) and len(response) > 1:
+        if isinstance(response[1], int):
+            return response[1]
+    return 200
+
+
+def unit_of_work(func):
+    """
+    Decorator for the resource dispatch (Api(decorators=[unit_of_work])).
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.db_commit_count = 0
+        enabled = current_app.config.get("UNIT_OF_WORK", False)
+        g.unit_of_work_active = enabled
+        g.unit_of_work_pending = False
+        try:
+            response = func(*args, **kwargs)
+            g.unit_of_work_active = False
+            if g.unit_of_work_pending:
+                if response_status(response) < 400:
+                    commit()
+                else:
+                    db.session.rollback()
+            return response
+        except Exception:
+            if enabled:
+                db.session.rollback()
+            raise
+        finally:
+            g.unit_of_work_active = False
+            current_app.logger.debug(
+                "%s %s: %s commit(s)", request.method, request.path, g.db_commit_count
+            )
+
+    return wrapper
@@ -19,6 +19,10 @@ order_address = db.Table(
 
 class OrderModel(db.Model, SuperModel):
     __tablename__ = "order"
+    __table_args__ = (
+        db.Index("ix_order_active_user_id", "active", "user_id"),
+        db.Index("ix_order_active_cart_id", "active", "cart_id"),
+    )
 
     # order_receiver
     # cart
@@ -42,7 +46,9 @@ class OrderModel(db.Model, SuperModel):
         backref=db.backref("orders", lazy=True),
     )
 
-    order_receiver_id = db.Column(db.ForeignKey("order_receiver.id"), nullable=False)
+    order_receiver_id = db.Column(
+        db.ForeignKey("order_receiver.id"), nullable=False, index=True
+    )
     cart_id = db.Column(db.ForeignKey("cart.id"), nullable=False)
     user_id = db.Column(db.ForeignKey("user.id"), nullable=False)
 
@@ -1,10 +1,45 @@
+from sqlalchemy import and_, event, exists, inspect, literal, true
+
+from models.helper.listing import mark_stale
 from models.helper.super_model import SuperModel, db
+from plugins.cache import model_cache
+
+from utils.strings_helper import gettext
 
 from datetime import datetime
 
+import hashlib
+import json
+import time
+
+# Closure table of the category tree: one row per (ancestor, descendant) pair, the
+# category itself included (depth 0). Kept in sync by the mapper events below when a
+# category is created, moved (parent_id) or deleted, rebuilt by `flask categories rebuild`.
+# A whole subtree, or the ancestors of a category, are then one indexed read at any depth.
+category_tree = db.Table(
+    "product_category_tree",
+    db.Column(
+        "ancestor_id",
+        db.Integer,
+        db.ForeignKey("product_category.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column(
+        "descendant_id",
+        db.Integer,
+        db.ForeignKey("product_category.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column("depth", db.Integer, nullable=False),
+    db.Index("ix_product_category_tree_descendant_id_depth", "descendant_id", "depth"),
+)
+
 
 class ProductCategoryModel(db.Model, SuperModel):
     __tablename__ = "product_category"
+    __table_args__ = (
+        db.Index("ix_product_category_active_parent_id", "active", "parent_id"),
+    )
 
     # parent
     id = db.Column(db.Integer, primary_key=True)
@@ -20,5 +55,241 @@ class ProductCategoryModel(db.Model, SuperModel):
     )
     product = db.relationship("ProductModel", backref="category", lazy=True)
 
+    # (generation, version, nested active tree, build time) of get_tree, per process
+    _tree_snapshot = (None, None, None, 0)
+
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.name}>"
+
+    def pre_save(self):
+        # a category can't be moved under itself or under one of its descendants
+        with db.session.no_autoflush:
+            assert not (
+                self.id and self.is_ancestor_of(self.parent_id)
+            ), gettext("product_category_parent_not_valid")
+
+    def post_save(self):
+        # category path of the listing rows of the products of the subtree
+        product = type(self).product.property.mapper.class_
+        mark_stale(
+            *(
+                product_id
+                for product_id, in db.session.query(product.id).filter(
+                    product.category_id.in_(
+                        db.select(category_tree.c.descendant_id).where(
+                            category_tree.c.ancestor_id == self.id
+                        )
+                    )
+                )
+            )
+        )
+        return True
+
+    def is_ancestor_of(self, category_id) -> bool:
+        """
+        Return True if the category is the category of the id or one of its ancestors.
+        """
+        return bool(
+            db.session.query(
+                exists().where(
+                    and_(
+                        category_tree.c.ancestor_id == self.id,
+                        category_tree.c.descendant_id == category_id,
+                    )
+                )
+            ).scalar()
+        )
+
+    @classmethod
+    def visible(cls, path):
+        """
+        Return the clause of the closure rows (path) without any inactive category
+        between their ancestor and their descendant, both included: the descendants of a
+        deactivated category are hidden along with it.
+        """
+        above = category_tree.alias("above")
+        inactive = cls.__table__.alias("inactive")
+        return ~exists().where(
+            and_(
+                above.c.descendant_id == path.c.descendant_id,
+                above.c.depth <= path.c.depth,
+                above.c.ancestor_id == inactive.c.id,
+                db.not_(inactive.c.active),
+            )
+        )
+
+    @classmethod
+    def subtree_ids(cls, category_id):
+        """
+        Return the select of the ids of the active category and of all its active
+        descendants (closure table), to be used in an IN filter without an extra query.
+        """
+        return db.select(category_tree.c.descendant_id).where(
+            category_tree.c.ancestor_id == category_id, cls.visible(category_tree)
+        )
+
+    @classmethod
+    def get_subtree(cls, category_id):
+        """
+        Return the [(category, depth)] of the active category and of all its active
+        descendants, ordered by depth then name, in one query whatever the depth.
+        """
+        return (
+            db.session.query(cls, category_tree.c.depth)
+            .join(category_tree, category_tree.c.descendant_id == cls.id)
+            .filter(
+                category_tree.c.ancestor_id == category_id, cls.visible(category_tree)
+            )
+            .order_by(category_tree.c.depth, cls.name, cls.id)
+            .all()
+        )
+
+    @classmethod
+    def get_paths(cls, category_ids):
+        """
+        Return {category id: "parent > ... > category"} of the categories, the ancestors
+        are fetched in one query (closure table).
+        """
+        category_ids = [category_id for category_id in category_ids if category_id]
+        if not category_ids:
+            return {}
+        rows = db.session.execute(
+            db.select(category_tree.c.descendant_id, cls.name)
+            .join(cls, cls.id == category_tree.c.ancestor_id)
+            .where(category_tree.c.descendant_id.in_(category_ids))
+            .order_by(category_tree.c.descendant_id, category_tree.c.depth.desc())
+        )
+        names = {}
+        for category_id, name in rows:
+            names.setdefault(category_id, []).append(name or "")
+        return {
+            category_id: " > ".join(names.get(category_id, ()))
+            for category_id in category_ids
+        }
+
+    @classmethod
+    def get_tree(cls, ttl=None):
+        """
+        Return the (version, tree) of the whole active category tree, nested
+        [{"id", "name", "value", "children": [...]}], ordered by name.
+        The tree is an in-process snapshot of the model_cache generation of the
+        categories it was built at, bumped by every write of a category. With the
+        "uwsgi" MODEL_CACHE_BACKEND the generation is shared, so a write in any worker
+        rebuilds the snapshot of every worker (with one query) on its next read, and the
+        version is the generation. Otherwise the generation only sees the writes of this
+        process: the snapshot is also rebuilt after ttl seconds, and the version is the
+        digest of the tree, the same for the same tree in every worker.
+        """
+        generation = model_cache.generation(cls)
+        snapshot_generation, version, tree, built = cls._tree_snapshot
+        if snapshot_generation == generation and (
+            model_cache.shared or ttl is None or time.monotonic() - built < ttl
+        ):
+            return version, tree
+        nodes, children = {}, {}
+        for category in cls.query.filter(cls.active).order_by(cls.name, cls.id):
+            nodes[category.id] = {
+                "id": category.id,
+                "name": category.name,
+                "value": category.value,
+                "children": children.setdefault(category.id, []),
+            }
+            children.setdefault(category.parent_id or 0, []).append(nodes[category.id])
+        # the subcategories of an inactive (or deleted) category are left out with it
+        tree = children.get(0, [])
+        version = (
+            generation
+            if model_cache.shared
+            else hashlib.sha1(json.dumps(tree, sort_keys=True).encode()).hexdigest()
+        )
+        cls._tree_snapshot = (generation, version, tree, time.monotonic())
+        return version, tree
+
+    @classmethod
+    def rebuild_tree(cls):
+        """
+        Rebuild the closure table from the parent_id of the categories (recursive CTE),
+        in one statement.
+
+        @return: number of rows of the closure table
+        @rtype: int
+        """
+        paths = db.select(
+            cls.id.label("ancestor_id"),
+            cls.id.label("descendant_id"),
+            literal(0).label("depth"),
+        ).cte("paths", recursive=True)
+        paths = paths.union_all(
+            db.select(paths.c.ancestor_id, cls.id, paths.c.depth + 1).where(
+                cls.parent_id == paths.c.descendant_id, cls.id != cls.parent_id
+            )
+        )
+        db.session.execute(category_tree.delete())
+        db.session.execute(
+            category_tree.insert().from_select(
+                ["ancestor_id", "descendant_id", "depth"], db.select(paths)
+            )
+        )
+        return db.session.query(category_tree).count()
+
+
+@event.listens_for(ProductCategoryModel, "after_insert")
+def insert_tree_paths(mapper, connection, category):
+    # the paths of the parent extended by the category, and the category itself
+    connection.execute(
+        category_tree.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            db.select(
+                category_tree.c.ancestor_id,
+                literal(category.id),
+                category_tree.c.depth + 1,
+            )
+            .where(category_tree.c.descendant_id == category.parent_id)
+            .union_all(
+                db.select(literal(category.id), literal(category.id), literal(0))
+            ),
+        )
+    )
+
+
+@event.listens_for(ProductCategoryModel, "after_update")
+def move_tree_paths(mapper, connection, category):
+    if not inspect(category).attrs.parent_id.history.has_changes():
+        return
+    subtree = db.select(category_tree.c.descendant_id).where(
+        category_tree.c.ancestor_id == category.id
+    )
+    # detach the subtree from its old ancestors, then attach it to the new ones
+    connection.execute(
+        category_tree.delete().where(
+            category_tree.c.descendant_id.in_(subtree),
+            category_tree.c.ancestor_id.not_in(subtree),
+        )
+    )
+    above, below = category_tree.alias("above"), category_tree.alias("below")
+    connection.execute(
+        category_tree.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            db.select(
+                above.c.ancestor_id,
+                below.c.descendant_id,
+                above.c.depth + below.c.depth + 1,
+            )
+            # every new ancestor with every node of the subtree
+            .select_from(above.join(below, true()))
+            .where(
+                above.c.descendant_id == category.parent_id,
+                below.c.ancestor_id == category.id,
+            ),
+        )
+    )
+
+
+@event.listens_for(ProductCategoryModel, "after_delete")
+def delete_tree_paths(mapper, connection, category):
+    connection.execute(
+        category_tree.delete().where(
+            (category_tree.c.ancestor_id == category.id)
+            | (category_tree.c.descendant_id == category.id)
+        )
+    )
@@ -0,0 +1,137 @@
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+from models.helper.listing import pop_stale
+from models.helper.super_model import SuperModel, db
+from models.product_category import ProductCategoryModel
+from models.products import (
+    ProductModel,
+    ProductAttributeModel,
+    ProductAttributeOptionsModel,
+    ProductImageModel,
+)
+
+
+class ProductListingModel(db.Model, SuperModel):
+    __tablename__ = "product_listing"
+    # same keyset pagination and filters as ProductModel
+    __table_args__ = (
+        db.Index("ix_product_listing_active_created_id", "active", "created", "id"),
+        db.Index("ix_product_listing_active_price_id", "active", "price", "id"),
+        db.Index(
+            "ix_product_listing_active_category_id_price",
+            "active",
+            "category_id",
+            "price",
+        ),
+        # max(updated) of the validators of /products (utils.conditional)
+        db.Index("ix_product_listing_updated", "updated"),
+    )
+
+    # Flat read model of /products, one row per product (id is the product id), with
+    # the fields pre-rendered from the product, its options, images, reviews and category.
+    # The rows are refreshed before the commit of any write of those (models.helper.listing)
+    id = db.Column(
+        db.Integer,
+        db.ForeignKey("product.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    name = db.Column(db.String(80), nullable=False)
+    slug = db.Column(db.String(80))
+    price = db.Column(db.Float(precision=2), nullable=False)
+    min_price = db.Column(db.Float(precision=2), nullable=False)
+    max_price = db.Column(db.Float(precision=2), nullable=False)
+    image = db.Column(db.String(255), nullable=True)
+    rating = db.Column(db.Float(precision=2), nullable=True)
+    rating_count = db.Column(db.Integer, default=0)
+    category_id = db.Column(db.Integer, nullable=True)
+    category_path = db.Column(db.String(255), nullable=True)
+    active = db.Column(db.Boolean, default=True)
+    created = db.Column(db.DateTime)
+    updated = db.Column(db.DateTime)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.name}>"
+
+    @classmethod
+    def refresh(cls, product_ids):
+        """
+        Refresh the rows of the products, with one query per source whatever the number
+        of products, the rows of the deleted products are deleted.
+        """
+        product_ids = list(product_ids)
+        products = {
+            product.id: product
+            for product in ProductModel.query.filter(ProductModel.id.in_(product_ids))
+        }
+        listings = {
+            listing.id: listing
+            for listing in cls.query.filter(cls.id.in_(product_ids))
+        }
+        price_changes = {
+            product_id: (low, high)
+            for product_id, low, high in db.session.query(
+                ProductAttributeModel.product_id,
+                func.min(ProductAttributeOptionsModel.price_change),
+                func.max(ProductAttributeOptionsModel.price_change),
+            )
+            .join(ProductAttributeModel.attrs_options)
+            .filter(
+                ProductAttributeModel.product_id.in_(product_ids),
+                ProductAttributeModel.active,
+                ProductAttributeOptionsModel.active,
+            )
+            .group_by(ProductAttributeModel.product_id)
+        }
+        first_images = (
+            db.session.query(func.min(ProductImageModel.id))
+            .filter(
+                ProductImageModel.product_slug.in_(
+                    [product.slug for product in products.values()]
+                ),
+                ProductImageModel.active,
+            )
+            .group_by(ProductImageModel.product_slug)
+        )
+        images = dict(
+            db.session.query(ProductImageModel.product_slug, ProductImageModel.image_name)
+            .filter(ProductImageModel.id.in_(first_images))
+        )
+        paths = ProductCategoryModel.get_paths(
+            {product.category_id for product in products.values()}
+        )
+
+        for product_id in product_ids:
+            product, listing = products.get(product_id), listings.get(product_id)
+            if product is None:
+                if listing is not None:
+                    db.session.delete(listing)
+                continue
+            if listing is None:
+                listing = cls(id=product_id)
+                db.session.add(listing)
+            low, high = price_changes.get(product_id, (0, 0))
+            listing.name = product.name
+            listing.slug = product.slug
+            listing.price = product.price
+            listing.min_price = product.price + (low or 0)
+            listing.max_price = product.price + (high or 0)
+            listing.image = images.get(product.slug)
+            listing.rating = product.rating
+            listing.rating_count = product.rating_count
+            listing.category_id = product.category_id
+            listing.category_path = paths.get(product.category_id)
+            listing.active = product.active
+            listing.created = product.created
+            # refresh time, the validators of /products (utils.conditional) rely on it
+            listing.updated = datetime.utcnow()
+
+
+@event.listens_for(db.session, "before_commit")
+def refresh_stale_listings(session):
+    product_ids = pop_stale(session)
+    if product_ids:
+        ProductListingModel.refresh(product_ids)
+        session.flush()
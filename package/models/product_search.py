@@ -0,0 +1,193 @@
+"""
+Full-text index of the products: name, description and names of the attribute options.
+
+SQLite: FTS5 virtual table (rowid = product id), ranked by bm25.
+Postgres: tsvector table with a GIN index, ranked by ts_rank.
+The index is created along with the product table (create_all), kept in sync by the
+saves of ProductModel, ProductAttributeModel and ProductAttributeOptionsModel, and can
+be rebuilt with `flask search rebuild`. The saves only mark their product dirty, the
+dirty products are reindexed in one batch before the commit of the session
+(ProductModel.reindex), so saving many products costs the same few statements.
+"""
+import re
+
+from sqlalchemy import Float, Integer, column, event, func, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from plugins.db import db
+
+SEARCH_TABLE = "product_search"
+DIRTY_KEY = "product_search_dirty"
+SEARCH_DDL = {
+    "sqlite": (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+        "USING fts5(name, description, options, tokenize = 'porter unicode61')",
+    ),
+    "postgresql": (
+        "CREATE TABLE IF NOT EXISTS product_search ("
+        "product_id INTEGER PRIMARY KEY REFERENCES product (id) ON DELETE CASCADE, "
+        "document TSVECTOR NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_product_search_document "
+        "ON product_search USING GIN (document)",
+    ),
+}
+# lower is better on both dialects
+SEARCH_RANK = {
+    "sqlite": (
+        "SELECT rowid AS product_id, bm25(product_search, 10.0, 1.0, 5.0) AS rank "
+        "FROM product_search WHERE product_search MATCH :terms"
+    ),
+    "postgresql": (
+        "SELECT product_id, -ts_rank(document, websearch_to_tsquery('english', :terms)) "
+        "AS rank FROM product_search "
+        "WHERE document @@ websearch_to_tsquery('english', :terms)"
+    ),
+}
+
+sqlite_search = table(
+    SEARCH_TABLE,
+    column("rowid"),
+    column("name"),
+    column("description"),
+    column("options"),
+)
+pg_search = table(SEARCH_TABLE, column("product_id"), column("document"))
+
+
+def dialect() -> str:
+    return db.engine.dialect.name
+
+
+def create_index(connection):
+    for statement in SEARCH_DDL.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
+
+def drop_index(connection):
+    if connection.dialect.name in SEARCH_DDL:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+@event.listens_for(db.metadata, "after_create")
+def after_create(metadata, connection, tables=(), **kwargs):
+    if "product" in {table.name for table in tables}:
+        create_index(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def before_drop(metadata, connection, tables=(), **kwargs):
+    if "product" in {table.name for table in tables}:
+        drop_index(connection)
+
+
+def mark_dirty(*product_ids):
+    db.session.info.setdefault(DIRTY_KEY, set()).update(
+        product_id for product_id in product_ids if product_id
+    )
+
+
+def pop_dirty(session) -> set:
+    return session.info.pop(DIRTY_KEY, set())
+
+
+def get_document(product):
+    options = " ".join(
+        option.name
+        for attr in product.attrs
+        if attr.active
+        for option in attr.attrs_options
+        if option.active and option.name
+    )
+    return {
+        "id": product.id,
+        "name": product.name or "",
+        "description": product.description or "",
+        "options": options,
+    }
+
+
+def index_products(products):
+    """
+    Insert or replace the documents of the products in the search index.
+    """
+    documents = [get_document(product) for product in products if product.id]
+    if not documents:
+        return
+    if dialect() == "postgresql":
+        statement = pg_insert(pg_search).values(
+            [
+                {
+                    "product_id": document["id"],
+                    "document": func.setweight(
+                        func.to_tsvector("english", document["name"]), "A"
+                    ).op("||")(
+                        func.setweight(
+                            func.to_tsvector("english", document["options"]), "B"
+                        )
+                    ).op("||")(
+                        func.setweight(
+                            func.to_tsvector("english", document["description"]), "C"
+                        )
+                    ),
+                }
+                for document in documents
+            ]
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["product_id"],
+                set_={"document": statement.excluded.document},
+            )
+        )
+    elif dialect() == "sqlite":
+        remove_products([document["id"] for document in documents])
+        db.session.execute(
+            sqlite_search.insert(),
+            [
+                {
+                    "rowid": document["id"],
+                    "name": document["name"],
+                    "description": document["description"],
+                    "options": document["options"],
+                }
+                for document in documents
+            ],
+        )
+
+
+def remove_products(product_ids):
+    if dialect() == "postgresql":
+        db.session.execute(
+            pg_search.delete().where(pg_search.c.product_id.in_(product_ids))
+        )
+    elif dialect() == "sqlite":
+        db.session.execute(
+            sqlite_search.delete().where(sqlite_search.c.rowid.in_(product_ids))
+        )
+
+
+def match_terms(terms) -> str:
+    """
+    Return the query of the terms for the dialect, the words of an FTS5 query are quoted
+    (no syntax error on user input) and the last one is a prefix (search as you type).
+    """
+    if dialect() != "sqlite":
+        return terms.strip()
+    words = re.findall(r"\w+", terms)
+    return " ".join(f'"{word}"' for word in words) + ("*" if words else "")
+
+
+def ranked_products(terms):
+    """
+    Return the subquery (product_id, rank) of the products matching the terms, or None
+    if the terms have no word.
+    """
+    match = match_terms(terms)
+    if not match or dialect() not in SEARCH_RANK:
+        return None
+    return (
+        text(SEARCH_RANK[dialect()])
+        .bindparams(terms=match)
+        .columns(product_id=Integer, rank=Float)
+        .subquery("ranked_products")
+    )
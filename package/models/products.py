@@ -1,8 +1,18 @@
+from sqlalchemy import event, func
+from sqlalchemy.orm import selectinload
+
+from models import product_search
+from models.helper.listing import mark_stale
 from models.helper.super_model import SuperModel, db
+from models.helper.unit_of_work import commit
+from models.product_category import ProductCategoryModel
 from models.helper.utils import unique_slug_generator
+from plugins.cache import model_cache
 
 from datetime import datetime
 
+import os
+
 coupons_table = db.Table(
     "coupons_table",
     db.Column("product_id", db.Integer, db.ForeignKey("product.id")),
@@ -18,6 +28,15 @@ image_table = db.Table(
 
 class ProductModel(db.Model, SuperModel):
     __tablename__ = "product"
+    # keyset pagination and filters of /products
+    __table_args__ = (
+        db.Index("ix_product_active_created_id", "active", "created", "id"),
+        db.Index("ix_product_active_price_id", "active", "price", "id"),
+        db.Index(
+            "ix_product_active_category_id_price", "active", "category_id", "price"
+        ),
+    )
+    cacheable = True
 
     # category
     id = db.Column(db.Integer, primary_key=True)
@@ -34,6 +53,17 @@ class ProductModel(db.Model, SuperModel):
         db.Integer, db.ForeignKey("product_category.id"), nullable=True
     )
 
+    # aggregates of the active reviews, kept up to date by the ReviewModel hooks
+    # (add_ratings), `flask ratings reconcile` repairs any drift
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # histogram, number of active reviews rated 1 to 5
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     attrs = db.relationship("ProductAttributeModel", backref="product", lazy=True)
     coupons = db.relationship(
         "CouponModel",
@@ -41,19 +71,220 @@ class ProductModel(db.Model, SuperModel):
         backref=db.backref("products", lazy="select"),
     )
     cart_item = db.relationship("CartItemsModel", backref="product", lazy=True)
-    images = db.relationship("ProductImageModel", backref="product", lazy=True)
-    reviews = db.relationship("ReviewModel", backref="product", lazy=False)
+    # the images follow a slug rename, also on the dbs not enforcing ON UPDATE CASCADE
+    images = db.relationship(
+        "ProductImageModel", backref="product", lazy=True, passive_updates=False
+    )
+    reviews = db.relationship("ReviewModel", backref="product", lazy=True)
+
+    load_profiles = {
+        # ProductAllSchema: attrs -> attrs_options
+        "product_listing": lambda: (
+            selectinload(ProductModel.attrs).selectinload(
+                ProductAttributeModel.attrs_options
+            ),
+        ),
+    }
 
     def __repr__(self) -> str:
         return f"<ProductModel {self.name}>"
 
+    @property
+    def rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @property
+    def rating_histogram(self):
+        return {rating: getattr(self, f"rating_{rating}") for rating in range(1, 6)}
+
+    @classmethod
+    def add_ratings(cls, product, added=(), removed=()):
+        """
+        Add the ratings to the aggregates of the product and remove the removed ones,
+        in one UPDATE relative to the stored values (rating_count = rating_count + 1),
+        so concurrent reviews of the product don't overwrite each other.
+
+        product: id of the product, or the product itself while it is not inserted yet
+        (its aggregates are then inserted along with it)
+        """
+        changes = {}
+        for ratings, sign in ((added, 1), (removed, -1)):
+            for rating in ratings:
+                for key, value in (
+                    ("rating_count", sign),
+                    ("rating_sum", sign * rating),
+                    (f"rating_{rating}", sign),
+                ):
+                    changes[key] = changes.get(key, 0) + value
+        changes = {key: value for key, value in changes.items() if value}
+        if isinstance(product, cls):
+            for key, value in changes.items():
+                setattr(product, key, (getattr(product, key) or 0) + value)
+            return
+        if not product or not changes:
+            return
+        cls.query.filter_by(id=product).update(
+            {getattr(cls, key): getattr(cls, key) + value for key, value in changes.items()},
+            synchronize_session=False,
+        )
+        # the bulk UPDATE skips the flush events of model_cache: invalidate the cached
+        # products now, and on commit as for the flushed writes
+        db.session.info.setdefault("model_cache_written", set()).add(cls)
+        model_cache.invalidate(cls)
+        # the instance of the session reloads the new values on its next access
+        instance = db.session.identity_map.get(
+            cls.__mapper__.identity_key_from_primary_key([product])
+        )
+        if instance is not None:
+            db.session.expire(instance, [*changes, "updated"])
+
     def pre_save(self):
         self.slug = self.slug if self.slug else unique_slug_generator(self)
         assert self.price > 0, "Price can't be zero"
 
+    def post_save(self):
+        product_search.mark_dirty(self.id)
+        mark_stale(self.id)
+        return True
+
+    def pre_delete(self):
+        product_search.remove_products([self.id])
+        mark_stale(self.id)
+
+    @classmethod
+    def reindex(cls, product_ids):
+        """
+        Replace the documents of the products in the search index: the products are
+        loaded with their attributes and options in batch (one query each), written
+        with one statement, the deleted ones are removed.
+        """
+        product_ids = set(product_ids)
+        products = (
+            cls.query.filter(cls.id.in_(product_ids))
+            .options(*cls.load_profiles["product_listing"]())
+            .all()
+        )
+        deleted = product_ids - {product.id for product in products}
+        if deleted:
+            product_search.remove_products(deleted)
+        product_search.index_products(products)
+
+    @classmethod
+    def filter_query(
+        cls, query, category_id=None, min_price=None, max_price=None, attrs=None
+    ):
+        """
+        Filter the query of the products (ProductModel or ProductListingModel).
+        category_id: products of the category and of its subcategories
+        min_price / max_price: price range, both included
+        attrs: {attribute name: [option values]}, products having one of the values
+        for every attribute
+        """
+        model = query.column_descriptions[0]["entity"]
+        if category_id is not None:
+            query = query.filter(
+                model.category_id.in_(ProductCategoryModel.subtree_ids(category_id))
+            )
+        if min_price is not None:
+            query = query.filter(model.price >= min_price)
+        if max_price is not None:
+            query = query.filter(model.price <= max_price)
+        for name, values in (attrs or {}).items():
+            query = query.filter(
+                model.id.in_(
+                    db.select(ProductAttributeModel.product_id)
+                    .join(ProductAttributeModel.attrs_options)
+                    .where(
+                        ProductAttributeModel.active,
+                        ProductAttributeModel.name == name,
+                        ProductAttributeOptionsModel.active,
+                        ProductAttributeOptionsModel.value.in_(values),
+                    )
+                )
+            )
+        return query
+
+    @classmethod
+    def facets(cls, query):
+        """
+        Return the facet counts of the products of the query (ProductModel or
+        ProductListingModel), one grouped aggregate query per facet: categories,
+        price range and attribute option values.
+        """
+        model = query.column_descriptions[0]["entity"]
+        ids = (
+            query.enable_eagerloads(False)
+            .order_by(None)
+            .with_entities(model.id)
+            .subquery()
+        )
+        categories = (
+            db.session.query(cls.category_id, func.count(cls.id))
+            .filter(cls.id.in_(db.select(ids.c.id)))
+            .group_by(cls.category_id)
+            .order_by(cls.category_id)
+        )
+        price = (
+            db.session.query(func.min(cls.price), func.max(cls.price))
+            .filter(cls.id.in_(db.select(ids.c.id)))
+            .one()
+        )
+        attrs = (
+            db.session.query(
+                ProductAttributeModel.name,
+                ProductAttributeOptionsModel.value,
+                func.count(func.distinct(ProductAttributeModel.product_id)),
+            )
+            .join(ProductAttributeModel.attrs_options)
+            .filter(
+                ProductAttributeModel.product_id.in_(db.select(ids.c.id)),
+                ProductAttributeModel.active,
+                ProductAttributeOptionsModel.active,
+            )
+            .group_by(ProductAttributeModel.name, ProductAttributeOptionsModel.value)
+            .order_by(ProductAttributeModel.name, ProductAttributeOptionsModel.value)
+        )
+        return {
+            "facets": {
+                "categories": [
+                    {"category_id": category_id, "count": count}
+                    for category_id, count in categories
+                ],
+                "price": {"min": price[0], "max": price[1]},
+                "attrs": [
+                    {"name": name, "value": value, "count": count}
+                    for name, value, count in attrs
+                ],
+            }
+        }
+
+    @classmethod
+    def search(cls, terms, load_profile=None):
+        """
+        Return the query of the active products matching the terms, best match first,
+        None if the terms have no word.
+        """
+        ranked = product_search.ranked_products(terms)
+        if ranked is None:
+            return None
+        return (
+            cls.get_query(load_profile=load_profile)
+            .join(ranked, ranked.c.product_id == cls.id)
+            .order_by(ranked.c.rank, cls.id)
+        )
+
 
 class ProductAttributeModel(db.Model, SuperModel):
     __tablename__ = "product_attr"
+    __table_args__ = (
+        db.Index("ix_product_attr_active_product_id", "active", "product_id"),
+        # attribute filters of /products
+        db.Index(
+            "ix_product_attr_active_name_product_id", "active", "name", "product_id"
+        ),
+    )
 
     # Here we will have a column name "product" which is the object of product
     # product
@@ -71,9 +302,20 @@ class ProductAttributeModel(db.Model, SuperModel):
         "ProductAttributeOptionsModel", backref="attr", lazy=True,
     )
 
+    def post_save(self):
+        # the option names of the product are in the search index
+        product_search.mark_dirty(self.product_id)
+        mark_stale(self.product_id)
+        return True
+
 
 class ProductAttributeOptionsModel(db.Model, SuperModel):
     __tablename__ = "product_attr_option"
+    __table_args__ = (
+        db.Index("ix_product_attr_option_active_name", "active", "name"),
+        # attribute filters of /products
+        db.Index("ix_product_attr_option_attr_id_value", "attr_id", "value"),
+    )
 
     # Here we will have a column name "attr" which have object of product attribute
     # attr
@@ -92,17 +334,148 @@ class ProductAttributeOptionsModel(db.Model, SuperModel):
     def pre_save(self):
         assert self.price_change >= 0, "Price change can't be negetive"
 
+    def post_save(self):
+        if self.attr and self.attr.product:
+            product_search.mark_dirty(self.attr.product_id)
+            mark_stale(self.attr.product_id)
+        return True
+
 
 class ProductImageModel(db.Model, SuperModel):
     __tablename__ = "product_image"
+    __table_args__ = (
+        db.Index(
+            "ix_product_image_active_product_slug_image_name",
+            "active",
+            "product_slug",
+            "image_name",
+        ),
+        db.Index("ix_product_image_digest", "digest"),
+    )
+    # every image request looks its image up (ProductImage.get)
+    cacheable = True
 
     id = db.Column(db.Integer, primary_key=True)
     image_name = db.Column(db.String(255), nullable=False)
+    # sha256 of the content in the content addressed store (utils.image_helper),
+    # None for the files uploaded before it (product_<slug>/<image_name>)
+    digest = db.Column(db.String(64), nullable=True)
     active = db.Column(db.Boolean, default=True)
+    # set when `flask images sweep` deactivated the image for its missing file, only
+    # those images are reactivated by the sweep once their file is back
+    quarantined = db.Column(db.DateTime, nullable=True)
     created = db.Column(db.DateTime, default=datetime.utcnow)
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    product_slug = db.Column(db.ForeignKey("product.slug"), nullable=True)
+    product_slug = db.Column(
+        db.ForeignKey("product.slug", onupdate="CASCADE"), nullable=True
+    )
+
+    variants = db.relationship(
+        "ProductImageVariantModel",
+        backref="image",
+        lazy=True,
+        cascade="all, delete-orphan",
+    )
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.image_name}>"
+
+    def post_save(self):
+        if self.product:
+            mark_stale(self.product.id)
+        return True
+
+    def pre_delete(self):
+        self.post_save()
+
+    @classmethod
+    def get_unique_name(cls, product_slug, image_name) -> str:
+        """
+        Return the image name, suffixed (photo_1.jpg, photo_2.jpg...) if the product
+        already has an image of that name.
+        """
+        name, extension = os.path.splitext(image_name)
+        count = 0
+        while cls.get_item(product_slug=product_slug, image_name=image_name):
+            count += 1
+            image_name = f"{name}_{count}{extension}"
+        return image_name
+
+    @classmethod
+    def references(cls, digest) -> int:
+        """
+        Return the reference count of the stored content: the number of images
+        (of any product) using it, `flask images sweep` quarantines its blob once it
+        is 0.
+        It is counted from the indexed digest column instead of kept in a counter
+        column: a counter would have to be updated by every upload, delete and
+        `flask images store` (racing between concurrent uploads of the same content),
+        the count can't drift. Nothing counts per delete, the sweep reads all the
+        referenced digests in one query.
+        """
+        return cls.query.filter_by(digest=digest).count()
+
+    def get_variant(self, size, formats=()):
+        """
+        Return the rendered variant of the size, in the first of the formats that has
+        one (e.g. ("webp",)), else in the format of the original.
+        None while the variants of the image are not rendered.
+        """
+        variants = ProductImageVariantModel.get_items(image_id=self.id, size=size)
+        variants = {variant.format: variant for variant in variants}
+        for variant_format in formats:
+            if variant_format in variants:
+                return variants[variant_format]
+        return next(
+            (variant for variant in variants.values() if variant.format != "webp"),
+            None,
+        )
+
+
+class ProductImageVariantModel(db.Model, SuperModel):
+    __tablename__ = "product_image_variant"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "image_id", "size", "format", name="uq_product_image_variant_image_id"
+        ),
+    )
+    cacheable = True
+
+    # resized copy of a product image (utils.image_variants), e.g. the webp thumb
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(
+        db.Integer,
+        db.ForeignKey("product_image.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    size = db.Column(db.String(20), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    bytes = db.Column(db.Integer)
+    active = db.Column(db.Boolean, default=True)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.file_name}>"
+
+    @classmethod
+    def record(cls, image_id, variants):
+        """
+        Replace the variants of the image by the rendered ones
+        (dicts of size, format, file_name, width, height and bytes).
+        """
+        for variant in cls.query.filter_by(image_id=image_id):
+            db.session.delete(variant)
+        db.session.add_all(cls(image_id=image_id, **variant) for variant in variants)
+        commit()
+
+
+@event.listens_for(db.session, "before_commit")
+def reindex_dirty_products(session):
+    product_ids = product_search.pop_dirty(session)
+    if product_ids:
+        ProductModel.reindex(product_ids)
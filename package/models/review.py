@@ -1,26 +1,96 @@
+from sqlalchemy import event, inspect
+
+from models.helper.listing import mark_stale
 from models.helper.super_model import SuperModel, db
+from models.products import ProductModel
 
 from datetime import datetime
 
 
 class ReviewModel(db.Model, SuperModel):
     __tablename__ = "review"
+    __table_args__ = (
+        db.Index(
+            "ix_review_active_product_id_user_id",
+            "active",
+            "product_id",
+            "user_id",
+        ),
+    )
 
     # there would be "product" and "user" columns
     # user
     # product
     id = db.Column(db.Integer, primary_key=True)
-    ratings = db.Column(db.Integer, nullable=False)
+    ratings = db.column_property(
+        db.Column(db.Integer, nullable=False), active_history=True
+    )
     comments = db.Column(db.Text, nullable=True)
-    active = db.Column(db.Boolean, default=True)
+    active = db.column_property(db.Column(db.Boolean, default=True), active_history=True)
     created = db.Column(db.DateTime, default=datetime.utcnow)
     updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    product_id = db.Column(db.ForeignKey("product.id"), nullable=False)
+    product_id = db.column_property(
+        db.Column(db.ForeignKey("product.id"), nullable=False, index=True),
+        active_history=True,
+    )
     user_id = db.Column(db.ForeignKey("user.id"), nullable=False)
 
+    def stored_value(self, key):
+        """
+        Return the value of the column as stored in the db, before the changes of the
+        flush (the rating columns have active_history, their old value is always kept).
+        """
+        history = inspect(self).attrs[key].history
+        if history.deleted:
+            return history.deleted[0]
+        return getattr(self, key)
+
+    def update_product_ratings(self, session):
+        """
+        Move the rating of the review in the aggregates of its product, within the
+        flush writing the review: the stored rating (if the stored review is active)
+        is removed and the new one (if the review is active and not deleted) is added.
+        """
+        old = new = None
+        if self not in session.new and self.stored_value("active"):
+            old = (self.stored_value("product_id"), self.stored_value("ratings"))
+        if self.active is not False and self not in session.deleted:
+            # the product of a review cascaded with its new product has no id yet
+            product = self.product_id
+            if product is None and self.product is not None:
+                product = self.product.id or self.product
+            new = (product, self.ratings)
+        if old == new:
+            return
+        if old and new and old[0] == new[0]:
+            ProductModel.add_ratings(new[0], added=[new[1]], removed=[old[1]])
+            return
+        if old:
+            ProductModel.add_ratings(old[0], removed=[old[1]])
+        if new:
+            ProductModel.add_ratings(new[0], added=[new[1]])
+
     def pre_save(self):
         assert 0 < self.ratings <= 5, "ratings should be between 1 and 5"
 
+    def post_save(self):
+        mark_stale(self.product_id)
+        return True
+
+    def pre_delete(self):
+        mark_stale(self.product_id)
+
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.ratings}>"
+
+
+@event.listens_for(db.session, "before_flush")
+def update_product_ratings(session, flush_context, instances):
+    """
+    Keep the rating aggregates of the products in sync with every flushed review: saved,
+    deactivated, deleted or cascaded from its product.
+    """
+    for review in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(review, ReviewModel):
+            review.update_product_ratings(session)
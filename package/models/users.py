@@ -29,6 +29,9 @@ CONFIRMATION_EXPIRATION_DELTA = 1800
 
 class UserModel(UserMixin, db.Model, SuperModel):
     __tablename__ = "user"
+    cacheable = True
+    # the password hash stays out of the (shared) cache
+    cache_exclude = ("password",)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     email = db.Column(db.String(80), nullable=False, unique=True)
@@ -92,6 +95,9 @@ class UserModel(UserMixin, db.Model, SuperModel):
 
 class UserSessionModel(db.Model, SuperModel):
     __tablename__ = "user_session"
+    __table_args__ = (
+        db.Index("ix_user_session_active_user_id_ip", "active", "user_id", "ip"),
+    )
 
     # here we will have virtual column of "user" as there is backref in UserModel
     # user
@@ -122,6 +128,9 @@ class UserSessionModel(db.Model, SuperModel):
 
 class UserSessionTokenModel(db.Model, SuperModel):
     __tablename__ = "user_session_token"
+    __table_args__ = (
+        db.Index("ix_user_session_token_active_session_id", "active", "session_id"),
+    )
 
     # here we will have virtual column of "session" as there is backref in UserModel
     # session
@@ -136,6 +145,7 @@ class UserSessionTokenModel(db.Model, SuperModel):
 
 class UserRoleModel(db.Model, SuperModel):
     __tablename__ = "user_role"
+    cacheable = True
 
     # users
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -0,0 +1,215 @@
+"""
+Read-through cache behind SuperModel.get_item / get_items.
+
+Cached values are the column values of the rows, keyed by model, model generation and
+filter kwargs. Every write of a model (flush, commit, rollback of a flushed write or
+deactivate) bumps the generation of that model, so all of its entries become unreachable
+and expire through TTL / LRU.
+
+Backends (MODEL_CACHE_BACKEND)
+    None: caching disabled, generations are still maintained in process
+    "local": in-process LRU cache with TTL
+    "uwsgi": cache shared by all the uwsgi workers, needs the "model_cache" cache2 of uwsgi.ini
+"""
+import pickle
+import threading
+import time
+
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+from enum import Enum
+
+from sqlalchemy import event
+
+from plugins.db import db
+
+MISSING = object()
+
+CACHEABLE_TYPES = (str, int, float, bool, type(None), Enum, date, datetime)
+
+
+def initial_generation() -> int:
+    # A generation lost by the backend restarts above every generation issued before.
+    return int(time.time() * 1000)
+
+
+class LocalCache:
+    # entries and counters seen by this process only
+    shared = False
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._items[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def get_counter(self, key) -> int:
+        with self._lock:
+            return self._counters.setdefault(key, initial_generation())
+
+    def incr(self, key) -> int:
+        with self._lock:
+            value = self._counters.get(key, initial_generation()) + 1
+            self._counters[key] = value
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class UWSGICache:
+    shared = True
+
+    def __init__(self, name="model_cache", ttl=300):
+        import uwsgi
+
+        self.uwsgi = uwsgi
+        self.name = name
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        value = self.uwsgi.cache_get(key, self.name)
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.uwsgi.cache_update(key, pickle.dumps(value), ttl or self.ttl, self.name)
+
+    def get_counter(self, key) -> int:
+        value = self.uwsgi.cache_get(key, self.name)
+        return int(value) if value is not None else self.incr(key)
+
+    def incr(self, key) -> int:
+        self.uwsgi.lock()
+        try:
+            value = self.uwsgi.cache_get(key, self.name)
+            value = int(value) + 1 if value is not None else initial_generation()
+            self.uwsgi.cache_update(key, str(value).encode(), 0, self.name)
+            return value
+        finally:
+            self.uwsgi.unlock()
+
+    def clear(self):
+        self.uwsgi.cache_clear(self.name)
+
+
+class ModelCache:
+    def __init__(self):
+        self.backend = None
+        self.counters = LocalCache()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def init_app(self, app):
+        backend = app.config.get("MODEL_CACHE_BACKEND")
+        ttl = app.config.get("MODEL_CACHE_TTL", 300)
+        if backend == "local":
+            self.backend = LocalCache(app.config.get("MODEL_CACHE_MAX_SIZE", 10000), ttl)
+        elif backend == "uwsgi":
+            self.backend = UWSGICache(app.config.get("MODEL_CACHE_NAME", "model_cache"), ttl)
+        else:
+            self.backend = None
+        self.counters = self.backend or LocalCache()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def shared(self) -> bool:
+        """
+        True if the generations are shared by all the workers, so a generation which
+        didn't change means that no worker wrote the model.
+        """
+        return self.enabled and self.backend.shared
+
+    def generation(self, model) -> int:
+        return self.counters.get_counter(f"generation:{model.__tablename__}")
+
+    def invalidate(self, model):
+        self.counters.incr(f"generation:{model.__tablename__}")
+
+    def key(self, model, kind, kwargs):
+        """
+        Return the cache key of the lookup, None if the lookup can't be cached.
+        """
+        if not self.enabled or not all(
+            isinstance(value, CACHEABLE_TYPES) for value in kwargs.values()
+        ):
+            return None
+        return "{}:{}:{}:{}".format(
+            model.__tablename__,
+            self.generation(model),
+            kind,
+            repr(sorted(kwargs.items())),
+        )
+
+    def get(self, model, key):
+        value = self.backend.get(key, MISSING)
+        if value is MISSING:
+            self.misses[model.__tablename__] += 1
+        else:
+            self.hits[model.__tablename__] += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def stats(self):
+        tables = set(self.hits) | set(self.misses)
+        return {
+            table: {
+                "hits": self.hits[table],
+                "misses": self.misses[table],
+                "hit_ratio": round(
+                    self.hits[table] / ((self.hits[table] + self.misses[table]) or 1), 4
+                ),
+            }
+            for table in sorted(tables)
+        }
+
+    def listen(self, session):
+        """
+        Invalidate the models written by the session on flush, commit and rollback.
+        """
+
+        @event.listens_for(session, "after_flush")
+        def after_flush(session, flush_context):
+            models = {
+                type(instance)
+                for instance in (*session.new, *session.dirty, *session.deleted)
+                if hasattr(type(instance), "__tablename__")
+            }
+            session.info.setdefault("model_cache_written", set()).update(models)
+            for model in models:
+                self.invalidate(model)
+
+        @event.listens_for(session, "after_commit")
+        @event.listens_for(session, "after_soft_rollback")
+        def after_transaction(session, *args):
+            for model in session.info.pop("model_cache_written", ()):
+                self.invalidate(model)
+
+
+model_cache = ModelCache()
+model_cache.listen(db.session)
@@ -1,3 +1,75 @@
-from flask_sqlalchemy import SQLAlchemy
+import random
 
-db = SQLAlchemy()
+from functools import wraps
+
+from flask import request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session reading from one of the SQLALCHEMY_REPLICA_BINDS when session.info["replica"]
+    is set (read only requests, see route_reads).
+    Once the session writes (flush or DML statement), the writes and every read after
+    them stay on the primary until the end of the session.
+    """
+
+    @property
+    def reads_replica(self) -> bool:
+        """
+        True while the reads of the session go to a replica, which may lag behind the
+        primary: what it reads must not be cached under the generations of the primary.
+        """
+        return bool(
+            self.app.config.get("SQLALCHEMY_REPLICA_BINDS")
+            and self.info.get("replica")
+            and not self.info.get("wrote")
+        )
+
+    def get_bind(self, mapper=None, clause=None):
+        if getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        if self.reads_replica:
+            replicas = self.app.config["SQLALCHEMY_REPLICA_BINDS"]
+            bind = self.info.setdefault("replica_bind", random.choice(replicas))
+            return get_state(self.app).db.get_engine(self.app, bind=bind)
+        return super().get_bind(mapper, clause)
+
+
+def stick_to_primary(session, flush_context, instances):
+    session.info["wrote"] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        # on the factory, as the listeners of the models (e.g. listens_for(db.session)):
+        # a listener of the factory hides the ones of the RoutingSession class
+        event.listen(factory, "before_flush", stick_to_primary)
+        return factory
+
+
+db = RoutingSQLAlchemy()
+
+
+def route_reads(func):
+    """
+    Decorator for the resource dispatch (Api(decorators=[route_reads])), the reads of the
+    GET requests go to the replicas, unless the resource sets `replica_reads = False`
+    (GET handlers which write, e.g. get_or_create, must read their own writes).
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        db.session.info["replica"] = request.method in READ_METHODS and getattr(
+            getattr(func, "view_class", None), "replica_reads", True
+        )
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db.session.info.pop("replica", None)
+
+    return wrapper
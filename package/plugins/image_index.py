@@ -0,0 +1,121 @@
+"""
+In-memory index of the image files of UPLOADED_IMAGES_DEST.
+
+The existence checks of the images (image_helper.is_file_safe, is_image_stored,
+find_image_any_format) are answered from a set of the stored paths instead of probing
+the filesystem, which costs a round trip per check on network mounted storage.
+The index is built by one walk of the tree when the app starts (IMAGE_INDEX = True),
+then kept up to date by the saves and deletes of this process.
+Another worker's save is found on the first miss: a path missing from the index is
+checked on the disk once, and added if it exists. With IMAGE_INDEX_INOTIFY the index
+also follows the changes made by the other workers and processes at once (Linux only,
+needs the inotify_simple package).
+"""
+import os
+import threading
+
+
+class ImageIndex:
+    def __init__(self):
+        self.root = None
+        self.inotify = False
+        self._paths = set()
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+
+    def init_app(self, app):
+        if not app.config.get("IMAGE_INDEX", False):
+            self.root = None
+            return
+        self.root = os.path.abspath(app.upload_set_config["images"].destination)
+        self.inotify = app.config.get("IMAGE_INDEX_INOTIFY", False)
+        self.rebuild()
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def get_key(self, path):
+        """
+        Return the path relative to the root, None for a path outside of it.
+        """
+        key = os.path.relpath(os.path.abspath(path), self.root)
+        if key == os.curdir or key.startswith(os.pardir):
+            return None
+        return key
+
+    def rebuild(self):
+        """
+        Replace the index by the files found by one walk of the tree.
+        """
+        paths = set()
+        for folder, _, files in os.walk(self.root):
+            relative = os.path.relpath(folder, self.root)
+            for file_name in files:
+                paths.add(os.path.normpath(os.path.join(relative, file_name)))
+        with self._lock:
+            self._paths = paths
+        return len(paths)
+
+    def exists(self, path) -> bool:
+        """
+        Return True if the file exists, from the index (disk checked on a miss).
+        """
+        key = self.get_key(path) if self.enabled else None
+        if key is None:
+            return os.path.isfile(path)
+        self.watch()
+        if key in self._paths:
+            return True
+        if os.path.isfile(path):
+            self.add(path)
+            return True
+        return False
+
+    def add(self, path):
+        key = self.get_key(path) if self.enabled else None
+        if key is not None:
+            with self._lock:
+                self._paths.add(key)
+
+    def discard(self, path):
+        key = self.get_key(path) if self.enabled else None
+        if key is not None:
+            with self._lock:
+                self._paths.discard(key)
+
+    def watch(self):
+        """
+        Start the inotify watcher of this process (once per process: the threads of the
+        master don't survive the fork of the uwsgi workers). The folders are watched
+        before it returns, the thread only reads the events.
+        """
+        if not self.inotify or self._watcher_pid == os.getpid():
+            return
+        from inotify_simple import INotify, flags
+
+        self._watcher_pid = os.getpid()
+        inotify = INotify()
+        mask = flags.CREATE | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM
+        folders = {}
+        for folder, _, _ in os.walk(self.root):
+            folders[inotify.add_watch(folder, mask)] = folder
+        threading.Thread(
+            target=self._follow, args=(inotify, mask, folders), daemon=True
+        ).start()
+
+    def _follow(self, inotify, mask, folders):
+        from inotify_simple import flags
+
+        while True:
+            for event in inotify.read():
+                path = os.path.join(folders.get(event.wd, self.root), event.name)
+                if event.mask & flags.ISDIR:
+                    if event.mask & (flags.CREATE | flags.MOVED_TO):
+                        folders[inotify.add_watch(path, mask)] = path
+                elif event.mask & (flags.CREATE | flags.MOVED_TO):
+                    self.add(path)
+                else:
+                    self.discard(path)
+
+image_index = ImageIndex()
@@ -0,0 +1,27 @@
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required
+
+from plugins.cache import model_cache
+
+from utils.user_roles import required_role
+
+
+class ModelCacheStats(Resource):
+    @jwt_required()
+    @required_role(["admin"])
+    def get(self):
+        """
+        Get the hit/miss metrics of the model cache (of the worker serving the request)
+
+        @return: backend and hit/miss metrics per table
+        @rtype: dict of metrics
+        """
+        return (
+            {
+                "backend": type(model_cache.backend).__name__
+                if model_cache.enabled
+                else None,
+                "stats": model_cache.stats(),
+            },
+            200,
+        )
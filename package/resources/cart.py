@@ -23,6 +23,9 @@ user_session_schema = UserSessionSchema()
 
 
 class Cart(Resource):
+    # get creates the session and the cart (get_or_create), so it reads the primary
+    replica_reads = False
+
     @classmethod
     @jwt_required(optional=True)
     def get(cls):
@@ -89,6 +92,9 @@ class Cart(Resource):
 
 
 class CartItem(Resource):
+    # get creates the session and the cart (get_or_create), so it reads the primary
+    replica_reads = False
+
     @classmethod
     @jwt_required(optional=True)
     def get(cls):
@@ -136,7 +142,9 @@ class CartItem(Resource):
         client_ip = request.remote_addr
         req_data = request.get_json()
         session = UserSessionModel.get_or_create(ip=client_ip, user_id=user)
-        cart = CartModel.get_or_create(user_id=user, session=session)
+        cart = CartModel.get_or_create(
+            user_id=user, session=session, load_profile="cart_pricing"
+        )
         product = ProductModel.get_item(id=req_data.get("product_id"))
         if not product:
             return {"message": gettext("product_not_found")}, 404
@@ -183,7 +191,9 @@ class CartItem(Resource):
         req_data = request.get_json()
         client_ip = request.remote_addr
         session = UserSessionModel.get_or_create(ip=client_ip, user_id=user)
-        cart = CartModel.get_or_create(user_id=user, session=session)
+        cart = CartModel.get_or_create(
+            user_id=user, session=session, load_profile="cart_pricing"
+        )
         cart_item = cart_item_schema.load(
             req_data,
             instance=CartItemsModel.get_item(
@@ -255,7 +265,9 @@ class ApplyCoupon(Resource):
         user = get_jwt_identity()
         client_ip = request.remote_addr
         session = UserSessionModel.get_or_create(ip=client_ip, user_id=user)
-        cart = CartModel.get_or_create(user_id=user, session_id=session.id)
+        cart = CartModel.get_or_create(
+            user_id=user, session_id=session.id, load_profile="cart_pricing"
+        )
         if not cart.cart_items:
             return {"message": gettext("cart_should_not_be_empty")}, 400
         cart.coupon = coupon
@@ -289,8 +301,10 @@ class MergeTwoCart(Resource):
         user = get_jwt_identity()
         client_ip = request.remote_addr
         session = UserSessionModel.get_or_create(ip=client_ip, user_id=user)
-        user_cart = CartModel.get_or_create(user_id=user, session_id=session.id)
-        cart = CartModel.get_item(id=cart_id)
+        user_cart = CartModel.get_or_create(
+            user_id=user, session_id=session.id, load_profile="cart_pricing"
+        )
+        cart = CartModel.get_item(id=cart_id, load_profile="cart_pricing")
         if not cart:
             return {"message": gettext("cart_not_found")}, 404
         for item in cart.cart_items:
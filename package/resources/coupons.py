@@ -3,12 +3,14 @@ from flask_restful import Resource
 from flask_jwt_extended import jwt_required
 
 from models.coupons import CouponModel
-from models.products import ProductModel
+from models.helper import pricing
+from models.products import ProductModel, coupons_table
 
 from schema.coupons import CouponSchema
 
 from utils.strings_helper import gettext
 from utils.user_roles import required_role
+from utils.conditional import conditional
 
 coupon_schema = CouponSchema()
 
@@ -113,8 +115,12 @@ class Coupon(Resource):
 
 class Coupons(Resource):
     @classmethod
+    @conditional(CouponModel)
     def get(cls):
         """
+        Return 304 not modified if no coupon changed since the If-None-Match /
+        If-Modified-Since of the request.
+
         @return: Get the list of all the coupon
         @rtype: dict of the list containing coupon data
         """
@@ -132,21 +138,22 @@ class ProductCouponMapping(Resource):
 
         Assign the coupon to the specified products.
         1. get the coupon from db
-        2. loop over the product_ids of request data. and applied coupon on that products
+        2. fetch all the products of the product_ids of request data at once.
+        3. applied coupon on that products and save them to db in one commit
 
         @return: coupon details
         @rtype: dict of coupon data
         """
         req_data = request.get_json()
         coupon = CouponModel.get_item(code=code)
-        for product in req_data.get("product_ids"):
-            item = (
-                ProductModel.get_item(id=product)
-                if not req_data.get("type") == "slug"
-                else ProductModel.get_item(slug=product)
-            )
-            if item:
-                coupon.products.append(item)
+        if not coupon:
+            return {"message": gettext("coupon_not_found")}, 404
+        key = "slug" if req_data.get("type") == "slug" else "id"
+        products = ProductModel.get_query_in(key, req_data.get("product_ids")).all()
+        products = [item for item in products if coupon not in item.coupons]
+        for item in products:
+            item.coupons.append(coupon)
+        ProductModel.save_many(products)
         return (
             {
                 "message": gettext("coupon_product_mapping"),
@@ -154,3 +161,50 @@ class ProductCouponMapping(Resource):
             },
             200,
         )
+
+
+class CouponPreview(Resource):
+    @classmethod
+    def get(cls, code):
+        """
+        @param code: Coupon Code
+        @type code: String
+
+        Preview the prices of the products of the coupon.
+        1. get the coupon from db
+        2. if coupon not found, return 404 not found
+        3. price every option of the products of the coupon in one vectorized pass
+        4. return the price, discount and final price of every line
+
+        @return: priced lines and the sum of their discounts
+        @rtype: dict of list
+        """
+        coupon = CouponModel.get_item(code=code)
+        if not coupon:
+            return {"message": gettext("coupon_not_found")}, 404
+        product_ids = coupons_table.select().with_only_columns(
+            coupons_table.c.product_id
+        ).where(coupons_table.c.coupon_id == coupon.id)
+        lines = pricing.price_catalog(coupon, product_ids=product_ids)
+        return (
+            {
+                "lines": [
+                    {
+                        "product_id": int(product_id),
+                        "option_id": int(option_id) if option_id >= 0 else None,
+                        "price": float(base),
+                        "discount": float(discount),
+                        "final_price": float(final),
+                    }
+                    for product_id, option_id, base, discount, final in zip(
+                        lines["product_id"],
+                        lines["option_id"],
+                        lines["base"],
+                        lines["discount"],
+                        lines["final"],
+                    )
+                ],
+                "discount": float(lines["discount"].sum()),
+            },
+            200,
+        )
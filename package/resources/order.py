@@ -107,7 +107,9 @@ class OrderCreate(Resource):
         req_data = request.get_json()
         client_ip = request.remote_addr
         session = UserSessionModel.get_or_create(user_id=user, ip=client_ip)
-        cart = CartModel.get_item(user_id=user, session=session)
+        cart = CartModel.get_item(
+            user_id=user, session=session, load_profile="cart_pricing"
+        )
         if not cart or not cart.cart_items:
             return {"message": gettext("no_item_in_cart")}, 404
         req_data.update({"cart_id": cart.id, "user_id": user})
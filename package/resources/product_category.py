@@ -1,15 +1,21 @@
-from flask import request
+from flask import current_app, request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required
 
+from models.helper.serializer import serialize
 from models.product_category import ProductCategoryModel
+from models.product_listing import ProductListingModel
 
 from schema.product_category import ProductCategorySchema
+from schema.products import ProductListingSchema
 
 from utils.strings_helper import gettext
 from utils.user_roles import required_role
+from utils.conditional import conditional, is_not_modified
+from utils.pagination import paginate
 
 product_category_schema = ProductCategorySchema()
+product_listing_schema = ProductListingSchema()
 
 
 class ProductCategory(Resource):
@@ -41,7 +47,9 @@ class ProductCategory(Resource):
         Update the detail of specific category
         1. load the product category from db along with the request data
         2. if category not found, return 404 not found
-        3. save to db and return the updated product category details.
+        3. if the category is moved under itself or one of its subcategories,
+        return 400 bad request
+        4. save to db and return the updated product category details.
 
         @return: updated product category details
         @rtype: dict of product category details
@@ -52,7 +60,10 @@ class ProductCategory(Resource):
         )
         if not category:
             return {"message": gettext("product_category_not_found")}, 404
-        category.save_to_db()
+        try:
+            category.save_to_db()
+        except AssertionError as e:
+            return {"message": str(e)}, 400
         return (
             {
                 "message": gettext("product_category_updated"),
@@ -85,20 +96,30 @@ class ProductCategory(Resource):
 
 
 class ProductCategoryCreate(Resource):
+    @conditional(
+        lambda parent_id: ProductCategoryModel.query.filter_by(parent_id=parent_id)
+    )
     def get(self, parent_id):
         """
         @param parent_id: Parent id of specified category
         @type parent_id: int
 
         Return the list of sub categories of specified category
-        1. fetch the all items which have specified parent id.
-        2. return the list of all details of sub category.
+        1. if no sub category changed since the If-None-Match / If-Modified-Since of
+        the request, return 304 not modified
+        2. fetch the all items which have specified parent id.
+        3. return the list of all details of sub category.
 
         @return: return the list of all details of sub category.
         @rtype: dict of list
         """
         items = ProductCategoryModel.get_items(parent_id=parent_id)
-        return {"data": [product_category_schema.dump(item) for item in items]}
+        return {
+            "data": [
+                serialize(item, exclude=("created", "updated", "active"))
+                for item in items
+            ]
+        }
 
     @jwt_required()
     @required_role(["admin", "shop_keeper"])
@@ -134,3 +155,90 @@ class ProductCategoryCreate(Resource):
             },
             201,
         )
+
+
+class ProductCategoryTree(Resource):
+    # the snapshot is kept under the version of the primary, a lagging replica would
+    # pin an old tree under it
+    replica_reads = False
+
+    def get(self):
+        """
+        Return the whole active category tree as one nested document
+        1. get the snapshot of the tree of the current category version, built with
+        one query after a write of any category (or CATEGORY_TREE_TTL without a shared
+        MODEL_CACHE_BACKEND), from memory otherwise
+        2. if the If-None-Match of the request is the version, return 304 not modified
+        3. return the nested tree of all the active categories.
+
+        @return: nested categories
+        @rtype: dict of list
+        """
+        version, tree = ProductCategoryModel.get_tree(
+            current_app.config.get("CATEGORY_TREE_TTL")
+        )
+        headers = {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+        if is_not_modified(str(version), None):
+            return current_app.response_class(status=304, headers=headers)
+        return {"data": tree, "version": version}, 200, headers
+
+
+class ProductCategorySubtree(Resource):
+    @conditional(ProductCategoryModel)
+    def get(self, id):
+        """
+        @param id: product category id
+        @type id: int
+
+        Return the whole subtree of specified category, at any depth
+        1. if no category changed since the If-None-Match / If-Modified-Since of the
+        request, return 304 not modified
+        2. fetch the active category and all its active subcategories in one query
+        (closure table), if not found, return 404 not found
+        3. return the flat list of the categories with their depth under the category,
+        ordered by depth.
+
+        @return: categories of the subtree
+        @rtype: dict of list
+        """
+        subtree = ProductCategoryModel.get_subtree(id)
+        if not subtree:
+            return {"message": gettext("product_category_not_found")}, 404
+        return {
+            "data": [
+                dict(
+                    serialize(item, exclude=("created", "updated", "active")),
+                    depth=depth,
+                )
+                for item, depth in subtree
+            ]
+        }, 200
+
+
+class ProductCategoryProducts(Resource):
+    @classmethod
+    @conditional(ProductListingModel)
+    @paginate(
+        "products",
+        schema=product_listing_schema,
+        cursor_keys=("id", "created", "price"),
+        count="cached",
+    )
+    def get(cls, id):
+        """
+        @param id: product category id
+        @type id: int
+
+        Return the products of specified category and of all its subcategories
+        1. if no product or category changed since the If-None-Match /
+        If-Modified-Since of the request, return 304 not modified
+        2. return the active products of the listing read model whose category is in
+        the subtree, one query at any depth (closure table).
+        (Paginate all this products, ?cursor= pages on id, created or price with ?order_by=.)
+
+        @return: products of the subtree
+        @rtype: dict of list
+        """
+        return ProductListingModel.get_query().filter(
+            ProductListingModel.category_id.in_(ProductCategoryModel.subtree_ids(id))
+        )
@@ -1,7 +1,9 @@
 import os
 import traceback
 
-from flask import request, send_file
+import json
+
+from flask import current_app, request, stream_with_context
 from flask_restful import Resource
 from marshmallow import ValidationError
 from flask_uploads import UploadNotAllowed
@@ -13,6 +15,8 @@ from models.products import (
     ProductAttributeOptionsModel,
     ProductImageModel,
 )
+from models.product_listing import ProductListingModel
+from models.review import ReviewModel
 
 from schema.products import (
     ProductSchema,
@@ -21,13 +25,20 @@ from schema.products import (
     ProductImageSchema,
     ImageSchema,
     ProductAllSchema,
+    ProductListingSchema,
 )
+from schema.review import ProductReviewSchema
 
 from utils.strings_helper import gettext
 from utils.user_roles import required_role
 from utils.pagination import paginate
+from utils.conditional import conditional
+from utils.product_import import import_products
+from utils.product_export import EXPORT_FORMATS, export_products
+
+from utils import image_delivery, image_helper, image_variants
 
-from utils import image_helper
+from plugins.db import db
 
 product_schema = ProductSchema()
 product_attribute_schema = ProductAttributeSchema()
@@ -35,17 +46,28 @@ product_attribute_options_schema = ProductAttributeOptionsSchema()
 product_image_schema = ProductImageSchema()
 image_schema = ImageSchema()
 product_all_schema = ProductAllSchema()
+product_listing_schema = ProductListingSchema()
+product_review_schema = ProductReviewSchema()
 
 
 class Product(Resource):
+    @conditional(
+        lambda slug: ProductModel.query.filter_by(slug=slug),
+        lambda slug: ReviewModel.query.join(ProductModel).filter(
+            ProductModel.slug == slug
+        ),
+    )
     def get(self, slug):
         """
         @param slug: slug of product
         @type slug: string
 
         Get the details of specific product
-        1. fetch the details of specific product from the db
-        2. return product details
+        1. if the product didn't change since the If-None-Match / If-Modified-Since
+        of the request, return 304 not modified
+        2. fetch the details of specific product from the db
+        3. return product details with its rating aggregates, and its active reviews
+        with ?reviews=1
 
         @return: return product details
         @rtype: dict of product details
@@ -53,7 +75,13 @@ class Product(Resource):
         product = ProductModel.get_item(slug=slug)
         if not product:
             return {"data": gettext("product_not_found")}, 404
-        return {"data": product_schema.dump(product)}, 200
+        data = product_schema.dump(product)
+        if request.args.get("reviews", 0, type=int):
+            data["reviews"] = [
+                product_review_schema.dump(review)
+                for review in ReviewModel.get_items(product_id=product.id)
+            ]
+        return {"data": data}, 200
 
     @jwt_required()
     @required_role(["admin", "shop_keeper"])
@@ -139,17 +167,53 @@ class ProductCreate(Resource):
 
 class Products(Resource):
     @classmethod
-    @paginate("products", schema=product_all_schema)
+    # every write of a product, its attributes, options, images, reviews or category
+    # refreshes (and stamps) its listing row, which is all the validators need
+    @conditional(ProductListingModel)
+    @paginate(
+        "products",
+        schema=product_listing_schema,
+        expanded_schema=product_all_schema,
+        cursor_keys=("id", "created", "price"),
+        count="cached",
+        extras=ProductModel.facets,
+    )
     def get(cls):
         """
         Get the list of products
-        1. return the all active products.
-        (Paginate all this products.)
+        Filters: ?category_id= (with subcategories), ?min_price=, ?max_price=
+        and ?attr=name:value (e.g. attr=color:red, repeat it for more values)
+        1. if no product changed since the If-None-Match / If-Modified-Since of the
+        request, return 304 not modified
+        2. if a filter is not valid, return 400 bad request
+        3. return the filtered active products from the listing read model, or with
+        ?expanded=1 the whole products with their attributes and options loaded in batch,
+        and the facet counts of the filtered products.
+        (Paginate all this products, ?cursor= pages on id, created or price with ?order_by=.)
 
         @return:
         @rtype:
         """
-        return ProductModel.get_active()
+        attrs = {}
+        for attr in request.args.getlist("attr"):
+            name, _, value = attr.partition(":")
+            if not name or not value:
+                return {"message": gettext("product_filter_not_valid")}, 400
+            attrs.setdefault(name, []).append(value)
+        filters = {
+            "category_id": request.args.get("category_id", type=int),
+            "min_price": request.args.get("min_price", type=float),
+            "max_price": request.args.get("max_price", type=float),
+        }
+        # get(type=) gives None for a value that can't be converted
+        for key, value in filters.items():
+            if value is None and request.args.get(key):
+                return {"message": gettext("product_filter_not_valid")}, 400
+        if request.args.get("expanded", 0, type=int):
+            query = ProductModel.get_query(load_profile="product_listing")
+        else:
+            query = ProductListingModel.get_query()
+        return ProductModel.filter_query(query, attrs=attrs, **filters)
 
     @classmethod
     def post(cls):
@@ -180,8 +244,8 @@ class Products(Resource):
         Create the products by all the json.
         1. loop over the products
         2. load this products, if product found, save to the err_list
-        3. save to db and continue in looping
-        4. return the error products
+        3. save all the loaded products to db in batches (one commit per batch)
+        4. return the created and error products
 
         @return: List of all the products which has not been created successfully.
         {
@@ -193,7 +257,7 @@ class Products(Resource):
         if not isinstance(products_data, list):
             return {"message": gettext("products_should_list")}, 400
         error_lst = []
-        created_lst = []
+        loaded_lst = []
         for product in products_data:
             try:
                 product = product_all_schema.load(product)
@@ -204,17 +268,111 @@ class Products(Resource):
             if product.id:
                 error_lst.append((product, gettext("product_already_found")))
                 continue
-            product.save_to_db()
-            created_lst.append(product_all_schema.dump(product))
+            loaded_lst.append(product)
+        ProductModel.save_many(loaded_lst)
         return (
             {
-                "created_products": [product for product in created_lst],
+                "created_products": [
+                    product_all_schema.dump(product) for product in loaded_lst
+                ],
                 "error_products": [err_product for err_product in error_lst],
             },
             200,
         )
 
 
+class ProductImport(Resource):
+    @classmethod
+    @jwt_required()
+    @required_role(["admin", "shop_keeper"])
+    def post(cls):
+        """
+        Import the products of the NDJSON body (Content-Type: application/x-ndjson),
+        one product per line in the format of POST /products
+        {"name": "shirts", "price": 100, "attrs": [{"name": "color", "attrs_options": [...]}]}
+
+        1. read the body line by line, validate every line as it comes
+        2. save the valid products in batches of PRODUCT_IMPORT_BATCH_SIZE, one commit
+        per batch
+        3. stream back the results as NDJSON, while importing: the errors of the lines,
+        every committed batch and a final summary
+
+        @return: NDJSON results
+        {"line": 3, "errors": {"price": ["Missing data for required field."]}}
+        {"batch": 1, "first_line": 1, "last_line": 500, "created": 499}
+        {"created": 499, "errors": 1}
+        @rtype: streamed response
+        """
+        results = import_products(
+            request.stream, current_app.config.get("PRODUCT_IMPORT_BATCH_SIZE", 500)
+        )
+        return current_app.response_class(
+            stream_with_context(json.dumps(result) + "\n" for result in results),
+            mimetype="application/x-ndjson",
+        )
+
+
+class ProductExport(Resource):
+    @classmethod
+    @jwt_required()
+    @required_role(["admin"])
+    def get(cls):
+        """
+        Export the active products with their attrs, options and images, ?format=ndjson
+        (default, one product per line) or ?format=csv (one row per product, attrs as
+        JSON).
+        1. if the format is not valid, return 400 bad request
+        2. stream the products as they are read, PRODUCT_EXPORT_BATCH_SIZE at a time
+        from the db (server side cursor), so the memory doesn't grow with the catalog
+
+        @return: exported products
+        @rtype: streamed response
+        """
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return {"message": gettext("product_export_format_not_valid")}, 400
+        chunks = export_products(
+            export_format, current_app.config.get("PRODUCT_EXPORT_BATCH_SIZE", 1000)
+        )
+
+        def generate():
+            # the response is streamed after route_reads, keep its reads on the replicas
+            db.session.info["replica"] = True
+            try:
+                yield from chunks
+            finally:
+                db.session.info.pop("replica", None)
+
+        return current_app.response_class(
+            stream_with_context(generate()),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                "Content-Disposition": f"attachment; filename=products.{export_format}"
+            },
+        )
+
+
+class ProductSearch(Resource):
+    @classmethod
+    @paginate("products", schema=product_all_schema, cursor_keys=())
+    def get(cls):
+        """
+        Search the products, ?q= is matched on the name, description and attribute options.
+        1. if the query has no word, return 400 bad request
+        2. return the matching active products, best match first
+        (Paginate all this products.)
+
+        @return: matching products
+        @rtype: dict of list
+        """
+        query = ProductModel.search(
+            request.args.get("q", ""), load_profile="product_listing"
+        )
+        if query is None:
+            return {"message": gettext("product_search_query_missing")}, 400
+        return query
+
+
 class ProductAttribute(Resource):
     def get(self, attr_id):
         """
@@ -492,7 +650,8 @@ class ProductImages(Resource):
         Get all the images of given product slug.
         1. fetch the all images from db
         2. if no image found, return 404 not found
-        3. loop over the images, if image is safe, add image into the list, else delete the record in db
+        3. loop over the images, add the stored ones into the list (read only, the
+        images missing from the storage are quarantined by `flask images sweep`)
         4. return this list
 
         @return: list of all the images of given product
@@ -505,11 +664,8 @@ class ProductImages(Resource):
             {
                 "Product Images": [
                     product_image_schema.dump(image)
-                    if image_helper.is_file_safe(
-                        image.get("image_name"), folder=f"product_{slug}"
-                    )
-                    else image.delete_from_db() or None
                     for image in product_images
+                    if image_helper.is_image_stored(image)
                 ]
             },
             200,
@@ -526,8 +682,11 @@ class ProductImages(Resource):
         1. Get the list of images from the request.
         2. if no image found, return 404 not found
         3. loop over the image list.
-        4. load the image through schema, save image to specific folder and save the data to db
-        4. if any error occurred due to invalid file, add this file into error list
+        4. load the image through schema, store its content once in the content
+        addressed store, skip it if the product already has the same content, else save
+        the data to db
+        5. schedule the rendering of its variants (thumb, card, zoom...) in the pool
+        6. if any error occurred due to invalid file, add this file into error list
 
         @return: number of image uploaded successfully along with the err msg if err occurred
         @rtype: dict of list
@@ -538,18 +697,22 @@ class ProductImages(Resource):
         not_allowed_exts = []
         for image in image_list:
             image_instance = image_schema.load({"image": image})
-            folder = f"product_{slug}"
             try:
-                image_path = image_helper.save_image(
-                    image_instance.get("image"), folder=folder
-                )
-                basename = image_helper.get_basename(image_path)
-                instance = product_image_schema.load({"image_name": basename})
-                instance.product_slug = slug
-                instance.save_to_db()
+                digest, basename = image_helper.save_blob(image_instance.get("image"))
             except UploadNotAllowed:
-                extension = image_helper.get_extension(image_instance)
+                extension = image_helper.get_extension(image_instance.get("image"))
                 not_allowed_exts.append(f"{extension}")
+                continue
+            # the same content uploaded again for the product is the same image
+            if ProductImageModel.get_item(product_slug=slug, digest=digest):
+                continue
+            instance = product_image_schema.load(
+                {"image_name": ProductImageModel.get_unique_name(slug, basename)}
+            )
+            instance.product_slug = slug
+            instance.digest = digest
+            instance.save_to_db()
+            image_variants.schedule(instance)
         return_msg = gettext("image_uploaded").format(
             len(image_list) - len(not_allowed_exts)
         )
@@ -572,28 +735,46 @@ class ProductImage(Resource):
         @param filename: image name
         @type filename: string
 
-        Get specific image of given product
-        1. fetch the image data from db.
-        2. we are checking for the safe filename, return 400 bad request if found
-        3. we are checking for the safe file, return 400 bad request if found
-        4. if image not found, return 404 not found.
-        5. try to return the image, if image not found, return 404 not found
+        Get specific image of given product, ?size= (a PRODUCT_IMAGE_VARIANTS name, e.g.
+        thumb) for its resized variant
+        1. we are checking for the safe filename, return 400 bad request if found
+        2. fetch the image data (model cache), if image not found, return 404 not found.
+        3. resolve its file through the digest of its content
+        4. if the size is not valid, return 400 bad request
+        5. with a size, pick the rendered variant, WebP if the request accepts it, the
+        original while the variants are not rendered yet
+        6. return the image, sent by the front proxy with IMAGE_DELIVERY, cacheable,
+        with its ETag and Range support, if the file is missing, return 400 bad request
 
         @return: image file
         @rtype: image file
         """
-        image = ProductImageModel.get_item(product_slug=slug, image_name=filename)
-        folder = f"product_{slug}"
         if not image_helper.is_filename_safe(filename):
             return {"message": gettext("image_filename_illegal")}, 400
-        if not image_helper.is_file_safe(filename, folder=folder):
-            return {"message": gettext("image_not_found_at_server")}, 400
+        image = ProductImageModel.get_item(product_slug=slug, image_name=filename)
         if not image:
             return {"message": gettext("image_not_registered")}, 404
+        path = image_helper.get_image_path(image)
+        size = request.args.get("size")
+        if size is not None and size not in current_app.config.get(
+            "PRODUCT_IMAGE_VARIANTS", {}
+        ):
+            return {"message": gettext("image_size_not_valid")}, 400
+        # content addressed names are strong validators of the content
+        etag = image.digest and os.path.basename(path)
+        if size:
+            accepts_webp = "image/webp" in request.accept_mimetypes.values()
+            variant = image.get_variant(size, ("webp",) if accepts_webp else ())
+            if variant:
+                path = image_variants.get_variant_path(image, variant)
+                etag = image.digest and variant.file_name
         try:
-            return send_file(image_helper.get_path(filename, folder=folder))
+            response = image_delivery.send_image(path, etag=etag)
         except FileNotFoundError:
-            return {"message": gettext("image_not_found")}, 404
+            return {"message": gettext("image_not_found_at_server")}, 400
+        if size:
+            response.vary.add("Accept")
+        return response
 
     @jwt_required()
     def delete(self, slug, filename):
@@ -604,25 +785,57 @@ class ProductImage(Resource):
         @type filename: string
 
         Delete specific image of given product
-        1. fetch the image data from db.
-        2. we are checking for the safe filename, return 400 bad request if found
-        3. we are checking for the safe file, return 400 bad request if found
-        4. if image not found, return 404 not found.
-        5. try to return the image, if image not found, return 404 not found
+        1. we are checking for the safe filename, return 404 not found if found
+        2. fetch the image data from db, delete it
+        3. remove its file and the files of its variants once deleted (committed), a
+        stored content is left to `flask images sweep`, which quarantines it once no
+        image uses it (an upload of the same content may be storing it meanwhile)
+        4. if image not found, return 404 not found
 
-        @return: image file
-        @rtype: image file
+        @return: delete msg
+        @rtype: dict of deletion msg
         """
         if not image_helper.is_filename_safe(filename):
             return {"message": gettext("image_not_found")}, 404
 
         try:
             image = ProductImageModel.get_item(product_slug=slug, image_name=filename)
+            if not image:
+                return {"message": gettext("image_not_found")}, 404
+            paths = [image_helper.get_image_path(image)] + [
+                image_variants.get_variant_path(image, variant)
+                for variant in image.variants
+            ]
+            if not image.digest:
+                image_helper.remove_after_commit(*paths)
             image.delete_from_db()
-            os.remove(image_helper.get_path(filename, folder=f"product_{slug}"))
             return {"message": gettext("image_deleted")}, 200
-        except FileNotFoundError:
-            return {"message": gettext("image_not_found")}, 404
         except Exception:
             traceback.print_exc()
             return {"message": gettext("image_deletion_failed")}, 500
+
+
+class ImageFile(Resource):
+    def get(self, name: str):
+        """
+        @param name: name of the stored content, <sha256>.<ext> or of one of its
+        variants, <sha256>_<size>.<ext> (the url of the ProductImageSchema dumps)
+        @type name: string
+
+        Get the stored image by the digest of its content, no db access.
+        1. if the name is not a content name, return 404 not found
+        2. return the file (sent by the front proxy with IMAGE_DELIVERY), cacheable
+        forever: a name never changes content
+        3. if the file is not stored, return 404 not found
+
+        @return: image file
+        @rtype: image file
+        """
+        if not image_helper.is_blob_name_safe(name):
+            return {"message": gettext("image_not_found")}, 404
+        try:
+            return image_delivery.send_image(
+                image_helper.get_blob_path(name), etag=name, immutable=True
+            )
+        except FileNotFoundError:
+            return {"message": gettext("image_not_found")}, 404
@@ -311,8 +311,8 @@ class UserRoleAssign(Resource):
         Assign the specific roles to user
         1. load the user role with request data from the db
         2. if role found, return 409 conflict
-        3. loop through all the user emails. load the user from db and add user into the user_role's object.
-        4. save the user roles and return success, already assigned and user not found list
+        3. load all the users of the user emails at once and add the role into the user's roles.
+        4. save the users in one commit and return success, already assigned and user not found list
 
         @return: success, already assigned and user not found list
         @rtype: dict of success, already assigned and user not found list
@@ -323,18 +323,24 @@ class UserRoleAssign(Resource):
         )
         if not user_role.get("id"):
             return {"message": gettext("user_role_not_found")}, 409
+        users = {
+            user.email: user
+            for user in UserModel.get_query_in("email", req_data.get("users"))
+        }
         user_not_found_list = []
         already_assigned = []
+        assigned_users = []
         for user_email in req_data.get("users"):
-            user = UserModel.get_item(email=user_email)
+            user = users.get(user_email)
             if user:
-                if user in user_role.users:
+                if user_role in user.roles:
                     already_assigned.append(user.get("email"))
                 else:
-                    user_role.users.append(user)
+                    user.roles.append(user_role)
+                    assigned_users.append(user)
             else:
-                user_not_found_list.append(user.get("email"))
-        user_role.save_to_db()
+                user_not_found_list.append(user_email)
+        UserModel.save_many(assigned_users)
         return (
             {
                 "Success": [
@@ -351,6 +357,9 @@ class UserRoleAssign(Resource):
 
 
 class UserEmailConfirm(Resource):
+    # get saves the confirmation, so it reads the primary
+    replica_reads = False
+
     @classmethod
     def get(cls, confirmation_id: str):
         """
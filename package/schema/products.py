@@ -9,9 +9,23 @@ from models.products import (
     ProductAttributeOptionsModel,
     ProductImageModel,
 )
+from models.product_listing import ProductListingModel
+
+from utils import image_helper
 
 from werkzeug.datastructures import FileStorage
 
+# maintained by the reviews (ProductModel.add_ratings), never loaded from the requests
+RATING_FIELDS = (
+    "rating_count",
+    "rating_sum",
+    "rating_1",
+    "rating_2",
+    "rating_3",
+    "rating_4",
+    "rating_5",
+)
+
 
 class FileStorageField(fields.Field):
     default_error_messages = {"Invalid": "Not a valid image"}
@@ -37,11 +51,13 @@ class ProductSchema(ma.SQLAlchemyAutoSchema):
         model = ProductModel
         include_fk = True
         datetimeformat = "%Y-%m-%dT%H:%M:%S"
-        dump_only = ("id",)
+        dump_only = ("id", *RATING_FIELDS)
         exclude = ("created", "updated", "active")
         unknown = RAISE
         load_instance = True
 
+    rating = fields.Float(dump_only=True)
+
 
 class ProductAttributeSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
@@ -70,8 +86,30 @@ class ProductImageSchema(ma.SQLAlchemyAutoSchema):
         model = ProductImageModel
         datetimeformat = "%Y-%m-%dT%H:%M:%S"
         include_fk = True
+        dump_only = ("id", "digest")
+        exclude = ("created", "updated", "active", "quarantined")
+        unknown = RAISE
+        load_instance = True
+
+    # immutable url of the stored content, cacheable forever
+    url = fields.Method("get_url", dump_only=True)
+
+    def get_url(self, image):
+        if not image.digest:
+            return f"/product-image/{image.product_slug}/{image.image_name}"
+        name = image_helper.get_blob_name(
+            image.digest, image_helper.get_extension(image.image_name)
+        )
+        return f"/images/{name}"
+
+
+class ProductListingSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = ProductListingModel
+        include_fk = True
+        datetimeformat = "%Y-%m-%dT%H:%M:%S"
         dump_only = ("id",)
-        exclude = ("created", "updated", "active")
+        exclude = ("updated", "active")
         unknown = RAISE
         load_instance = True
 
@@ -98,9 +136,10 @@ class ProductAllSchema(ma.SQLAlchemyAutoSchema):
         model = ProductModel
         include_fk = False
         datetimeformat = "%Y-%m-%dT%H:%M:%S"
-        dump_only = ("id",)
+        dump_only = ("id", *RATING_FIELDS)
         exclude = ("created", "updated", "active")
         unknown = RAISE
         load_instance = True
 
     attrs = ma.List(ma.Nested(ProductAttributeAllSchema))
+    rating = fields.Float(dump_only=True)
@@ -0,0 +1,136 @@
+"""
+Conditional GETs (ETag / Last-Modified) of the catalog resources.
+
+The validators of a response are computed from the rows it is built of, never from the
+rendered body: one aggregate query returns max(updated) and count(id) of every source
+(count(id) catches the hard deletes, updated catches the rest, deactivation included).
+A source read on every request should have an index on updated, so that max(updated)
+is an index lookup: the product lists rely on the listing read model alone, whose rows
+are stamped on every refresh.
+With a shared model_cache backend the aggregates are cached per model generation, so
+the validators of an unchanged catalog cost no query at all.
+A request whose If-None-Match (or If-Modified-Since) matches gets a 304 before the view
+runs, so neither the queries of the view nor the serialization happen.
+"""
+import functools
+import hashlib
+
+from datetime import timezone
+
+from flask import current_app, request
+from flask_restful.utils import unpack
+from flask_sqlalchemy import BaseQuery
+from sqlalchemy import func, select
+from werkzeug.http import http_date
+
+from plugins.cache import model_cache
+from plugins.db import db
+
+
+def get_source_query(source, kwargs):
+    """
+    Return the query of the rows of the source: a model (all its rows) or a callable
+    getting the view kwargs and returning a query (e.g. the row of the slug).
+    """
+    if isinstance(source, type):
+        return source.query
+    query = source(**kwargs)
+    if not isinstance(query, BaseQuery):
+        raise TypeError(f"{source!r} must return a query")
+    return query
+
+
+def aggregate(queries):
+    """
+    Return the (max(updated), count(id)) of every query, in one round trip.
+    """
+    columns = []
+    for query in queries:
+        model = query.column_descriptions[0]["entity"]
+        rows = query.enable_eagerloads(False).order_by(None)
+        columns.append(rows.with_entities(func.max(model.updated)).scalar_subquery())
+        columns.append(rows.with_entities(func.count(model.id)).scalar_subquery())
+    row = db.session.execute(select(*columns)).one()
+    return [tuple(row[index : index + 2]) for index in range(0, len(row), 2)]
+
+
+def get_validators(sources, kwargs):
+    """
+    Return the strong ETag and the Last-Modified datetime (None if no row) of the sources.
+    """
+    queries = [get_source_query(source, kwargs) for source in sources]
+    key = None
+    if model_cache.shared:
+        models = {query.column_descriptions[0]["entity"] for query in queries}
+        key = "conditional:{}:{}:{}".format(
+            request.path,
+            sorted(kwargs.items()),
+            sorted(
+                (model.__tablename__, model_cache.generation(model)) for model in models
+            ),
+        )
+        versions = model_cache.backend.get(key)
+        if versions is not None:
+            return versions
+    aggregates = aggregate(queries)
+    dates = [updated for updated, _ in aggregates if updated is not None]
+    last_modified = (
+        max(dates).replace(microsecond=0, tzinfo=timezone.utc) if dates else None
+    )
+    digest = hashlib.sha1(
+        repr(
+            [(updated and updated.isoformat(), count) for updated, count in aggregates]
+        ).encode()
+    )
+    versions = (digest.hexdigest(), last_modified)
+    # a lagging replica would store old validators under the generations of the primary
+    if key and not db.session().reads_replica:
+        model_cache.backend.set(key, versions)
+    return versions
+
+
+def is_not_modified(etag, last_modified) -> bool:
+    # If-Modified-Since is ignored when the request has an If-None-Match (RFC 7232)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(*sources):
+    """
+    Decorator of the GET of a resource, the responses carry an ETag and a Last-Modified
+    derived from the rows of the sources, the matching If-None-Match / If-Modified-Since
+    requests get a 304 without running the view.
+
+    sources: models (all the rows) or callables getting the view kwargs and returning
+    the query of the rows (e.g. lambda slug: ProductModel.query.filter_by(slug=slug))
+    The query string is part of the ETag, every page / filter has its own validator.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = get_validators(sources, kwargs)
+            etag = hashlib.sha1(
+                f"{etag}:{request.query_string.decode()}".encode()
+            ).hexdigest()
+            headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+            if last_modified:
+                headers["Last-Modified"] = http_date(last_modified)
+            if is_not_modified(etag, last_modified):
+                return current_app.response_class(status=304, headers=headers)
+            response = func(*args, **kwargs)
+            if isinstance(response, current_app.response_class):
+                if response.status_code == 200:
+                    response.headers.update(headers)
+                return response
+            data, code, view_headers = unpack(response)
+            if code != 200:
+                return data, code, view_headers
+            return data, code, {**headers, **view_headers}
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,66 @@
+"""
+Delivery of the image files (ProductImage.get, ImageFile.get).
+
+IMAGE_DELIVERY chooses who transfers the bytes:
+    None:         the worker sends the file (send_file), with Range and conditional
+                  requests support
+    "x-accel":    nginx, the response only carries X-Accel-Redirect, the internal
+                  location IMAGE_ACCEL_PREFIX mapped on UPLOADED_IMAGES_DEST, e.g.
+                  location /protected-images/ { internal; alias /app/static/images/; }
+    "x-sendfile": Apache (mod_xsendfile) / lighttpd, the response carries X-Sendfile
+With a front proxy the worker only authorizes the request and resolves the path, it
+neither opens nor stats the file: the proxy serves it (Range included) or its 404.
+In every mode the responses are cacheable (IMAGE_MAX_AGE, one year and immutable for
+the content addressed names) and carry the ETag, the matching If-None-Match get a 304.
+"""
+import mimetypes
+import os
+
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+
+from utils import image_helper
+
+DELIVERY_MODES = ("x-accel", "x-sendfile")
+# one year, the maximum recommended by RFC 7234
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_accel_path(path) -> str:
+    relative = os.path.relpath(path, image_helper.IMAGE_SET.config.destination)
+    prefix = current_app.config.get("IMAGE_ACCEL_PREFIX", "/protected-images/")
+    return prefix.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+
+
+def send_image(path, etag=None, immutable=False):
+    """
+    Return the response of the image file, sent by the worker or by the front proxy.
+    Raise FileNotFoundError if the worker sends it and the file is missing.
+    etag: strong validator of the content (e.g. its content addressed name), None for
+    the file based one of send_file (no ETag when the proxy sends it)
+    immutable: the content of the path never changes, cache it forever
+    """
+    max_age = (
+        IMMUTABLE_MAX_AGE if immutable else current_app.config.get("IMAGE_MAX_AGE")
+    )
+    mode = current_app.config.get("IMAGE_DELIVERY")
+    if mode in DELIVERY_MODES:
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream"
+        )
+        if mode == "x-accel":
+            response.headers["X-Accel-Redirect"] = get_accel_path(path)
+        else:
+            response.headers["X-Sendfile"] = os.path.abspath(path)
+        if etag:
+            response.set_etag(etag)
+            response.make_conditional(request)
+    else:
+        response = send_file(path, etag=etag or True, conditional=True, max_age=max_age)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    return response
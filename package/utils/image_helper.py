@@ -1,28 +1,156 @@
-from typing import Union
+from typing import BinaryIO, Tuple, Union
+import hashlib
 import os
 import re
+import tempfile
 
 from werkzeug.datastructures import FileStorage
 
-from flask_uploads import UploadSet, IMAGES
+from flask_uploads import UploadSet, UploadNotAllowed, IMAGES, extension
+from sqlalchemy import event
+
+from plugins.db import db
+from plugins.image_index import image_index
 
 # this "images" should be the same as UPLOADED_{same-name}_DEST i.e UPLOADED_IMAGES_DEST
 IMAGE_SET = UploadSet("images", IMAGES)
 
+# Content addressed store: every distinct content is stored once, whatever the number
+# of products (ProductImageModel rows) using it, as
+# blobs/<digest[:2]>/<digest[2:4]>/<sha256 digest>.<extension>
+# with its variants next to it (<digest>_<size>.<extension>). The names never change
+# content, so their URLs (/images/<name>) can be cached forever.
+BLOBS_FOLDER = "blobs"
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})(_[a-z0-9]+)?\.([a-z0-9]+)$")
+# the same content uploaded as .jpeg or .jpg is stored once
+BLOB_EXTENSIONS = {"jpeg": "jpg", "jpe": "jpg"}
+CHUNK_SIZE = 64 * 1024
+# session.info key of the files removed once the session commits
+REMOVED_KEY = "image_files_removed"
+
 
 def save_image(image: FileStorage, folder: str = None, name: str = None) -> str:
-    return IMAGE_SET.save(image, folder, name)
+    saved = IMAGE_SET.save(image, folder, name)
+    image_index.add(IMAGE_SET.path(saved))
+    return saved
+
+
+def remove_file(path: str):
+    """
+    Remove the file if it exists, from the disk and from the image index.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    image_index.discard(path)
+
+
+def remove_after_commit(*paths: str):
+    """
+    Remove the files once the session commits, they are kept if it rolls back: the
+    rows of a failed request never lose their files.
+    """
+    db.session.info.setdefault(REMOVED_KEY, []).extend(paths)
+
+
+@event.listens_for(db.session, "after_commit")
+def remove_committed(session):
+    for path in session.info.pop(REMOVED_KEY, ()):
+        remove_file(path)
+
+
+@event.listens_for(db.session, "after_transaction_end")
+def keep_not_committed(session, transaction):
+    # after after_commit: what is left was rolled back or closed without a commit
+    if transaction.parent is None:
+        session.info.pop(REMOVED_KEY, None)
 
 
 def get_path(filename: str = None, folder: str = None) -> str:
     return IMAGE_SET.path(filename, folder)
 
 
+def get_blob_name(digest: str, ext: str, size: str = None) -> str:
+    ext = ext.lstrip(".").lower()
+    return f"{digest}{f'_{size}' if size else ''}.{BLOB_EXTENSIONS.get(ext, ext)}"
+
+
+def is_blob_name_safe(name: str) -> bool:
+    return BLOB_NAME.match(name) is not None
+
+
+def get_blob_path(name: str) -> str:
+    """
+    Return the path of the blob (or blob variant) name, e.g. "<digest>_thumb.webp".
+    """
+    return IMAGE_SET.path(name, folder=os.path.join(BLOBS_FOLDER, name[:2], name[2:4]))
+
+
+def get_image_path(image) -> str:
+    """
+    Return the path of the file of the ProductImageModel: its blob, or for the images
+    uploaded before the content addressed store, product_<slug>/<image_name>.
+    """
+    if image.digest:
+        name = get_blob_name(image.digest, get_extension(image.image_name))
+        return get_blob_path(name)
+    return get_path(image.image_name, folder=f"product_{image.product_slug}")
+
+
+def is_image_stored(image) -> bool:
+    return image_index.exists(get_image_path(image))
+
+
+def store_blob(stream: BinaryIO, ext: str) -> str:
+    """
+    Store the content of the stream, return its sha256 digest.
+    The content is hashed while it is written to a temporary file, which is then renamed
+    to its blob path: the rename is atomic, so a blob is never seen partly written, and
+    a content already stored is only replaced by the same bytes.
+    """
+    temp_folder = IMAGE_SET.path("tmp", folder=BLOBS_FOLDER)
+    os.makedirs(temp_folder, exist_ok=True)
+    sha256 = hashlib.sha256()
+    descriptor, temp_path = tempfile.mkstemp(dir=temp_folder)
+    try:
+        with os.fdopen(descriptor, "wb") as temp_file:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                temp_file.write(chunk)
+        digest = sha256.hexdigest()
+        path = get_blob_path(get_blob_name(digest, ext))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # mkstemp creates it private, the front proxy reads it (IMAGE_DELIVERY)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+        image_index.add(path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return digest
+
+
+def save_blob(image: FileStorage) -> Tuple[str, str]:
+    """
+    Store the uploaded image in the content addressed store.
+    Raise UploadNotAllowed if its extension is not allowed.
+
+    @return: sha256 digest of the image and its safe basename
+    @rtype: tuple
+    """
+    basename = IMAGE_SET.get_basename(image.filename)
+    if not IMAGE_SET.extension_allowed(extension(basename)):
+        raise UploadNotAllowed()
+    return store_blob(image.stream, extension(basename)), basename
+
+
 def find_image_any_format(filename: str, folder: str) -> Union[str, None]:
     for _format in IMAGES:
         image = f"{filename}.{_format}"
         image_path = IMAGE_SET.path(filename=image, folder=folder)
-        if os.path.isfile(image_path):
+        if image_index.exists(image_path):
             return image_path
     return None
 
@@ -45,7 +173,7 @@ def is_file_safe(file: Union[str, FileStorage], folder: str) -> bool:
     filename = _retrieve_filename(file)
     if is_filename_safe(filename):
         image_path = IMAGE_SET.path(filename=filename, folder=folder)
-        return os.path.exists(image_path)
+        return image_index.exists(image_path)
     return False
 
 
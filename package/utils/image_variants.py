@@ -0,0 +1,190 @@
+"""
+Resized variants of the product images (PRODUCT_IMAGE_VARIANTS, e.g. thumb, card and
+zoom), every one in the format of the original and in WebP.
+
+An upload (POST /product-image/<slug>) schedules the rendering of its variants in a
+process pool once the request is done, so the resizing never runs on the request path.
+The worker processes only read the original and write the files, next to its blob in
+the content addressed store (utils.image_helper). The parent process then records them
+as ProductImageVariantModel rows of the image.
+GET /product-image/<slug>/<filename>?size=thumb serves the recorded variant, or the
+original until it is rendered.
+`flask images variants` renders the variants of the images uploaded before.
+"""
+import functools
+import os
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import after_this_request, current_app
+from PIL import Image, ImageOps
+
+from models.products import ProductImageModel, ProductImageVariantModel
+from plugins.db import db
+
+from utils import image_helper
+
+VARIANTS_FOLDER = "variants"
+# Pillow format of the original -> extension of its variants, PNG for the others
+VARIANT_FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+QUALITY = 85
+
+_executor = None
+
+
+def get_executor(workers):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def get_folder(image) -> str:
+    return f"product_{image.product_slug}"
+
+
+def get_job(image):
+    """
+    Return the (source, target folder, sizes) arguments of render_variants.
+    The variants of a stored content are next to its blob (<digest>_<size>.<ext>).
+    """
+    source = image_helper.get_image_path(image)
+    return (
+        source,
+        os.path.dirname(source)
+        if image.digest
+        else image_helper.get_path(VARIANTS_FOLDER, folder=get_folder(image)),
+        dict(current_app.config.get("PRODUCT_IMAGE_VARIANTS", {})),
+    )
+
+
+def get_variant_path(image, variant) -> str:
+    if image.digest:
+        return image_helper.get_blob_path(variant.file_name)
+    return image_helper.get_path(
+        variant.file_name, folder=f"{get_folder(image)}/{VARIANTS_FOLDER}"
+    )
+
+
+def get_rendered(image):
+    """
+    Return the variants already rendered for the same content by another image, None if
+    there are none.
+    """
+    if not image.digest:
+        return None
+    other = ProductImageModel.query.filter(
+        ProductImageModel.digest == image.digest,
+        ProductImageModel.id != image.id,
+        ProductImageModel.variants.any(),
+    ).first()
+    if other is None:
+        return None
+    return [
+        {
+            column: getattr(variant, column)
+            for column in ("size", "format", "file_name", "width", "height", "bytes")
+        }
+        for variant in other.variants
+    ]
+
+
+def save(image, path, image_format):
+    """
+    Write the image atomically: readers never see a partly written variant. The
+    temporary file is unique, the workers rendering the same variant don't share it.
+    """
+    if image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix=os.path.splitext(path)[1]
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as temp_file:
+            image.save(temp_file, image_format, quality=QUALITY, optimize=True)
+        # mkstemp creates it private, the front proxy reads it (IMAGE_DELIVERY)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def render_variants(source, target, sizes):
+    """
+    Render the variants of the image file, run by the worker processes (no app, no db).
+    Every variant fits in a square of its size (px) and is never upscaled.
+    source: path of the original
+    target: folder of the variants
+    sizes: {variant name: size}, e.g. {"thumb": 160}
+
+    @return: the variants, ready for ProductImageVariantModel.record
+    [{"size": "thumb", "format": "webp", "file_name", "width", "height", "bytes"}]
+    @rtype: list of dict
+    """
+    os.makedirs(target, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = []
+    with Image.open(source) as original:
+        image_format = original.format if original.format in VARIANT_FORMATS else "PNG"
+        original = ImageOps.exif_transpose(original)
+        formats = {image_format: VARIANT_FORMATS[image_format], "WEBP": "webp"}
+        for size, length in sizes.items():
+            resized = original.copy()
+            resized.thumbnail((length, length), Image.LANCZOS)
+            for variant_format, extension in formats.items():
+                file_name = f"{stem}_{size}.{extension}"
+                path = os.path.join(target, file_name)
+                save(resized, path, variant_format)
+                variants.append(
+                    {
+                        "size": size,
+                        "format": extension,
+                        "file_name": file_name,
+                        "width": resized.width,
+                        "height": resized.height,
+                        "bytes": os.path.getsize(path),
+                    }
+                )
+    return variants
+
+
+def record_rendered(app, image_id, future):
+    """
+    Done callback of the rendering, records the variants in its own session.
+    """
+    with app.app_context():
+        try:
+            ProductImageVariantModel.record(image_id, future.result())
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("variants of the product image %s failed", image_id)
+        finally:
+            db.session.remove()
+
+
+def schedule(image):
+    """
+    Render the variants of the saved image in the process pool, submitted once the
+    request is done (so its image is committed) and recorded when rendered.
+    With PRODUCT_IMAGE_WORKERS = 0 they are rendered in the request instead.
+    A content already rendered for another image is not rendered again.
+    """
+    rendered = get_rendered(image)
+    if rendered is not None:
+        ProductImageVariantModel.record(image.id, rendered)
+        return
+    workers = current_app.config.get("PRODUCT_IMAGE_WORKERS", 0)
+    job, image_id = get_job(image), image.id
+    if not workers:
+        ProductImageVariantModel.record(image_id, render_variants(*job))
+        return
+    app = current_app._get_current_object()
+
+    @after_this_request
+    def submit(response):
+        future = get_executor(workers).submit(render_variants, *job)
+        future.add_done_callback(functools.partial(record_rendered, app, image_id))
+        return response
@@ -1,8 +1,238 @@
+import base64
+import binascii
 import functools
-from flask import url_for, request
+import hashlib
+import json
+import re
 
+from datetime import datetime
 
-def paginate(collection, schema=None, max_per_page=25):
+from flask import abort, current_app, url_for, request
+from flask_sqlalchemy import Pagination
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import DBAPIError
+
+from plugins.cache import model_cache, LocalCache
+from plugins.db import db
+
+from utils.strings_helper import gettext
+
+COUNT_MODES = ("exact", "cached", "estimate", "none")
+# query string arguments of the pagination, the others (filters) are kept by the urls
+PAGING_ARGS = ("page", "per_page", "expanded", "count", "cursor", "order_by")
+# SEARCH product USING INDEX ix_product_active_price_id (active=? AND price>?)
+SQLITE_PLAN_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+) \((.*)\)")
+
+# totals of count="cached" when the model_cache has no backend
+count_cache = LocalCache(max_size=1000)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order_by, item) -> str:
+    value = getattr(item, order_by.lstrip("-"))
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    data = json.dumps([order_by, value, item.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, order_by, column):
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order_by, value, last_id = json.loads(data)
+        if isinstance(value, str) and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise InvalidCursor() from e
+    if cursor_order_by != order_by:
+        raise InvalidCursor()
+    return value, last_id
+
+
+def keyset(query, order_by, cursor, per_page):
+    """
+    Return the items of the page after the cursor and the cursor of the next page.
+    The items are ordered on the order_by key (e.g. "price", "-created") then on id,
+    the page starts after the (key, id) of the cursor, so no OFFSET nor COUNT is run.
+    """
+    model = query.column_descriptions[0]["entity"]
+    descending = order_by.startswith("-")
+    column = getattr(model, order_by.lstrip("-"))
+    if cursor:
+        value, last_id = decode_cursor(cursor, order_by, column)
+        if column is model.id:
+            after = column < last_id if descending else column > last_id
+        elif descending:
+            after = or_(column < value, and_(column == value, model.id < last_id))
+        else:
+            after = or_(column > value, and_(column == value, model.id > last_id))
+        query = query.filter(after)
+    if descending:
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column, model.id)
+    items = query.limit(per_page + 1).all()
+    next_cursor = (
+        encode_cursor(order_by, items[per_page - 1]) if len(items) > per_page else None
+    )
+    return items[:per_page], next_cursor
+
+
+class CountPagination(Pagination):
+    """
+    Pagination whose total may be approximate (estimate) or unknown (None),
+    the next page is known from the extra item fetched with the page.
+    """
+
+    def __init__(self, query, page, per_page, total, items, has_next):
+        super().__init__(query, page, per_page, total, items)
+        self._has_next = has_next
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(super().pages, self.page + self._has_next)
+
+    @property
+    def has_next(self):
+        return self._has_next
+
+
+def get_model(query):
+    return query.column_descriptions[0]["entity"]
+
+
+def literal_sql(query) -> str:
+    statement = query.enable_eagerloads(False).order_by(None).statement
+    return str(
+        statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def exact_count(query) -> int:
+    return query.order_by(None).count()
+
+
+def cached_count(query) -> int:
+    """
+    Count cached per query (SQL and parameters) and generation of the model, so any
+    write of the model drops it. Writes of the other tables only expire through TTL.
+    """
+    model = get_model(query)
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    digest = hashlib.sha1(
+        f"{compiled}{sorted(compiled.params.items())!r}".encode()
+    ).hexdigest()
+    key = f"count:{model.__tablename__}:{model_cache.generation(model)}:{digest}"
+    store = model_cache.backend or count_cache
+    total = store.get(key)
+    if total is None:
+        total = exact_count(query)
+        store.set(key, total, current_app.config.get("PAGINATION_COUNT_TTL", 60))
+    return total
+
+
+def sqlite_estimate(query):
+    """
+    Rows estimated from sqlite_stat1 (filled by ANALYZE) for the index chosen by the
+    planner, None if the table has no statistics.
+    """
+    connection = db.session.connection()
+    table = get_model(query).__tablename__
+    try:
+        stats = {
+            idx: [int(value) for value in stat.split()[:8] if value.isdigit()]
+            for idx, stat in connection.exec_driver_sql(
+                "SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ?", (table,)
+            )
+        }
+    except DBAPIError:
+        return None
+    if not stats:
+        return None
+    rows = max(stat[0] for stat in stats.values())
+    sql = literal_sql(query)
+    plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    line = next((line for line in plan if f" {table}" in line), "")
+    match = SQLITE_PLAN_INDEX.search(line)
+    if "INTEGER PRIMARY KEY (rowid=" in line:
+        return 1
+    if match and match.group(1) in stats:
+        equalities = len(re.findall(r"\w+=\?", match.group(2)))
+        stat = stats[match.group(1)]
+        if 0 < equalities < len(stat):
+            return stat[equalities]
+    return rows
+
+
+def estimated_count(query) -> int:
+    """
+    Count estimated by the planner statistics (Postgres) or sqlite_stat1 (SQLite),
+    exact count when the database has no statistics.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        sql = literal_sql(query).replace("%", "%%")
+        plan = (
+            db.session.connection()
+            .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+            .scalar()
+        )
+        return int(plan[0]["Plan"]["Plan Rows"])
+    if dialect == "sqlite":
+        total = sqlite_estimate(query)
+        if total is not None:
+            return total
+    return exact_count(query)
+
+
+def count_paginate(query, page, per_page, count):
+    """
+    query.paginate with the total counted by the count mode (None for "none").
+    """
+    if count == "exact":
+        return query.paginate(page, per_page)
+    if page < 1:
+        abort(404)
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    if not items and page != 1:
+        abort(404)
+    total = {"cached": cached_count, "estimate": estimated_count}.get(
+        count, lambda query: None
+    )(query)
+    return CountPagination(
+        query, page, per_page, total, items[:per_page], len(items) > per_page
+    )
+
+
+def page_url(view_args, **params) -> str:
+    """
+    Return the url of another page of the request: its filters (every value of the
+    repeated ones, e.g. attr) and view arguments, with the paging params.
+    """
+    filters = {
+        key: request.args.getlist(key)
+        for key in request.args
+        if key not in PAGING_ARGS and key not in view_args
+    }
+    return url_for(request.endpoint, _external=True, **filters, **view_args, **params)
+
+
+def paginate(
+    collection,
+    schema=None,
+    max_per_page=25,
+    cursor_keys=("id",),
+    count="exact",
+    extras=None,
+    expanded_schema=None,
+):
     """
     Generate a paginated response for a resource collection.
     Routes that use this decorator must return a SQLAlchemy query as a
@@ -11,13 +241,27 @@ def paginate(collection, schema=None, max_per_page=25):
     results. The application must ensure that this result is converted to a
     response object, either by chaining another decorator or by using a
     custom response object that accepts dictionaries.
+
+    Offset pagination (?page=) is the default. Requests with a ?cursor= argument
+    (empty for the first page) are paginated on the keys of cursor_keys instead,
+    chosen with ?order_by= (e.g. "price", "-created"), cursor_keys[0] by default.
+    No cursor_keys (e.g. relevance ordered queries) disables the cursor pagination.
+
+    The total of the offset pagination is counted by ?count= (`count` by default):
+    exact (COUNT), cached (COUNT cached until a write of the model or TTL),
+    estimate (planner statistics) or none (no total, pages nor last_url).
+
+    extras: callable(query) returning a dict merged in the response (e.g. facets).
+    expanded_schema: schema of the items of the ?expanded=1 requests, schema by default.
     """
 
     def decorator(f):
         @functools.wraps(f)
         def wrapped(*args, **kwargs):
-            # invoke the wrapped function
+            # invoke the wrapped function, an error response is returned as it is
             query = f(*args, **kwargs)
+            if isinstance(query, tuple):
+                return query
 
             # obtain pagination arguments from the URL's query string
             page = request.args.get("page", 1, type=int)
@@ -28,8 +272,15 @@ def paginate(collection, schema=None, max_per_page=25):
             if request.args.get("expanded", 0, type=int) != 0:
                 expanded = 1
 
+            if "cursor" in request.args and cursor_keys:
+                return cursor_page(query, per_page, expanded, kwargs)
+
+            count_mode = request.args.get("count", count)
+            if count_mode not in COUNT_MODES:
+                return {"message": gettext("pagination_invalid_count")}, 400
+
             # run the query with Flask-SQLAlchemy's pagination
-            p = query.paginate(page, per_page)
+            p = count_paginate(query, page, per_page, count_mode)
 
             # build the pagination metadata to include in the response
             pages = {
@@ -37,54 +288,89 @@ def paginate(collection, schema=None, max_per_page=25):
                 "per_page": per_page,
                 "total": p.total,
                 "pages": p.pages,
+                "count": count_mode,
             }
+            # the urls keep the count mode asked by the client
+            url_count = None if count_mode == count else count_mode
             if p.has_prev:
-                pages["prev_url"] = url_for(
-                    request.endpoint,
+                pages["prev_url"] = page_url(
+                    kwargs,
                     page=p.prev_num,
                     per_page=per_page,
                     expanded=expanded,
-                    _external=True,
-                    **kwargs
+                    count=url_count,
                 )
             else:
                 pages["prev_url"] = None
             if p.has_next:
-                pages["next_url"] = url_for(
-                    request.endpoint,
+                pages["next_url"] = page_url(
+                    kwargs,
                     page=p.next_num,
                     per_page=per_page,
                     expanded=expanded,
-                    _external=True,
-                    **kwargs
+                    count=url_count,
                 )
             else:
                 pages["next_url"] = None
-            pages["first_url"] = url_for(
-                request.endpoint,
+            pages["first_url"] = page_url(
+                kwargs,
                 page=1,
                 per_page=per_page,
                 expanded=expanded,
-                _external=True,
-                **kwargs
-            )
-            pages["last_url"] = url_for(
-                request.endpoint,
-                page=p.pages,
-                per_page=per_page,
-                expanded=expanded,
-                _external=True,
-                **kwargs
+                count=url_count,
             )
+            pages["last_url"] = None
+            if p.pages is not None:
+                pages["last_url"] = page_url(
+                    kwargs,
+                    page=p.pages,
+                    per_page=per_page,
+                    expanded=expanded,
+                    count=url_count,
+                )
 
             # generate the paginated collection as a dictionary
-            if expanded:
-                results = [schema.dump(item) if schema else item for item in p.items]
+            if expanded and expanded_schema:
+                results = [expanded_schema.dump(item) for item in p.items]
             else:
                 results = [schema.dump(item) if schema else item for item in p.items]
 
             # return a dictionary as a response
-            return {collection: results, "pages": pages}
+            return {collection: results, "pages": pages, **get_extras(query)}
+
+        def get_extras(query):
+            return extras(query) if extras else {}
+
+        def cursor_page(query, per_page, expanded, kwargs):
+            cursor = request.args.get("cursor")
+            order_by = request.args.get("order_by", cursor_keys[0])
+            if order_by.lstrip("-") not in cursor_keys:
+                return {"message": gettext("pagination_invalid_cursor")}, 400
+            try:
+                items, next_cursor = keyset(query, order_by, cursor, per_page)
+            except InvalidCursor:
+                return {"message": gettext("pagination_invalid_cursor")}, 400
+
+            pages = {
+                "per_page": per_page,
+                "order_by": order_by,
+                "cursor": cursor,
+                "next_cursor": next_cursor,
+                "next_url": None,
+            }
+            if next_cursor:
+                pages["next_url"] = page_url(
+                    kwargs,
+                    cursor=next_cursor,
+                    order_by=order_by,
+                    per_page=per_page,
+                    expanded=expanded,
+                )
+            if expanded and expanded_schema:
+                results = [expanded_schema.dump(item) for item in items]
+            else:
+                results = [schema.dump(item) if schema else item for item in items]
+            return {collection: results, "pages": pages, **get_extras(query)}
 
         return wrapped
 
@@ -0,0 +1,89 @@
+"""
+Streaming export of the catalog (GET /products/export, flask products export).
+
+The active products are read with yield_per (server side cursor where the database has
+one), their attrs, options and images are loaded per batch (selectinload), and every
+product is written as soon as it is read, as NDJSON or CSV. Only one batch of products
+is held in memory whatever the size of the catalog.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy.orm import selectinload
+
+from models.products import ProductModel, ProductAttributeModel
+
+from schema.products import ProductAllSchema
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = (
+    "id",
+    "slug",
+    "name",
+    "description",
+    "price",
+    "category_id",
+    "rating",
+    "rating_count",
+    "images",
+    "attrs",
+)
+
+product_all_schema = ProductAllSchema()
+
+
+def iter_products(batch_size=1000):
+    query = (
+        ProductModel.query.filter(ProductModel.active)
+        .options(
+            selectinload(ProductModel.attrs).selectinload(
+                ProductAttributeModel.attrs_options
+            ),
+            selectinload(ProductModel.images),
+        )
+        .order_by(ProductModel.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for product in query:
+        data = product_all_schema.dump(product)
+        data["category_id"] = product.category_id
+        data["images"] = [image.image_name for image in product.images if image.active]
+        yield data
+
+
+def to_ndjson(documents):
+    for document in documents:
+        yield json.dumps(document) + "\n"
+
+
+def to_csv(documents):
+    """
+    One row per product, the attrs (with their options) are a JSON column and the
+    images a space separated column.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for document in documents:
+        document = dict(
+            document,
+            images=" ".join(document["images"]),
+            attrs=json.dumps(document["attrs"]),
+        )
+        writer.writerow([document.get(column) for column in CSV_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_products(export_format="ndjson", batch_size=1000):
+    """
+    Return the generator of the chunks (str) of the export of the active products.
+    export_format: "ndjson" or "csv" (EXPORT_FORMATS)
+    """
+    documents = iter_products(batch_size)
+    if export_format == "csv":
+        return to_csv(documents)
+    return to_ndjson(documents)
@@ -0,0 +1,130 @@
+"""
+Streaming NDJSON import of the products (POST /products/import, flask products import).
+
+Every line is one product in the format of ProductAllSchema (with its attrs and
+attrs_options). The lines are read one at a time and validated as they come, the valid
+products are saved in batches with one transaction per batch (ProductModel.save_many),
+so only one batch is ever held in memory whatever the size of the import.
+import_products yields the results as they happen: one per invalid line, one per
+committed batch and a final summary, ready to be streamed back line by line.
+"""
+import json
+
+from marshmallow import ValidationError
+
+from models.helper.utils import random_string_generator, unique_slug_generator
+from models.products import ProductModel
+from plugins.db import db
+
+from schema.products import ProductAllSchema
+
+from utils.strings_helper import gettext
+
+product_all_schema = ProductAllSchema()
+
+
+def load_line(line):
+    """
+    Return the product of the line, ready to be saved (pre_save done).
+    Raise ValidationError if the line is not a valid product.
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    try:
+        data = json.loads(line)
+    except ValueError:
+        raise ValidationError(gettext("product_import_line_not_json"))
+    product = product_all_schema.load(data)
+    provided_slug = product.slug
+    try:
+        product.pre_save()
+    except AssertionError as e:
+        raise ValidationError(str(e))
+    return product, provided_slug
+
+
+def check_slugs(batch):
+    """
+    Return the lines of the batch whose slug is already taken, the generated slugs
+    taken by another product of the batch are generated again.
+    """
+    provided = [slug for _, _, slug in batch if slug]
+    taken = {
+        slug
+        for slug, in db.session.query(ProductModel.slug).filter(
+            ProductModel.slug.in_(provided)
+        )
+    }
+    errors = []
+    for number, product, provided_slug in batch:
+        if product.slug in taken and provided_slug:
+            errors.append(number)
+            continue
+        while product.slug in taken:
+            product.slug = unique_slug_generator(
+                product, f"{product.slug}-{random_string_generator(size=4)}"
+            )
+        taken.add(product.slug)
+    return errors
+
+
+def save_batch(batch, index):
+    errors = set(check_slugs(batch))
+    for number in sorted(errors):
+        yield {"line": number, "errors": {"slug": [gettext("product_already_found")]}}
+    products = [product for number, product, _ in batch if number not in errors]
+    try:
+        ProductModel.save_many(products, batch_size=len(products) or 1)
+    except Exception as e:
+        # save_many rolled back the whole batch
+        for number, _, _ in batch:
+            if number not in errors:
+                yield {"line": number, "errors": {"_schema": [str(e)]}}
+        products = []
+    yield {
+        "batch": index,
+        "first_line": batch[0][0],
+        "last_line": batch[-1][0],
+        "created": len(products),
+    }
+
+
+def import_products(lines, batch_size=500):
+    """
+    Import the products of the NDJSON lines (str or bytes, blank lines are skipped).
+
+    @return: generator of the results
+        {"line": 3, "errors": {...}}: line not imported
+        {"batch": 1, "first_line": 1, "last_line": 500, "created": 499}: committed batch
+        {"created": 999, "errors": 1}: summary, last result
+    @rtype: generator of dict
+    """
+    batch, index, created, errors = [], 0, 0, 0
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            product, provided_slug = load_line(line)
+        except ValidationError as e:
+            errors += 1
+            messages = e.messages
+            if not isinstance(messages, dict):
+                messages = {"_schema": messages}
+            yield {"line": number, "errors": messages}
+            continue
+        batch.append((number, product, provided_slug))
+        if len(batch) < batch_size:
+            continue
+        index += 1
+        for result in save_batch(batch, index):
+            created += result.get("created", 0)
+            errors += "line" in result
+            yield result
+        batch = []
+    if batch:
+        index += 1
+        for result in save_batch(batch, index):
+            created += result.get("created", 0)
+            errors += "line" in result
+            yield result
+    yield {"created": created, "errors": errors}
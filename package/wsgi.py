@@ -3,13 +3,17 @@ from app import app
 from flask_restful import Api
 
 from models.users import UserModel, UserRoleModel
+from models.helper.unit_of_work import unit_of_work
 
 from plugins.admin import admin
-from plugins.db import db
+from plugins.cache import model_cache
+from plugins.image_index import image_index
+from plugins.db import db, route_reads
 from plugins.ma import ma
 from plugins.mail import mail
 from plugins.limiter import limiter
 
+from add_commands import add_commands
 from add_resources import add_resources
 from add_admin_views import add_admin_views
 
@@ -18,8 +22,10 @@ ma.init_app(app)
 mail.init_app(app)
 admin.init_app(app)
 limiter.init_app(app)
+model_cache.init_app(app)
+image_index.init_app(app)
 
-api = Api(app)
+api = Api(app, decorators=[unit_of_work, route_reads])
 
 
 @app.before_first_request
@@ -42,6 +48,7 @@ def create_tables():
 
 
 add_resources(api)
+add_commands(app)
 add_admin_views(admin)
 
 if __name__ == "__main__":
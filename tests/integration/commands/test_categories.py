@@ -0,0 +1,30 @@
+from tests.base_test import BaseTest, app
+
+from models.product_category import ProductCategoryModel, category_tree
+
+from plugins.db import db
+
+
+class TestCategories(BaseTest):
+    def test_rebuild(self):
+        with self.app_context():
+            parent = ProductCategoryModel(name="parent")
+            parent.save_to_db()
+            parent_id = parent.id
+            ProductCategoryModel(name="child", parent_id=parent.id).save_to_db()
+            db.session.execute(category_tree.delete())
+            db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["categories", "rebuild"])
+
+        # (parent, parent), (child, child), (parent, child)
+        self.assertIn("3 path(s) rebuilt", result.output)
+        with self.app_context():
+            self.assertEqual(
+                [
+                    (item.name, depth)
+                    for item, depth in ProductCategoryModel.get_subtree(parent_id)
+                ],
+                [("parent", 0), ("child", 1)],
+            )
@@ -0,0 +1,199 @@
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from flask_uploads import UploadConfiguration
+from PIL import Image
+
+from tests.base_test import BaseTest, app
+
+from models.products import (
+    ProductModel,
+    ProductImageModel,
+    ProductImageVariantModel,
+)
+
+from plugins.db import db
+
+from commands import images
+from utils import image_helper
+from utils.image_helper import IMAGE_SET
+
+
+class TestImages(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.destination = tempfile.TemporaryDirectory()
+        IMAGE_SET._config = UploadConfiguration(self.destination.name)
+        folder = os.path.join(self.destination.name, "product_temp-slug")
+        os.makedirs(folder)
+        Image.new("RGB", (800, 600), "red").save(os.path.join(folder, "photo.jpg"))
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+            ProductImageModel(
+                image_name="photo.jpg", product_slug="temp-slug"
+            ).save_to_db()
+
+    def tearDown(self) -> None:
+        IMAGE_SET._config = None
+        self.destination.cleanup()
+        super().tearDown()
+
+    def test_variants(self):
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["images", "variants", "--workers", "1"])
+        again = runner.invoke(args=["images", "variants", "--workers", "0"])
+
+        self.assertIn("1 image(s) rendered, 0 failed", result.output)
+        # only the images without variants by default
+        self.assertIn("0 image(s) rendered, 0 failed", again.output)
+        with self.app_context():
+            variants = {
+                (variant.size, variant.format): variant
+                for variant in ProductImageVariantModel.query
+            }
+            sizes = app.config["PRODUCT_IMAGE_VARIANTS"]
+            self.assertEqual(len(variants), 2 * len(sizes))
+            thumb = variants[("thumb", "webp")]
+            self.assertEqual(
+                (thumb.width, thumb.height), (sizes["thumb"], sizes["thumb"] * 3 // 4)
+            )
+            # never upscaled
+            self.assertEqual(variants[("zoom", "jpg")].width, 800)
+            self.assertTrue(
+                os.path.isfile(
+                    os.path.join(
+                        self.destination.name,
+                        "product_temp-slug",
+                        "variants",
+                        "photo_thumb.webp",
+                    )
+                )
+            )
+            # written through unique temporary files, none left behind
+            folder = os.path.join(
+                self.destination.name, "product_temp-slug", "variants"
+            )
+            self.assertEqual(
+                sorted(os.listdir(folder)),
+                sorted(variant.file_name for variant in variants.values()),
+            )
+
+    def test_store(self):
+        folder = os.path.join(self.destination.name, "product_other")
+        os.makedirs(folder)
+        # the same content as temp-slug/photo.jpg
+        Image.new("RGB", (800, 600), "red").save(os.path.join(folder, "copy.jpeg"))
+        with self.app_context():
+            ProductModel(
+                **dict(self.product_params, slug="other", name="other")
+            ).save_to_db()
+            ProductImageModel(image_name="copy.jpeg", product_slug="other").save_to_db()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["images", "store"])
+
+        self.assertIn("2 image(s) stored, 0 missing", result.output)
+        with self.app_context():
+            digests = {image.digest for image in ProductImageModel.query}
+            self.assertEqual(len(digests), 1)
+            digest = digests.pop()
+            self.assertEqual(ProductImageModel.references(digest), 2)
+            blobs = os.path.join(
+                self.destination.name, "blobs", digest[:2], digest[2:4]
+            )
+            self.assertEqual(os.listdir(blobs), [f"{digest}.jpg"])
+            self.assertFalse(os.path.exists(os.path.join(folder, "copy.jpeg")))
+
+    def test_remove_after_commit(self):
+        photo = os.path.join(self.destination.name, "product_temp-slug", "photo.jpg")
+        with self.app_context():
+            image = ProductImageModel.query.one()
+            image_helper.remove_after_commit(photo)
+            db.session.delete(image)
+            db.session.flush()
+            db.session.rollback()
+
+            # the row is kept, so is its file
+            self.assertTrue(os.path.isfile(photo))
+            self.assertEqual(ProductImageModel.query.count(), 1)
+
+            image = ProductImageModel.query.one()
+            image_helper.remove_after_commit(photo)
+            image.delete_from_db()
+
+            self.assertFalse(os.path.isfile(photo))
+
+    def test_sweep(self):
+        photo = os.path.join(self.destination.name, "product_temp-slug", "photo.jpg")
+        orphan = os.path.join(
+            self.destination.name, "blobs", "ab", "cd", "abcd" + "0" * 60 + ".jpg"
+        )
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, "wb") as orphan_file:
+            orphan_file.write(b"orphan")
+        os.remove(photo)
+
+        runner = app.test_cli_runner()
+        dry_run = runner.invoke(args=["images", "sweep", "--dry-run", "--min-age", "0"])
+        result = runner.invoke(args=["images", "sweep", "--min-age", "0"])
+
+        self.assertIn("1 missing, 0 restored, 1 orphan file(s)", dry_run.output)
+        self.assertIn("1 missing, 0 restored, 1 orphan file(s)", result.output)
+        # quarantined, not deleted
+        with self.app_context():
+            image = ProductImageModel.query.one()
+            self.assertFalse(image.active)
+            self.assertIsNotNone(image.quarantined)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    self.destination.name,
+                    "quarantine",
+                    os.path.relpath(orphan, self.destination.name),
+                )
+            )
+        )
+
+        Image.new("RGB", (800, 600), "red").save(photo)
+        result = runner.invoke(args=["images", "sweep"])
+
+        self.assertIn("0 missing, 1 restored, 0 orphan file(s)", result.output)
+        with self.app_context():
+            image = ProductImageModel.query.one()
+            self.assertTrue(image.active)
+            self.assertIsNone(image.quarantined)
+            # deactivated on purpose, not restored
+            image.active = False
+            image.save_to_db()
+        result = runner.invoke(args=["images", "sweep"])
+
+        self.assertIn("0 image(s) checked", result.output)
+        with self.app_context():
+            self.assertFalse(ProductImageModel.query.one().active)
+
+    def test_sweep_stored_again(self):
+        orphan = os.path.join(
+            self.destination.name, "blobs", "ab", "cd", "abcd" + "0" * 60 + ".jpg"
+        )
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, "wb") as orphan_file:
+            orphan_file.write(b"orphan")
+        old = time.time() - 2 * 60 * 60
+        os.utime(orphan, (old, old))
+        find_blob_files = images.find_blob_files
+
+        def find_then_store(min_age):
+            files = find_blob_files(min_age)
+            # an upload stores the same content again meanwhile
+            os.utime(orphan)
+            return files
+
+        runner = app.test_cli_runner()
+        with patch.object(images, "find_blob_files", side_effect=find_then_store):
+            result = runner.invoke(args=["images", "sweep"])
+
+        self.assertIn("0 orphan file(s)", result.output)
+        self.assertTrue(os.path.isfile(orphan))
@@ -0,0 +1,53 @@
+from tests.base_test import BaseTest, app
+
+from commands.indexes import build_report, scan_shapes, used_indexes
+
+from models.cart import CartModel
+
+from plugins.db import db
+
+
+class TestIndexes(BaseTest):
+    def test_scan_shapes(self):
+        with self.app_context():
+            shapes = scan_shapes()
+
+        # CartModel.get_item(user_id=user, session=session), session -> session_id
+        self.assertIn(
+            (CartModel, (("active", False), ("session_id", False), ("user_id", False))),
+            shapes,
+        )
+
+    def test_report(self):
+        with self.app_context():
+            result = build_report()
+            self.assertEqual(result["not_created"], [])
+            self.assertNotIn("ix_cart_active_user_id_session_id", result["unused"])
+            self.assertNotIn(
+                (CartModel, (("active", False), ("session_id", False), ("user_id", False))),
+                result["missing"],
+            )
+
+            db.session.execute("DROP INDEX ix_cart_active_user_id_session_id")
+            result = build_report()
+            self.assertIn("ix_cart_active_user_id_session_id", result["not_created"])
+
+    def test_used_indexes(self):
+        used = used_indexes(
+            ["SEARCH cart USING INDEX ix_cart_active_user_id_session_id (active=?)"]
+        )
+
+        self.assertIn("ix_cart_active_user_id_session_id", used)
+        self.assertNotIn("ix_cart_active_user_id", used)
+
+    def test_create_command(self):
+        with self.app_context():
+            db.session.execute("DROP INDEX ix_order_active_user_id")
+            db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["indexes", "create"])
+
+        self.assertIn("ix_order_active_user_id ok", result.output)
+        with self.app_context():
+            self.assertEqual(build_report()["not_created"], [])
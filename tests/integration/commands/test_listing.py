@@ -0,0 +1,22 @@
+from tests.base_test import BaseTest, app
+
+from models.product_listing import ProductListingModel
+from models.products import ProductModel
+
+from plugins.db import db
+
+
+class TestListing(BaseTest):
+    def test_rebuild(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+            db.session.execute("DELETE FROM product_listing")
+            db.session.commit()
+            self.assertEqual(ProductListingModel.query.count(), 0)
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["listing", "rebuild", "--batch-size", "1"])
+
+        self.assertIn("1 product(s) refreshed, 0 row(s) deleted", result.output)
+        with self.app_context():
+            self.assertEqual(ProductListingModel.query.count(), 1)
@@ -0,0 +1,20 @@
+from tests.base_test import BaseTest, app
+
+from models.coupons import CouponModel
+from models.products import ProductModel
+
+
+class TestPricing(BaseTest):
+    def test_reprice(self):
+        with self.app_context():
+            CouponModel(**self.coupon_params).save_to_db()
+            ProductModel(name="shirt", price=100).save_to_db()
+            ProductModel(name="jeans", price=500).save_to_db()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["pricing", "reprice", "--coupon", "TEST20"])
+        unknown = runner.invoke(args=["pricing", "reprice", "--coupon", "NOPE"])
+
+        # 20% capped to 75 on the jeans
+        self.assertIn("2 line(s): 600.00 - 95.00 discount = 505.00", result.output)
+        self.assertNotEqual(unknown.exit_code, 0)
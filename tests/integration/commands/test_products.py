@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+
+from tests.base_test import BaseTest, app
+
+from models.products import ProductModel
+
+
+class TestProducts(BaseTest):
+    def test_import(self):
+        lines = [
+            {
+                "name": "shirt",
+                "price": 10,
+                "attrs": [
+                    {
+                        "name": "color",
+                        "attrs_options": [
+                            {"name": "Red", "value": "red", "price_change": 1}
+                        ],
+                    }
+                ],
+            },
+            "not json",
+            {"name": "no price"},
+            {"name": "shirt", "price": 12},
+            {"name": "taken", "slug": "shirt", "price": 12},
+            {"name": "jeans", "price": 20},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as file:
+            for line in lines:
+                file.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+            file.write("\n")
+        self.addCleanup(os.remove, file.name)
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            args=["products", "import", file.name, "--batch-size", "2"]
+        )
+
+        results = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([result.get("line") for result in results[:2]], [2, 3])
+        self.assertIn("price", results[1]["errors"])
+        self.assertIn({"line": 5, "errors": {"slug": ["Product already present"]}}, results)
+        self.assertEqual(
+            [result["created"] for result in results if "batch" in result], [2, 1]
+        )
+        self.assertEqual(results[-1], {"created": 3, "errors": 3})
+        with self.app_context():
+            products = ProductModel.get_items()
+            self.assertEqual(len(products), 3)
+            self.assertEqual(len({product.slug for product in products}), 3)
+            shirt = ProductModel.get_item(slug="shirt")
+            self.assertEqual(shirt.attrs[0].attrs_options[0].value, "red")
+
+    def test_export(self):
+        with self.app_context():
+            for index in range(3):
+                product = ProductModel(name=f"product {index}", price=10 + index)
+                product.save_to_db()
+            product.deactivate()
+            product.save_to_db()
+
+        runner = app.test_cli_runner()
+        ndjson = runner.invoke(args=["products", "export", "--batch-size", "1"])
+        csv = runner.invoke(args=["products", "export", "--format", "csv"])
+
+        products = [json.loads(line) for line in ndjson.output.splitlines()]
+        self.assertEqual([product["price"] for product in products], [10, 11])
+        self.assertEqual(products[0]["attrs"], [])
+        self.assertEqual(products[0]["images"], [])
+        rows = csv.output.splitlines()
+        self.assertTrue(rows[0].startswith("id,slug,name"))
+        self.assertEqual(len(rows), 3)
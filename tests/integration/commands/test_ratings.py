@@ -0,0 +1,32 @@
+from tests.base_test import BaseTest, app
+
+from models.products import ProductModel
+from models.review import ReviewModel
+from models.users import UserModel
+
+from plugins.db import db
+
+
+class TestRatings(BaseTest):
+    def test_reconcile(self):
+        with self.app_context():
+            product = ProductModel(**self.product_params)
+            product.save_to_db()
+            slug = product.slug
+            user = UserModel(**self.user_params)
+            user.save_to_db()
+            ReviewModel(ratings=4, product_id=product.id, user_id=user.id).save_to_db()
+            db.session.execute("UPDATE product SET rating_count = 3, rating_4 = 0")
+            db.session.commit()
+
+        runner = app.test_cli_runner()
+        dry_run = runner.invoke(args=["ratings", "reconcile", "--dry-run"])
+        result = runner.invoke(args=["ratings", "reconcile", "--batch-size", "1"])
+        again = runner.invoke(args=["ratings", "reconcile"])
+
+        self.assertIn("1 product(s) checked, 1 drifted", dry_run.output)
+        self.assertIn("1 product(s) checked, 1 drifted", result.output)
+        self.assertIn("1 product(s) checked, 0 drifted", again.output)
+        with self.app_context():
+            product = ProductModel.get_item(slug=slug)
+            self.assertEqual((product.rating_count, product.rating_4), (1, 1))
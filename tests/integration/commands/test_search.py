@@ -0,0 +1,21 @@
+from tests.base_test import BaseTest, app
+
+from models.products import ProductModel
+
+from plugins.db import db
+
+
+class TestSearch(BaseTest):
+    def test_rebuild(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+            db.session.execute("DELETE FROM product_search")
+            db.session.commit()
+            self.assertEqual(ProductModel.search("awesome").all(), [])
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["search", "rebuild", "--batch-size", "1"])
+
+        self.assertIn("1 product(s) indexed", result.output)
+        with self.app_context():
+            self.assertEqual(len(ProductModel.search("awesome").all()), 1)
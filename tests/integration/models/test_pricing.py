@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from tests.integration.integration_base_test import IntegrationBaseTest
+
+from models.coupons import CouponModel
+from models.helper import pricing
+from models.products import (
+    ProductModel,
+    ProductAttributeModel,
+    ProductAttributeOptionsModel,
+)
+
+
+class TestPricing(IntegrationBaseTest):
+    def test_price_catalog(self):
+        with self.app_context():
+            coupon = CouponModel(
+                **dict(
+                    self.coupon_params,
+                    start=datetime.utcnow() - timedelta(days=1),
+                    expire=datetime.utcnow() + timedelta(days=1),
+                )
+            )
+            coupon.save_to_db()
+            shirt = ProductModel(name="shirt", price=100)
+            attr = ProductAttributeModel(name="size")
+            attr.attrs_options = [
+                ProductAttributeOptionsModel(name="M", value="m", price_change=0),
+                ProductAttributeOptionsModel(name="XL", value="xl", price_change=20),
+            ]
+            shirt.attrs = [attr]
+            shirt.coupons = [coupon]
+            shirt.save_to_db()
+            ProductModel(name="socks", price=10).save_to_db()
+
+            lines = pricing.price_catalog(coupon)
+            without_coupon = pricing.price_catalog()
+
+            self.assertEqual(lines["base"].tolist(), [100, 120, 10])
+            self.assertEqual(lines["option_id"][-1], -1)
+            self.assertEqual(
+                lines["discount"].tolist(),
+                [
+                    coupon.get_discount_price(100),
+                    coupon.get_discount_price(120),
+                    0,
+                ],
+            )
+            self.assertEqual(without_coupon["discount"].tolist(), [0, 0, 0])
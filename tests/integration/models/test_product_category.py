@@ -1,6 +1,7 @@
 from tests.integration.integration_base_test import IntegrationBaseTest
 
 from models.product_category import ProductCategoryModel
+from plugins.db import db
 
 
 class TestProductCategoryModel(IntegrationBaseTest):
@@ -26,3 +27,50 @@ class TestProductCategoryModel(IntegrationBaseTest):
             category.save_to_db()
 
             self.assertEqual(category.parent_rel.name, "parent_data")
+
+    def test_closure_table(self):
+        with self.app_context():
+            root = ProductCategoryModel(name="root")
+            root.save_to_db()
+            child = ProductCategoryModel(name="child", parent_id=root.id)
+            child.save_to_db()
+            leaf = ProductCategoryModel(name="leaf", parent_id=child.id)
+            leaf.save_to_db()
+            other = ProductCategoryModel(name="other")
+            other.save_to_db()
+
+            self.assertEqual(
+                [(item.name, depth) for item, depth in self.model.get_subtree(root.id)],
+                [("root", 0), ("child", 1), ("leaf", 2)],
+            )
+            self.assertEqual(
+                self.model.get_paths([leaf.id])[leaf.id], "root > child > leaf"
+            )
+
+            # move the child (with its leaf) under other
+            child.parent_id = other.id
+            child.save_to_db()
+            self.assertEqual(
+                [item.name for item, _ in self.model.get_subtree(root.id)], ["root"]
+            )
+            self.assertEqual(
+                [(item.name, depth) for item, depth in self.model.get_subtree(other.id)],
+                [("other", 0), ("child", 1), ("leaf", 2)],
+            )
+
+            # a category can't be moved under its own subtree
+            other.parent_id = leaf.id
+            with self.assertRaises(AssertionError):
+                other.save_to_db()
+            db.session.rollback()
+
+            # deactivation hides the descendants
+            child.deactivate()
+            child.save_to_db()
+            self.assertEqual(
+                [item.name for item, _ in self.model.get_subtree(other.id)], ["other"]
+            )
+            self.assertEqual(
+                db.session.execute(self.model.subtree_ids(other.id)).scalars().all(),
+                [other.id],
+            )
@@ -0,0 +1,70 @@
+from tests.integration.integration_base_test import IntegrationBaseTest
+
+from models.product_category import ProductCategoryModel
+from models.product_listing import ProductListingModel
+from models.products import (
+    ProductModel,
+    ProductAttributeModel,
+    ProductAttributeOptionsModel,
+    ProductImageModel,
+)
+from models.review import ReviewModel
+from models.users import UserModel
+
+
+class TestProductListingModel(IntegrationBaseTest):
+    def test_listing_sync(self):
+        with self.app_context():
+            parent = ProductCategoryModel(name="home", value="Home")
+            parent.save_to_db()
+            category = ProductCategoryModel(
+                name="kitchen", value="Kitchen", parent_id=parent.id
+            )
+            category.save_to_db()
+            product = ProductModel(
+                **dict(self.product_params, category_id=category.id)
+            )
+            product.save_to_db()
+
+            listing = ProductListingModel.get_item(id=product.id)
+            self.assertEqual(listing.name, product.name)
+            self.assertEqual(listing.category_path, "home > kitchen")
+            self.assertIsNone(listing.image)
+            self.assertEqual(listing.rating_count, 0)
+
+            attr = ProductAttributeModel(
+                **dict(self.product_attr_params, product_id=product.id)
+            )
+            attr.save_to_db()
+            for price_change in (2, 5):
+                ProductAttributeOptionsModel(
+                    name=f"option {price_change}",
+                    attr_id=attr.id,
+                    price_change=price_change,
+                ).save_to_db()
+            ProductImageModel(
+                image_name="first.png", product_slug=product.slug
+            ).save_to_db()
+            user = UserModel(**self.user_params)
+            user.save_to_db()
+            review = ReviewModel(
+                **dict(self.product_review_params, product_id=product.id, user_id=user.id)
+            )
+            review.save_to_db()
+
+            listing = ProductListingModel.get_item(id=product.id)
+            self.assertEqual(listing.min_price, product.price + 2)
+            self.assertEqual(listing.max_price, product.price + 5)
+            self.assertEqual(listing.image, "first.png")
+            self.assertEqual(listing.rating, self.product_review_params["ratings"])
+            self.assertEqual(listing.rating_count, 1)
+
+            review.delete_from_db()
+            self.assertEqual(ProductListingModel.get_item(id=product.id).rating_count, 0)
+
+            product.deactivate()
+            product.save_to_db()
+            self.assertIsNone(ProductListingModel.get_item(id=product.id))
+
+            product.delete_from_db()
+            self.assertIsNone(ProductListingModel.query.get(product.id))
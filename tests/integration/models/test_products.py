@@ -1,3 +1,5 @@
+from sqlalchemy import event
+
 from tests.integration.integration_base_test import IntegrationBaseTest
 
 from models.products import (
@@ -8,6 +10,8 @@ from models.products import (
 )
 from models.product_category import ProductCategoryModel
 
+from plugins.db import db
+
 
 class TestProductModel(IntegrationBaseTest):
     def setUp(self) -> None:
@@ -35,6 +39,85 @@ class TestProductModel(IntegrationBaseTest):
                 product.category.name, self.product_category_params.get("name")
             )
 
+    def test_search(self):
+        with self.app_context():
+            ProductModel(name="Cotton Shirt", slug="shirt", price=10).save_to_db()
+            ProductModel(
+                name="Jeans", slug="jeans", price=20, description="goes with a shirt"
+            ).save_to_db()
+            ProductModel(name="Shoes", slug="shoes", price=30).save_to_db()
+
+            # the name match ranks first, prefix of the last word
+            self.assertEqual(
+                [product.slug for product in ProductModel.search("shir")],
+                ["shirt", "jeans"],
+            )
+            self.assertEqual(ProductModel.search("cotton shirts").all()[0].slug, "shirt")
+            self.assertIsNone(ProductModel.search('" *'))
+
+    def test_search_index_sync(self):
+        with self.app_context():
+            product = ProductModel(**self.params)
+            product.save_to_db()
+            attr = ProductAttributeModel(name="color", product_id=product.id)
+            attr.save_to_db()
+            option = ProductAttributeOptionsModel(
+                name="Crimson", attr_id=attr.id, price_change=0
+            )
+            option.save_to_db()
+            self.assertEqual(ProductModel.search("crimson").all(), [product])
+
+            product.name = "renamed"
+            product.save_to_db()
+            self.assertEqual(ProductModel.search("renamed").all(), [product])
+
+            option.deactivate()
+            option.save_to_db()
+            self.assertEqual(ProductModel.search("crimson").all(), [])
+
+            product.deactivate()
+            product.save_to_db()
+            self.assertEqual(ProductModel.search("renamed").all(), [])
+
+
+    def save_products(self, count):
+        """
+        Save the products with save_many, return the statements of the search index and
+        of the attributes.
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        products = []
+        for index in range(count):
+            product = ProductModel(name=f"product {count} {index}", price=10 + index)
+            attr = ProductAttributeModel(name="color")
+            attr.attrs_options = [ProductAttributeOptionsModel(name="Crimson")]
+            product.attrs = [attr]
+            products.append(product)
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            ProductModel.save_many(products)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return [
+            sql
+            for sql in statements
+            if "product_search" in sql or sql.startswith("SELECT product_attr")
+        ]
+
+    def test_search_index_batched(self):
+        with self.app_context():
+            few = self.save_products(2)
+            many = self.save_products(20)
+
+            # one delete and one insert of the documents, attrs and options loaded once
+            self.assertEqual(len(many), len(few))
+            self.assertEqual(len([sql for sql in many if "product_search" in sql]), 2)
+            self.assertEqual(len(ProductModel.search("crimson").all()), 22)
+
 
 class TestProductAttributeModel(IntegrationBaseTest):
     def setUp(self) -> None:
@@ -100,3 +183,22 @@ class TestProductImage(IntegrationBaseTest):
 
     def test_super_model_methods_testing(self):
         self.super_model_methods_testing()
+
+    def test_follow_slug_rename(self):
+        with self.app_context():
+            product = ProductModel(**self.product_params)
+            product.save_to_db()
+            ProductImageModel(
+                **self.product_image_params, product_slug=product.slug
+            ).save_to_db()
+            # cached under the old slug
+            self.assertIsNotNone(ProductImageModel.get_item(product_slug=product.slug))
+
+            product.slug = "renamed-slug"
+            product.save_to_db()
+            db.session.remove()
+
+            image = ProductImageModel.get_item(product_slug="renamed-slug")
+            self.assertIsNotNone(image)
+            self.assertEqual(image.product.slug, "renamed-slug")
+            self.assertIsNone(ProductImageModel.get_item(product_slug="temp-slug"))
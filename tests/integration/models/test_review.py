@@ -34,3 +34,31 @@ class TestReviewModel(IntegrationBaseTest):
 
             self.assertEqual(review.product.name, self.product_params.get("name"))
             self.assertEqual(review.user.email, self.user_params.get("email"))
+
+    def test_product_ratings(self):
+        with self.app_context():
+            product = ProductModel.get_item(id=self.params["product_id"])
+            other_user = UserModel(**dict(self.user_params, email="other@example.com"))
+            other_user.save_to_db()
+            review = ReviewModel(**dict(self.params, ratings=4))
+            review.save_to_db()
+            ReviewModel(**dict(self.params, ratings=2, user_id=other_user.id)).save_to_db()
+
+            self.assertEqual((product.rating_count, product.rating_sum), (2, 6))
+            self.assertEqual(product.rating, 3)
+            self.assertEqual(product.rating_histogram, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+
+            review.ratings = 5
+            review.save_to_db()
+            self.assertEqual((product.rating_count, product.rating_sum), (2, 7))
+            self.assertEqual((product.rating_4, product.rating_5), (0, 1))
+
+            review.deactivate()
+            review.save_to_db()
+            self.assertEqual((product.rating_count, product.rating_sum), (1, 2))
+
+            review.active = True
+            review.save_to_db()
+            review.delete_from_db()
+            self.assertEqual((product.rating_count, product.rating_sum), (1, 2))
+            self.assertEqual(product.rating_histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0})
@@ -0,0 +1,332 @@
+import json
+
+from unittest.mock import patch
+
+from flask import g
+from sqlalchemy import event
+
+from tests.base_test import BaseTest, app
+
+from models.products import ProductModel
+from models.product_category import ProductCategoryModel
+from models.review import ReviewModel
+from models.users import UserModel
+from models.helper.serializer import serialize
+from models.helper.unit_of_work import unit_of_work
+
+from plugins.cache import model_cache, LocalCache
+from plugins.db import db
+
+
+class TestSuperModelBulk(BaseTest):
+    def test_save_many_commits_once_per_batch(self):
+        with self.app_context():
+            products = [
+                ProductModel(name=f"product {index}", price=10 + index)
+                for index in range(5)
+            ]
+            with patch.object(
+                db.session, "commit", wraps=db.session.commit
+            ) as commit_mock:
+                ProductModel.save_many(products, batch_size=2)
+
+            self.assertEqual(commit_mock.call_count, 3)
+            self.assertEqual(len(ProductModel.get_items()), 5)
+            # pre_save of every item has been called
+            self.assertTrue(all(product.slug for product in products))
+
+    def test_save_many_rollback_whole_batch(self):
+        with self.app_context():
+            products = [
+                ProductModel(name="product", price=10),
+                ProductModel(name="invalid product", price=0),
+            ]
+            with self.assertRaises(AssertionError):
+                ProductModel.save_many(products)
+
+            self.assertEqual(ProductModel.get_items(), [])
+
+    def test_bulk_upsert(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+
+            saved = ProductModel.bulk_upsert(
+                [
+                    ProductModel(name="updated", slug="temp-slug", price=90),
+                    ProductModel(name="new", slug="new-slug", price=30),
+                ],
+                "slug",
+            )
+
+            self.assertEqual(len(saved), 2)
+            self.assertEqual(len(ProductModel.get_items()), 2)
+            product = ProductModel.get_item(slug="temp-slug")
+            self.assertEqual(product.name, "updated")
+            self.assertEqual(product.price, 90)
+            self.assertEqual(product.description, self.product_params["description"])
+
+    def test_bulk_upsert_email(self):
+        with self.app_context():
+            UserModel(**self.user_params).save_to_db()
+            params = self.user_params.copy()
+            params.update(first_name="updated")
+
+            UserModel.bulk_upsert([UserModel(**params)], "email")
+
+            self.assertEqual(len(UserModel.get_items()), 1)
+            self.assertEqual(UserModel.get_item().first_name, "updated")
+
+
+class TestUnitOfWork(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        app.config["UNIT_OF_WORK"] = True
+
+    def tearDown(self) -> None:
+        app.config["UNIT_OF_WORK"] = False
+        super().tearDown()
+
+    def test_commit_once_per_request(self):
+        @unit_of_work
+        def dispatch():
+            product = ProductModel(**self.product_params)
+            product.save_to_db()
+            self.assertIsNotNone(product.id)
+            product.price = 90
+            product.save_to_db()
+            self.assertEqual(g.db_commit_count, 0)
+            return product.id
+
+        with app.test_request_context("/product", method="POST"):
+            with patch.object(
+                db.session, "commit", wraps=db.session.commit
+            ) as commit_mock:
+                dispatch()
+
+            self.assertEqual(commit_mock.call_count, 1)
+            self.assertEqual(g.db_commit_count, 1)
+        with self.app_context():
+            self.assertEqual(ProductModel.get_item().price, 90)
+
+    def test_rollback_on_error(self):
+        @unit_of_work
+        def dispatch():
+            ProductModel(**self.product_params).save_to_db()
+            raise ValueError()
+
+        with app.test_request_context("/product", method="POST"):
+            with self.assertRaises(ValueError):
+                dispatch()
+            self.assertEqual(g.db_commit_count, 0)
+        with self.app_context():
+            self.assertIsNone(ProductModel.get_item())
+
+    def test_rollback_on_error_response(self):
+        @unit_of_work
+        def dispatch():
+            ProductModel(**self.product_params).save_to_db()
+            return {"message": "invalid"}, 400
+
+        with app.test_request_context("/product", method="POST"):
+            dispatch()
+            self.assertEqual(g.db_commit_count, 0)
+        with self.app_context():
+            self.assertIsNone(ProductModel.get_item())
+
+    def test_rollback_on_commit_error(self):
+        product = ProductModel(**self.product_params)
+        with self.app_context():
+            with patch.object(db.session, "commit", side_effect=ValueError()):
+                with self.assertRaises(ValueError):
+                    product.save_to_db()
+            self.assertFalse(db.session.new)
+
+    def test_disabled(self):
+        app.config["UNIT_OF_WORK"] = False
+
+        @unit_of_work
+        def dispatch():
+            ProductModel(**self.product_params).save_to_db()
+
+        with app.test_request_context("/product", method="POST"):
+            dispatch()
+            self.assertEqual(g.db_commit_count, 2)
+
+
+class TestModelCache(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        model_cache.backend = model_cache.counters = LocalCache(max_size=100, ttl=60)
+        model_cache.hits.clear()
+        model_cache.misses.clear()
+
+    def tearDown(self) -> None:
+        model_cache.backend = None
+        model_cache.counters = LocalCache()
+        super().tearDown()
+
+    def count_queries(self, func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            return func(), statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    def test_get_item_read_through(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+            ProductModel(name="other", slug="other", price=20).save_to_db()
+            db.session.remove()
+
+            product = ProductModel.get_item(slug="temp-slug")
+            products = ProductModel.get_items()
+            expected = [item.to_cache_state() for item in products]
+            db.session.remove()
+            (cached, cached_items), queries = self.count_queries(
+                lambda: (
+                    ProductModel.get_item(slug="temp-slug"),
+                    ProductModel.get_items(),
+                )
+            )
+
+            self.assertEqual(queries, [])
+            self.assertEqual(cached.to_cache_state(), product.to_cache_state())
+            self.assertEqual([item.to_cache_state() for item in cached_items], expected)
+            self.assertEqual(len(cached_items), 2)
+            self.assertEqual(model_cache.stats()["product"]["hits"], 2)
+            self.assertEqual(model_cache.stats()["product"]["misses"], 2)
+            # cached instances are persistent in the session, relationships still load
+            self.assertEqual(cached.attrs, [])
+
+    def test_cache_exclude(self):
+        with self.app_context():
+            UserModel(**self.user_params).save_to_db()
+            db.session.remove()
+            UserModel.get_item(email=self.user_params["email"])
+            db.session.remove()
+
+            (user, queries) = self.count_queries(
+                lambda: UserModel.get_item(email=self.user_params["email"])
+            )
+            self.assertEqual(queries, [])
+            self.assertNotIn("password", user.to_cache_state())
+            # loaded from the db when needed
+            self.assertTrue(user.verify_password(self.user_params["password"]))
+
+    def test_get_item_invalidation(self):
+        with self.app_context():
+            product = ProductModel(**self.product_params)
+            product.save_to_db()
+            self.assertEqual(ProductModel.get_item(slug="temp-slug").price, 70)
+
+            product.price = 90
+            product.save_to_db()
+            db.session.remove()
+            self.assertEqual(ProductModel.get_item(slug="temp-slug").price, 90)
+
+            product = ProductModel.get_item(slug="temp-slug")
+            product.deactivate()
+            self.assertIsNone(ProductModel.get_item(slug="temp-slug"))
+
+    def test_product_ratings_invalidation(self):
+        with self.app() as client:
+            with self.app_context():
+                product = ProductModel(**self.product_params)
+                product.save_to_db()
+                user = UserModel(**self.user_params)
+                user.save_to_db()
+                product_id, user_id = product.id, user.id
+            client.get("/product/temp-slug")
+
+            with self.app_context():
+                ReviewModel(
+                    product_id=product_id, user_id=user_id, **self.product_review_params
+                ).save_to_db()
+            response = client.get("/product/temp-slug")
+
+            # the relative UPDATE of the aggregates invalidates the cached product
+            data = json.loads(response.data)["data"]
+            self.assertEqual((data["rating_count"], data["rating"]), (1, 3))
+
+    def test_not_cacheable_lookup(self):
+        with self.app_context():
+            category = ProductCategoryModel(**self.product_category_params)
+            category.save_to_db()
+            product = ProductModel(category_id=category.id, **self.product_params)
+            product.save_to_db()
+
+            self.assertEqual(ProductModel.get_item(category=category), product)
+            self.assertEqual(ProductModel.get_item(category=category), product)
+
+            self.assertEqual(model_cache.stats(), {})
+
+
+class TestQueryShapes(BaseTest):
+    def test_get_query_shape_reused(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+            ProductModel(name="other", slug="other", price=20).save_to_db()
+
+            first = ProductModel.get_query(slug="temp-slug")
+            second = ProductModel.get_query(slug="other")
+
+            self.assertEqual(str(first), str(second))
+            self.assertEqual(first.one().slug, "temp-slug")
+            self.assertEqual(second.one().slug, "other")
+            self.assertEqual(ProductModel.get_query(slug="other").count(), 1)
+            pagination = ProductModel.get_query(price=20).paginate(1, 1)
+            self.assertEqual(pagination.total, 1)
+            self.assertEqual(pagination.items[0].slug, "other")
+
+    def test_get_query_none_value(self):
+        with self.app_context():
+            ProductModel(**self.product_params).save_to_db()
+
+            self.assertIsNotNone(ProductModel.get_item(category_id=None))
+            self.assertIsNone(ProductModel.get_item(category_id=1))
+            self.assertIsNone(ProductModel.get_item(active=False))
+
+
+class TestSerializer(BaseTest):
+    def test_get_json_data(self):
+        with self.app_context():
+            category = ProductCategoryModel(**self.product_category_params)
+            category.save_to_db()
+            product = ProductModel(category_id=category.id, **self.product_params)
+            product.save_to_db()
+
+            data = product.get_json_data()
+            # strings, as it always returned
+            self.assertEqual(data["id"], str(product.id))
+            self.assertEqual(data["price"], str(product.price))
+            self.assertEqual(data["category_id"], str(category.id))
+            self.assertNotIn("category", data)
+
+            data = product.get_json_data(
+                relationships=("category", "attrs"), exclude=("created", "updated")
+            )
+            self.assertEqual(data["category"]["id"], str(category.id))
+            self.assertEqual(data["attrs"], [])
+            self.assertNotIn("created", data)
+            self.assertNotIn("updated", data["category"])
+
+            # typed
+            data = serialize(product, relationships=("category",))
+            self.assertEqual(data["id"], product.id)
+            self.assertEqual(data["price"], product.price)
+            self.assertEqual(data["category"]["id"], category.id)
+            self.assertIsInstance(data["created"], str)
+
+    def test_get_json_data_enum(self):
+        with self.app_context():
+            user = UserModel(**self.user_params)
+            user.save_to_db()
+
+            data = user.get_json_data()
+            self.assertEqual(data["email"], self.user_params["email"])
+            self.assertEqual(data["gender"], user.gender.value)
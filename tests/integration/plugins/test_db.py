@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import mock
+
+from sqlalchemy import orm
+
+from tests.base_test import BaseTest, app
+
+from models.products import ProductModel, ProductImageModel
+
+from plugins.cache import model_cache, LocalCache
+from plugins.db import db
+
+from resources.products import ProductImages
+
+
+class TestReadReplica(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        app.config["SQLALCHEMY_DATABASE_URI"] = (
+            f"sqlite:///{os.path.join(self.directory, 'primary.db')}"
+        )
+        app.config["SQLALCHEMY_BINDS"] = {
+            "replica_0": f"sqlite:///{os.path.join(self.directory, 'replica.db')}"
+        }
+        app.config["SQLALCHEMY_REPLICA_BINDS"] = ["replica_0"]
+        with app.app_context():
+            db.create_all()
+            db.Model.metadata.create_all(bind=db.get_engine(app, "replica_0"))
+            ProductModel(**dict(self.product_params, name="primary")).save_to_db()
+            replica = orm.Session(bind=db.get_engine(app, "replica_0"))
+            replica.add(ProductModel(**dict(self.product_params, name="replica")))
+            replica.add(
+                ProductImageModel(
+                    image_name="image.png", product_slug=self.product_params["slug"]
+                )
+            )
+            replica.commit()
+            replica.close()
+
+    def tearDown(self) -> None:
+        with app.app_context():
+            db.session.remove()
+            db.get_engine(app, "replica_0").dispose()
+            db.engine.dispose()
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///"
+        app.config["SQLALCHEMY_BINDS"] = {}
+        app.config["SQLALCHEMY_REPLICA_BINDS"] = []
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_get_reads_replica(self):
+        with self.app() as client:
+            # the first request creates the admin (before_first_request), on the primary
+            client.get("/products")
+            response = client.get(f"/product/{self.product_params['slug']}")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)["data"]["name"], "replica")
+
+    def test_resource_opt_out(self):
+        with self.app() as client, mock.patch.object(
+            ProductImages, "replica_reads", False, create=True
+        ):
+            client.get("/products")
+            # the image only present on the replica is not seen
+            response = client.get(f"/product-image/{self.product_params['slug']}")
+
+            self.assertEqual(response.status_code, 404)
+
+    def test_product_images_read_only(self):
+        with self.app() as client:
+            client.get("/products")
+            response = client.get(f"/product-image/{self.product_params['slug']}")
+
+            # found on the replica, its file is missing: not listed, not deleted
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)["Product Images"], [])
+            replica = orm.Session(bind=db.get_engine(app, "replica_0"))
+            self.assertEqual(replica.query(ProductImageModel).count(), 1)
+            replica.close()
+
+    def test_replica_reads_not_cached(self):
+        model_cache.backend = model_cache.counters = LocalCache(max_size=100, ttl=60)
+        try:
+            with app.test_request_context("/product", method="GET"):
+                db.session.info["replica"] = True
+                product = ProductModel.get_item(slug="temp-slug")
+                self.assertEqual(product.name, "replica")
+                db.session.remove()
+
+                # the cache was not filled by the replica
+                product = ProductModel.get_item(slug="temp-slug")
+                self.assertEqual(product.name, "primary")
+                db.session.remove()
+        finally:
+            model_cache.backend = None
+            model_cache.counters = LocalCache()
+
+    def test_reads_after_write_stay_on_primary(self):
+        with app.test_request_context("/product", method="GET"):
+            db.session.info["replica"] = True
+            self.assertEqual(ProductModel.get_item().name, "replica")
+
+            ProductModel(name="other", slug="other", price=10).save_to_db()
+            db.session.expunge_all()
+
+            self.assertEqual(ProductModel.get_item(slug="temp-slug").name, "primary")
+            self.assertEqual(len(ProductModel.get_items()), 2)
+            db.session.remove()
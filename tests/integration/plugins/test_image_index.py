@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+from unittest import TestCase, mock
+
+from flask_uploads import UploadConfiguration
+
+from tests.base_test import app
+
+from plugins.image_index import ImageIndex
+
+
+class TestImageIndex(TestCase):
+    def setUp(self) -> None:
+        self.destination = tempfile.TemporaryDirectory()
+        self.root = self.destination.name
+        os.makedirs(os.path.join(self.root, "product_a"))
+        self.write("product_a/a.png")
+        self.index = ImageIndex()
+        self.upload_set_config = mock.patch.dict(
+            app.upload_set_config, images=UploadConfiguration(self.root)
+        )
+        self.upload_set_config.start()
+
+    def tearDown(self) -> None:
+        self.upload_set_config.stop()
+        self.destination.cleanup()
+
+    def write(self, name):
+        with open(os.path.join(self.root, name), "wb") as image_file:
+            image_file.write(b"image")
+
+    def test_exists_from_memory(self):
+        with mock.patch.dict(app.config, IMAGE_INDEX=True):
+            self.index.init_app(app)
+        path = os.path.join(self.root, "product_a", "a.png")
+        self.write("product_a/b.png")
+
+        with mock.patch("os.path.isfile") as isfile:
+            self.assertTrue(self.index.exists(path))
+            isfile.assert_not_called()
+        # saved by another process: found on the disk once, then from memory
+        self.assertTrue(self.index.exists(os.path.join(self.root, "product_a/b.png")))
+        with mock.patch("os.path.isfile") as isfile:
+            self.assertTrue(
+                self.index.exists(os.path.join(self.root, "product_a/b.png"))
+            )
+            isfile.assert_not_called()
+        self.index.discard(path)
+        os.remove(path)
+        self.assertFalse(self.index.exists(path))
+
+    def test_disabled(self):
+        with mock.patch.dict(app.config, IMAGE_INDEX=False):
+            self.index.init_app(app)
+        path = os.path.join(self.root, "product_a", "a.png")
+
+        self.assertTrue(self.index.exists(path))
+        os.remove(path)
+        self.assertFalse(self.index.exists(path))
+
+    def test_inotify(self):
+        with mock.patch.dict(app.config, IMAGE_INDEX=True, IMAGE_INDEX_INOTIFY=True):
+            self.index.init_app(app)
+        path = os.path.join(self.root, "product_a", "a.png")
+        self.assertTrue(self.index.exists(path))
+
+        # removed by another process
+        os.remove(path)
+        for _ in range(50):
+            if not self.index._paths:
+                break
+            time.sleep(0.02)
+        self.assertNotIn(os.path.join("product_a", "a.png"), self.index._paths)
@@ -1,5 +1,8 @@
 from tests.system.system_base_test import SystemBaseTest
 
+from models.coupons import CouponModel
+from models.products import ProductModel
+
 from datetime import datetime, timedelta
 
 import json
@@ -31,6 +34,38 @@ class TestCouponResource(SystemBaseTest):
                 # Assert
                 self.assertEqual(response.status_code, 200)
 
+    def test_get_preview(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                coupon = CouponModel.get_item(code=self.create_coupon().get("code"))
+                product = ProductModel(name="shirt", price=200)
+                product.coupons = [coupon]
+                product.save_to_db()
+                ProductModel(name="socks", price=10).save_to_db()
+
+                # Execute
+                response = client.get(f"/coupon-preview/{coupon.code}")
+                not_found = client.get("/coupon-preview/NOPE")
+
+                # Assert
+                data = json.loads(response.data)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    data["lines"],
+                    [
+                        {
+                            "product_id": product.id,
+                            "option_id": None,
+                            "price": 200,
+                            "discount": 40,
+                            "final_price": 160,
+                        }
+                    ],
+                )
+                self.assertEqual(data["discount"], 40)
+                self.assertEqual(not_found.status_code, 404)
+
     def test_get_item_not_found(self):
         with self.app() as client:
             with self.app_context():
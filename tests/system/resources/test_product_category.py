@@ -0,0 +1,143 @@
+from unittest import mock
+
+from tests.system.system_base_test import SystemBaseTest, app
+
+from models.products import ProductModel
+from models.product_category import ProductCategoryModel
+
+from plugins.db import db
+
+import json
+
+
+class TestProductCategoryResource(SystemBaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.endpoint = "/product-category"
+
+    def create_tree(self):
+        root = ProductCategoryModel(name="root")
+        root.save_to_db()
+        child = ProductCategoryModel(name="child", parent_id=root.id)
+        child.save_to_db()
+        leaf = ProductCategoryModel(name="leaf", parent_id=child.id)
+        leaf.save_to_db()
+        other = ProductCategoryModel(name="other")
+        other.save_to_db()
+        for index, category in enumerate((root, leaf, other)):
+            ProductModel(
+                name=f"product {index}", price=10 + index, category_id=category.id
+            ).save_to_db()
+        return root, child, leaf
+
+    def test_get_subtree(self):
+        with self.app() as client:
+            with self.app_context():
+                root, child, leaf = self.create_tree()
+                client.get(f"{self.endpoint}/0/subtree")
+                endpoint = f"{self.endpoint}/{root.id}/subtree"
+
+                with self.count_queries() as queries:
+                    response = client.get(endpoint)
+                missing = client.get(f"{self.endpoint}/0/subtree")
+
+                data = json.loads(response.data)["data"]
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [(item["name"], item["depth"]) for item in data],
+                    [("root", 0), ("child", 1), ("leaf", 2)],
+                )
+                self.assertEqual(data[2]["parent_id"], child.id)
+                # conditional validators + subtree
+                self.assertLessEqual(len(queries), 2)
+                self.assertEqual(missing.status_code, 404)
+
+    def test_get_subtree_products(self):
+        with self.app() as client:
+            with self.app_context():
+                root, child, leaf = self.create_tree()
+
+                response = client.get(f"{self.endpoint}/{root.id}/products")
+                under_child = client.get(f"{self.endpoint}/{child.id}/products")
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [
+                        product["name"]
+                        for product in json.loads(response.data)["products"]
+                    ],
+                    ["product 0", "product 1"],
+                )
+                self.assertEqual(
+                    [
+                        product["name"]
+                        for product in json.loads(under_child.data)["products"]
+                    ],
+                    ["product 1"],
+                )
+
+    def test_get_tree(self):
+        with self.app() as client:
+            with self.app_context():
+                root, child, leaf = self.create_tree()
+                ProductCategoryModel(name="hidden", parent_id=leaf.id).save_to_db()
+                child_id = child.id
+                leaf.deactivate()
+                leaf.save_to_db()
+
+                response = client.get("/product-categories/tree")
+                with self.count_queries() as queries:
+                    cached = client.get("/product-categories/tree")
+                not_modified = client.get(
+                    "/product-categories/tree",
+                    headers={"If-None-Match": response.headers["ETag"]},
+                )
+                ProductCategoryModel(name="new", parent_id=child_id).save_to_db()
+                updated = client.get("/product-categories/tree")
+
+                data = json.loads(response.data)["data"]
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [(item["name"], len(item["children"])) for item in data],
+                    [("other", 0), ("root", 1)],
+                )
+                self.assertEqual(data[1]["children"][0]["name"], "child")
+                self.assertEqual(data[1]["children"][0]["children"], [])
+                self.assertEqual(json.loads(cached.data), json.loads(response.data))
+                self.assertEqual(queries, [])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertNotEqual(
+                    updated.headers["ETag"], response.headers["ETag"]
+                )
+                self.assertEqual(
+                    json.loads(updated.data)["data"][1]["children"][0]["children"][0][
+                        "name"
+                    ],
+                    "new",
+                )
+
+    def test_get_tree_ttl(self):
+        with self.app() as client:
+            with self.app_context():
+                self.create_tree()
+                response = client.get("/product-categories/tree")
+                # renamed by another worker: no flush here, the generation is the same
+                db.session.execute(
+                    ProductCategoryModel.__table__.update()
+                    .where(ProductCategoryModel.name == "other")
+                    .values(name="renamed")
+                )
+                db.session.commit()
+                cached = client.get("/product-categories/tree")
+                with mock.patch.dict(app.config, CATEGORY_TREE_TTL=0):
+                    expired = client.get(
+                        "/product-categories/tree",
+                        headers={"If-None-Match": response.headers["ETag"]},
+                    )
+
+                self.assertEqual(cached.headers["ETag"], response.headers["ETag"])
+                # rebuilt without a shared generation, under the digest of the new tree
+                self.assertEqual(expired.status_code, 200)
+                self.assertNotEqual(expired.headers["ETag"], response.headers["ETag"])
+                names = [item["name"] for item in json.loads(expired.data)["data"]]
+                self.assertIn("renamed", names)
@@ -0,0 +1,509 @@
+from unittest import mock
+
+from flask_uploads import UploadConfiguration
+from PIL import Image
+
+from tests.system.system_base_test import SystemBaseTest, app
+
+from models.products import (
+    ProductModel,
+    ProductAttributeModel,
+    ProductAttributeOptionsModel,
+    ProductImageModel,
+)
+from models.product_category import ProductCategoryModel
+from models.review import ReviewModel
+from models.users import UserModel
+
+from plugins.db import db
+
+from utils import image_helper, image_variants
+from utils.image_helper import IMAGE_SET
+
+import io
+import json
+import os
+import tempfile
+
+
+class TestProductsResource(SystemBaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.endpoint = "/products"
+
+    def create_products(self, count):
+        user = UserModel.get_item(email=self.user_params["email"])
+        if not user:
+            user = UserModel(**self.user_params)
+            user.save_to_db()
+        for index in range(count):
+            product = ProductModel(name=f"product {count} {index}", price=10 + index)
+            attr = ProductAttributeModel(name="color")
+            attr.attrs_options = [
+                ProductAttributeOptionsModel(name="Red", value="red"),
+                ProductAttributeOptionsModel(name="Blue", value="blue"),
+            ]
+            product.attrs = [attr]
+            product.reviews = [ReviewModel(ratings=4, user_id=user.id)]
+            product.save_to_db()
+
+    def test_get_products_query_budget(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                endpoint = f"{self.endpoint}?count=exact&expanded=1"
+                self.create_products(2)
+                client.get(endpoint)
+                with self.count_queries() as few_products_queries:
+                    client.get(endpoint)
+                self.create_products(8)
+
+                # Execute
+                with self.count_queries() as queries:
+                    response = client.get(endpoint)
+
+                # Assert
+                self.assertEqual(response.status_code, 200)
+                data = json.loads(response.data)
+                self.assertEqual(len(data["products"]), 10)
+                self.assertEqual(len(data["products"][0]["attrs"][0]["attrs_options"]), 2)
+                self.assertEqual(len(queries), len(few_products_queries))
+
+    def test_get_products_cursor(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(5)
+
+                # Execute
+                with self.count_queries() as queries:
+                    first = json.loads(
+                        client.get(
+                            f"{self.endpoint}?cursor=&per_page=2&order_by=-price"
+                        ).data
+                    )
+                second = json.loads(client.get(first["pages"]["next_url"]).data)
+                last = json.loads(
+                    client.get(
+                        f"{self.endpoint}?cursor={second['pages']['next_cursor']}"
+                        "&per_page=2&order_by=-price"
+                    ).data
+                )
+
+                # Assert
+                prices = [
+                    product["price"]
+                    for page in (first, second, last)
+                    for product in page["products"]
+                ]
+                self.assertEqual(prices, [14, 13, 12, 11, 10])
+                self.assertIsNone(last["pages"]["next_cursor"])
+                self.assertIsNone(last["pages"]["next_url"])
+                self.assertFalse(any("count(*)" in query.lower() for query in queries))
+
+    def test_get_products_invalid_cursor(self):
+        with self.app() as client:
+            with self.app_context():
+                response = client.get(f"{self.endpoint}?cursor=invalid")
+                self.assertEqual(response.status_code, 400)
+
+                response = client.get(f"{self.endpoint}?cursor=&order_by=name")
+                self.assertEqual(response.status_code, 400)
+
+    def test_get_products_cached_count(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(3)
+                client.get(self.endpoint)
+
+                # Execute
+                with self.count_queries() as cached_queries:
+                    cached = json.loads(client.get(self.endpoint).data)
+                self.create_products(2)
+                with self.count_queries() as queries:
+                    updated = json.loads(client.get(self.endpoint).data)
+
+                # Assert
+                self.assertEqual(cached["pages"]["total"], 3)
+                self.assertEqual(cached["pages"]["count"], "cached")
+                self.assertFalse(any("count(*)" in q.lower() for q in cached_queries))
+                self.assertEqual(updated["pages"]["total"], 5)
+                self.assertTrue(any("count(*)" in q.lower() for q in queries))
+
+    def test_get_products_no_count(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(3)
+
+                # Execute
+                with self.count_queries() as queries:
+                    first = json.loads(
+                        client.get(f"{self.endpoint}?count=none&per_page=2").data
+                    )
+                last = json.loads(client.get(first["pages"]["next_url"]).data)
+
+                # Assert
+                self.assertFalse(any("count(*)" in q.lower() for q in queries))
+                self.assertIsNone(first["pages"]["total"])
+                self.assertIsNone(first["pages"]["last_url"])
+                self.assertEqual(len(first["products"]), 2)
+                self.assertEqual(len(last["products"]), 1)
+                self.assertIsNone(last["pages"]["next_url"])
+                self.assertEqual(last["pages"]["count"], "none")
+
+    def test_get_products_estimated_count(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(4)
+                db.session.execute("ANALYZE")
+
+                # Execute
+                with self.count_queries() as queries:
+                    response = client.get(f"{self.endpoint}?count=estimate&per_page=2")
+
+                # Assert
+                data = json.loads(response.data)
+                self.assertEqual(data["pages"]["total"], 4)
+                self.assertEqual(data["pages"]["pages"], 2)
+                self.assertFalse(any("count(*)" in q.lower() for q in queries))
+
+    def test_get_products_invalid_count(self):
+        with self.app() as client:
+            with self.app_context():
+                response = client.get(f"{self.endpoint}?count=sometimes")
+                self.assertEqual(response.status_code, 400)
+
+    def test_search_products(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(3)
+                ProductModel(name="Red Shirt", slug="red-shirt", price=15).save_to_db()
+
+                # Execute
+                response = client.get(f"{self.endpoint}/search?q=shirt")
+                options = client.get(f"{self.endpoint}/search?q=blue&per_page=2")
+                missing = client.get(f"{self.endpoint}/search?q=")
+
+                # Assert
+                data = json.loads(response.data)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [product["slug"] for product in data["products"]], ["red-shirt"]
+                )
+                data = json.loads(options.data)
+                self.assertEqual(data["pages"]["total"], 3)
+                self.assertEqual(len(data["products"]), 2)
+                self.assertEqual(missing.status_code, 400)
+
+    def test_get_products_filters_and_facets(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                parent = ProductCategoryModel(name="clothes")
+                parent.save_to_db()
+                child = ProductCategoryModel(name="shirts", parent_id=parent.id)
+                child.save_to_db()
+                other = ProductCategoryModel(name="shoes")
+                other.save_to_db()
+                self.create_products(3)
+                products = ProductModel.get_items()
+                for product, category in zip(products, (parent, child, other)):
+                    product.category_id = category.id
+                    product.save_to_db()
+                option = next(
+                    option
+                    for option in products[0].attrs[0].attrs_options
+                    if option.value == "blue"
+                )
+                option.value = "green"
+                option.save_to_db()
+                client.get(self.endpoint)
+                endpoint = (
+                    f"{self.endpoint}?count=exact&category_id={parent.id}"
+                    "&min_price=10&max_price=11.5&attr=color:red&attr=color:green"
+                )
+
+                # Execute
+                with self.count_queries() as queries:
+                    response = client.get(endpoint)
+                by_attr = json.loads(
+                    client.get(f"{self.endpoint}?attr=color:green").data
+                )
+                invalid = client.get(f"{self.endpoint}?min_price=cheap")
+
+                # Assert
+                data = json.loads(response.data)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [product["price"] for product in data["products"]], [10, 11]
+                )
+                self.assertEqual(data["pages"]["total"], 2)
+                self.assertEqual(
+                    data["facets"]["categories"],
+                    [
+                        {"category_id": parent.id, "count": 1},
+                        {"category_id": child.id, "count": 1},
+                    ],
+                )
+                self.assertEqual(data["facets"]["price"], {"min": 10, "max": 11})
+                self.assertEqual(
+                    data["facets"]["attrs"],
+                    [
+                        {"name": "color", "value": "blue", "count": 1},
+                        {"name": "color", "value": "green", "count": 1},
+                        {"name": "color", "value": "red", "count": 2},
+                    ],
+                )
+                self.assertEqual(len(by_attr["products"]), 1)
+                self.assertEqual(invalid.status_code, 400)
+                # products, attrs, options, count and one query per facet
+                self.assertLessEqual(len(queries), 7)
+
+    def test_get_products_pages_keep_filters(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(4)
+                filters = "min_price=11&attr=color:red&attr=color:blue&per_page=1"
+
+                # Execute
+                pages = {}
+                for mode in ("count=exact", "cursor="):
+                    url, prices = f"{self.endpoint}?{mode}&{filters}", []
+                    while url:
+                        data = json.loads(client.get(url).data)
+                        prices += [product["price"] for product in data["products"]]
+                        url = data["pages"]["next_url"]
+                        if url:
+                            self.assertIn("attr=color%3Ared&attr=color%3Ablue", url)
+                    pages[mode] = prices, data["pages"]
+
+                # Assert
+                self.assertEqual(pages["count=exact"][0], [11, 12, 13])
+                self.assertEqual(pages["cursor="][0], [11, 12, 13])
+                self.assertIn("min_price=11", pages["count=exact"][1]["first_url"])
+                self.assertIn("min_price=11", pages["count=exact"][1]["last_url"])
+
+    def test_get_products_conditional(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(2)
+                response = client.get(self.endpoint)
+                etag = response.headers["ETag"]
+
+                # Execute
+                with self.count_queries() as queries:
+                    not_modified = client.get(
+                        self.endpoint, headers={"If-None-Match": etag}
+                    )
+                other_page = client.get(
+                    f"{self.endpoint}?per_page=1", headers={"If-None-Match": etag}
+                )
+                option = ProductAttributeOptionsModel.get_item(value="red")
+                option.value = "green"
+                option.save_to_db()
+                modified = client.get(self.endpoint, headers={"If-None-Match": etag})
+
+                # Assert
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Last-Modified", response.headers)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified.data, b"")
+                # the validators only, no listing, count nor facet query
+                self.assertEqual(len(queries), 1)
+                # from the listing read model alone
+                self.assertNotIn("product_attr", queries[0])
+                self.assertNotIn("product_category", queries[0])
+                self.assertEqual(other_page.status_code, 200)
+                self.assertEqual(modified.status_code, 200)
+                self.assertNotEqual(modified.headers["ETag"], etag)
+
+    def test_get_product_conditional(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                product = ProductModel(name="product", slug="product", price=10)
+                product.save_to_db()
+                response = client.get("/product/product")
+
+                # Execute
+                by_date = client.get(
+                    "/product/product",
+                    headers={"If-Modified-Since": response.headers["Last-Modified"]},
+                )
+                ProductModel(name="other", slug="other", price=10).save_to_db()
+                other_product_saved = client.get(
+                    "/product/product", headers={"If-None-Match": response.headers["ETag"]}
+                )
+                product.price = 20
+                product.save_to_db()
+                updated = client.get(
+                    "/product/product", headers={"If-None-Match": response.headers["ETag"]}
+                )
+
+                # Assert
+                self.assertEqual(by_date.status_code, 304)
+                self.assertEqual(other_product_saved.status_code, 304)
+                self.assertEqual(updated.status_code, 200)
+                self.assertEqual(json.loads(updated.data)["data"]["price"], 20)
+
+    def test_get_product_reviews(self):
+        with self.app() as client:
+            with self.app_context():
+                # Configure
+                self.create_products(1)
+                slug = ProductModel.get_items()[0].slug
+
+                # Execute
+                with self.count_queries() as queries:
+                    response = client.get(f"/product/{slug}")
+                with_reviews = client.get(f"/product/{slug}?reviews=1")
+
+                # Assert
+                data = json.loads(response.data)["data"]
+                self.assertEqual((data["rating"], data["rating_count"]), (4, 1))
+                self.assertNotIn("reviews", data)
+                # the product query doesn't join its reviews anymore
+                self.assertFalse(any("review.ratings" in q.lower() for q in queries))
+                reviews = json.loads(with_reviews.data)["data"]["reviews"]
+                self.assertEqual([review["ratings"] for review in reviews], [4])
+
+    def test_get_product_image_size(self):
+        with tempfile.TemporaryDirectory() as destination, self.app() as client:
+            IMAGE_SET._config = UploadConfiguration(destination)
+            try:
+                with self.app_context():
+                    # Configure
+                    folder = os.path.join(destination, "product_product")
+                    os.makedirs(folder)
+                    Image.new("RGB", (800, 600)).save(os.path.join(folder, "a.jpg"))
+                    ProductModel(name="product", slug="product", price=10).save_to_db()
+                    image = ProductImageModel(
+                        image_name="a.jpg", product_slug="product"
+                    )
+                    image.save_to_db()
+                    endpoint = "/product-image/product/a.jpg"
+                    not_rendered = client.get(f"{endpoint}?size=thumb")
+                    # rendered in this process
+                    with mock.patch.dict(app.config, PRODUCT_IMAGE_WORKERS=0):
+                        image_variants.schedule(image)
+
+                    # Execute
+                    webp = client.get(
+                        f"{endpoint}?size=thumb", headers={"Accept": "image/webp,*/*"}
+                    )
+                    jpg = client.get(f"{endpoint}?size=thumb")
+                    invalid = client.get(f"{endpoint}?size=huge")
+
+                    # Assert
+                    self.assertEqual(not_rendered.status_code, 200)
+                    self.assertEqual(
+                        len(not_rendered.data),
+                        os.path.getsize(os.path.join(folder, "a.jpg")),
+                    )
+                    self.assertEqual(webp.mimetype, "image/webp")
+                    self.assertIn("Accept", webp.headers["Vary"])
+                    self.assertEqual(jpg.mimetype, "image/jpeg")
+                    self.assertEqual(
+                        Image.open(io.BytesIO(jpg.data)).width,
+                        app.config["PRODUCT_IMAGE_VARIANTS"]["thumb"],
+                    )
+                    self.assertEqual(invalid.status_code, 400)
+                    for response in (not_rendered, webp, jpg):
+                        response.close()
+            finally:
+                IMAGE_SET._config = None
+
+    def test_get_stored_image(self):
+        with tempfile.TemporaryDirectory() as destination, self.app() as client:
+            IMAGE_SET._config = UploadConfiguration(destination)
+            try:
+                with self.app_context():
+                    # Configure
+                    content = io.BytesIO()
+                    Image.new("RGB", (10, 10)).save(content, "PNG")
+                    content.seek(0)
+                    digest = image_helper.store_blob(content, ".png")
+                    ProductModel(name="product", slug="product", price=10).save_to_db()
+                    ProductImageModel(
+                        image_name="a.png", product_slug="product", digest=digest
+                    ).save_to_db()
+
+                    # Execute
+                    by_name = client.get("/product-image/product/a.png")
+                    images = client.get("/product-image/product")
+                    url = json.loads(images.data)["Product Images"][0]["url"]
+                    stored = client.get(url)
+                    not_modified = client.get(
+                        url, headers={"If-None-Match": stored.headers["ETag"]}
+                    )
+                    invalid = client.get("/images/a.png")
+
+                    # Assert
+                    self.assertEqual(url, f"/images/{digest}.png")
+                    self.assertEqual(by_name.data, content.getvalue())
+                    self.assertEqual(stored.data, content.getvalue())
+                    self.assertIn("immutable", stored.headers["Cache-Control"])
+                    self.assertEqual(not_modified.status_code, 304)
+                    self.assertEqual(invalid.status_code, 404)
+                    for response in (by_name, stored):
+                        response.close()
+            finally:
+                IMAGE_SET._config = None
+
+    def test_get_image_delivery(self):
+        with tempfile.TemporaryDirectory() as destination, self.app() as client:
+            IMAGE_SET._config = UploadConfiguration(destination)
+            try:
+                with self.app_context():
+                    # Configure
+                    content = io.BytesIO()
+                    Image.new("RGB", (10, 10)).save(content, "PNG")
+                    content.seek(0)
+                    digest = image_helper.store_blob(content, ".png")
+                    ProductModel(name="product", slug="product", price=10).save_to_db()
+                    ProductImageModel(
+                        image_name="a.png", product_slug="product", digest=digest
+                    ).save_to_db()
+                    url = f"/images/{digest}.png"
+
+                    # Execute
+                    partial = client.get(url, headers={"Range": "bytes=0-9"})
+                    by_name = client.get("/product-image/product/a.png")
+                    with mock.patch.dict(app.config, IMAGE_DELIVERY="x-accel"):
+                        accel = client.get(url)
+                        accel_not_modified = client.get(
+                            url, headers={"If-None-Match": f'"{digest}.png"'}
+                        )
+                    with mock.patch.dict(app.config, IMAGE_DELIVERY="x-sendfile"):
+                        sendfile = client.get("/product-image/product/a.png")
+
+                    # Assert
+                    self.assertEqual(partial.status_code, 206)
+                    self.assertEqual(partial.data, content.getvalue()[:10])
+                    self.assertEqual(by_name.headers["ETag"], f'"{digest}.png"')
+                    self.assertEqual(
+                        by_name.cache_control.max_age, app.config["IMAGE_MAX_AGE"]
+                    )
+                    self.assertEqual(
+                        accel.headers["X-Accel-Redirect"],
+                        f"/protected-images/blobs/{digest[:2]}/{digest[2:4]}/"
+                        f"{digest}.png",
+                    )
+                    self.assertEqual(accel.data, b"")
+                    self.assertEqual(accel.mimetype, "image/png")
+                    self.assertTrue(accel.cache_control.immutable)
+                    self.assertEqual(accel_not_modified.status_code, 304)
+                    self.assertEqual(
+                        sendfile.headers["X-Sendfile"],
+                        os.path.abspath(image_helper.get_blob_path(f"{digest}.png")),
+                    )
+                    for response in (partial, by_name):
+                        response.close()
+            finally:
+                IMAGE_SET._config = None
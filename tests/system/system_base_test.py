@@ -1,9 +1,15 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
 from tests.base_test import BaseTest, app
 
 from models.users import UserModel, UserConfirmationModel, UserRoleModel
 from models.coupons import CouponModel
 from models.order import OrderModel, OrderReceiverModel
 
+from plugins.db import db
+
 import json
 
 
@@ -12,6 +18,19 @@ class SystemBaseTest(BaseTest):
         super().setUp()
         self.headers = {"Content-Type": "application/json"}
 
+    @contextmanager
+    def count_queries(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
     def get_whole_order_data(self):
         user = self.set_session_key()
         product = self.create_product()
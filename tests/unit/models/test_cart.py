@@ -4,7 +4,7 @@ from tests.unit.unit_base_test import UnitBaseTest
 
 import models.cart
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class TestCartModel(UnitBaseTest):
@@ -37,34 +37,41 @@ class TestCartModel(UnitBaseTest):
         # Configure
         [mock_cart_item] = self.cart_obj.cart_items = [MagicMock()]
         mock_cart_item.get_price.return_value = 20
-        mock_coupon = self.cart_obj.coupon = MagicMock()
+        mock_coupon = self.cart_obj.coupon = self.get_coupon_mock()
         mock_cart_item.product.coupons = [mock_coupon]
-        mock_coupon.get_discount_price.return_value = 3
 
         # Execute
         output = self.cart_obj.count_total
 
         # Assert
         self.assertEqual(output, 17, "count_total, total is not calculating correctly.")
-        mock_coupon.get_discount_price.assert_called_once_with(20)
         mock_cart_item.get_price.assert_called_once_with()
 
     def test_count_total_coupon_not_exist(self):
         # Configure
         [mock_cart_item] = self.cart_obj.cart_items = [MagicMock()]
         mock_cart_item.get_price.return_value = 20
-        mock_coupon = self.cart_obj.coupon = MagicMock()
+        self.cart_obj.coupon = self.get_coupon_mock()
         mock_cart_item.product.coupons = [MagicMock()]
-        mock_coupon.get_discount_price.return_value = 3
 
         # Execute
         output = self.cart_obj.count_total
 
         # Assert
         self.assertEqual(output, 20, "count_total, total is not calculating correctly.")
-        assert not mock_coupon.get_discount_price.called
         mock_cart_item.get_price.assert_called_once_with()
 
+    @staticmethod
+    def get_coupon_mock():
+        # 15% off, valid now
+        mock_coupon = MagicMock()
+        mock_coupon.type = models.cart.pricing.CouponTypeEnum.percentage
+        mock_coupon.value = 15
+        mock_coupon.max_value = 10
+        mock_coupon.start = datetime.utcnow() - timedelta(days=1)
+        mock_coupon.expire = datetime.utcnow() + timedelta(days=1)
+        return mock_coupon
+
     def test_get_or_create_existing_cart(self):
         # Configure
         mock_get_item = models.cart.CartModel.get_item = MagicMock()